@@ -0,0 +1,185 @@
+import os
+import json
+import sqlite3
+from threading import local
+from app.neighbor_store import NeighborRow
+
+# Backends the read-only tables (words, frequencies, neighbors) can be served from, see get_data_bundle
+POSTGRES_BACKEND = 'postgres'
+BUNDLE_BACKEND = 'bundle'
+
+BUNDLE_SCHEMA = [
+    'CREATE TABLE words (id INTEGER PRIMARY KEY, grapheme TEXT, phoneme TEXT, grapheme_chunks TEXT, phoneme_chunks TEXT)',
+    'CREATE TABLE subgrapheme_frequencies (grapheme TEXT PRIMARY KEY, frequency INTEGER, frequency_head INTEGER, frequency_tail INTEGER)',
+    'CREATE TABLE subphoneme_frequencies (phoneme TEXT PRIMARY KEY, frequency INTEGER, frequency_head INTEGER, frequency_tail INTEGER)',
+    'CREATE TABLE fasttext_neighbors (grapheme TEXT PRIMARY KEY, neighbors TEXT, semantic_neighbors TEXT)',
+    'CREATE TABLE metadata (name TEXT PRIMARY KEY, value TEXT)',
+    ]
+
+
+def join_phones(phones):
+    '''
+    Phones never contain spaces, so phonemes are stored as space-separated strings rather than arrays
+    '''
+    return ' '.join(phones)
+
+def split_phones(phoneme):
+    return phoneme.split(' ') if phoneme else []
+
+def write_data_bundle(path, word_rows, subgrapheme_rows, subphoneme_rows, neighbor_rows):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Write the read-only tables to a single SQLite file, which replaces the corresponding Postgres tables (see get_data_bundle)
+    The file is built under a temporary name and then renamed, so that running processes never see a partial bundle
+
+    ----------
+    # INPUTS #
+    ----------
+    path, String : bundle file to write
+    word_rows, Iterable[Dict] : Word rows, with 'grapheme', 'phoneme', 'grapheme_chunks', and 'phoneme_chunks' keys
+    subgrapheme_rows, Iterable[Dict] : SubgraphemeFrequency rows
+    subphoneme_rows, Iterable[Dict] : SubphonemeFrequency rows
+    neighbor_rows, Iterable[Dict] : FasttextNeighbor rows, with 'grapheme', 'neighbors', and 'semantic_neighbors' keys
+
+    -----------
+    # OUTPUTS #
+    -----------
+    counts, Dict[String,Int] : number of rows written to each table
+    '''
+    tmp_path = path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    counts = {}
+    def count_rows(table, rows):
+        counts[table] = 0
+        for row in rows:
+            counts[table] += 1
+            yield row
+
+    conn = sqlite3.connect(tmp_path)
+    try:
+        # Nothing reads the file until it is complete, so skip the journal
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        for statement in BUNDLE_SCHEMA:
+            conn.execute(statement)
+        # Rows are streamed straight from the generators, so they are never all held in memory
+        conn.executemany('INSERT INTO words (grapheme, phoneme, grapheme_chunks, phoneme_chunks) VALUES (?, ?, ?, ?)',
+                         ((row['grapheme'], join_phones(row['phoneme']), json.dumps(row['grapheme_chunks']), json.dumps(row['phoneme_chunks']))
+                          for row in count_rows('words', word_rows)))
+        conn.executemany('INSERT INTO subgrapheme_frequencies VALUES (?, ?, ?, ?)',
+                         ((row['grapheme'], row['frequency'], row['frequency_head'], row['frequency_tail'])
+                          for row in count_rows('subgrapheme_frequencies', subgrapheme_rows)))
+        conn.executemany('INSERT INTO subphoneme_frequencies VALUES (?, ?, ?, ?)',
+                         ((join_phones(row['phoneme']), row['frequency'], row['frequency_head'], row['frequency_tail'])
+                          for row in count_rows('subphoneme_frequencies', subphoneme_rows)))
+        conn.executemany('INSERT INTO fasttext_neighbors VALUES (?, ?, ?)',
+                         ((row['grapheme'], json.dumps(row['neighbors']),
+                           json.dumps(row['semantic_neighbors']) if row.get('semantic_neighbors') is not None else None)
+                          for row in count_rows('fasttext_neighbors', neighbor_rows)))
+        conn.executemany('INSERT INTO metadata VALUES (?, ?)', [('n_' + table, str(n_rows)) for table, n_rows in counts.items()])
+        conn.commit()
+        conn.execute('ANALYZE')
+    finally:
+        conn.close()
+    os.rename(tmp_path, path)
+    return counts
+
+
+class DataBundle(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Read-only view of a bundle file written by write_data_bundle, holding the words, subgrapheme/subphoneme frequencies,
+    and precomputed neighbors, so that the app reads them from local disk rather than from Postgres
+
+    Each process and thread keeps a connection of its own open for the life of the bundle, since neither
+    connections nor cursors may be shared across forks, and opening a connection per lookup would cost more than the lookup
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    path, String : bundle file
+    '''
+
+    def __init__(self, path):
+        if not os.path.exists(path):
+            raise IOError('No data bundle at {}, see manage.py build_data_bundle'.format(path))
+        self.path = path
+        self._local = local()
+
+    def _connect(self):
+        if getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path)
+            conn.execute('PRAGMA query_only = ON')
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    def iter_words(self):
+        '''
+        Yield the (grapheme, phoneme, grapheme_chunks, phoneme_chunks) of every word, in the order they were written, see Lexicon.from_data_bundle
+        '''
+        for grapheme, phoneme, grapheme_chunks, phoneme_chunks in self._connect().execute('SELECT grapheme, phoneme, grapheme_chunks, phoneme_chunks FROM words ORDER BY id'):
+            yield grapheme, split_phones(phoneme), json.loads(grapheme_chunks), json.loads(phoneme_chunks)
+
+    def iter_subgrapheme_frequencies(self):
+        '''
+        Yield (grapheme, frequency, frequency_head, frequency_tail) rows, see FrequencyStore.from_rows
+        '''
+        return iter(self._connect().execute('SELECT grapheme, frequency, frequency_head, frequency_tail FROM subgrapheme_frequencies'))
+
+    def iter_subphoneme_frequencies(self):
+        '''
+        Yield (phoneme, frequency, frequency_head, frequency_tail) rows, with phonemes as tuples of phones, see FrequencyStore.from_rows
+        '''
+        for phoneme, frequency, frequency_head, frequency_tail in self._connect().execute('SELECT phoneme, frequency, frequency_head, frequency_tail FROM subphoneme_frequencies'):
+            yield tuple(split_phones(phoneme)), frequency, frequency_head, frequency_tail
+
+    def get_neighbor_row(self, grapheme):
+        '''
+        Return the NeighborRow of the grapheme, or None if it has no precomputed neighbors
+        '''
+        row = self._connect().execute('SELECT grapheme, neighbors, semantic_neighbors FROM fasttext_neighbors WHERE grapheme = ?', (grapheme,)).fetchone()
+        if row is None:
+            return None
+        return NeighborRow(row[0], json.loads(row[1]), json.loads(row[2]) if row[2] is not None else None)
+
+    def iter_neighbor_graphemes(self):
+        '''
+        Yield the grapheme of every row of precomputed neighbors
+        '''
+        for (grapheme,) in self._connect().execute('SELECT grapheme FROM fasttext_neighbors'):
+            yield grapheme
+
+    def get_metadata(self):
+        return dict(self._connect().execute('SELECT name, value FROM metadata'))
+
+
+# Process-wide data bundle, opened on first use
+_data_bundle = None
+
+def get_data_bundle():
+    '''
+    Return the process-wide DataBundle, opening the app's DATA_BUNDLE_PATH the first time it is requested,
+    or None if DATA_BACKEND is 'postgres' (in which case the tables are read from the database instead)
+    '''
+    global _data_bundle
+    if _data_bundle is None:
+        from app import app
+        backend = app.config.get('DATA_BACKEND') or POSTGRES_BACKEND
+        if backend == POSTGRES_BACKEND:
+            return None
+        elif backend != BUNDLE_BACKEND:
+            raise ValueError("DATA_BACKEND must be either 'postgres' or 'bundle'")
+        _data_bundle = DataBundle(app.config['DATA_BUNDLE_PATH'])
+    return _data_bundle
+
+def set_data_bundle(data_bundle):
+    '''
+    Install a DataBundle as the process-wide bundle
+    '''
+    global _data_bundle
+    _data_bundle = data_bundle
@@ -1,23 +1,27 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, SubmitField
 from wtforms.validators import ValidationError, DataRequired
-from app.helper_utils import alternate_capitalizations
-from app.models import FasttextNeighbor
+from app.helper_utils import resolve_graphemes
 
 class InputWords(FlaskForm):
     word1 = StringField('Word 1', validators=[DataRequired()], filters=[lambda s: s.strip() if s else s])
     word2 = StringField('Word 2', validators=[DataRequired()], filters=[lambda s: s.strip() if s else s])
 
-    # Annoying that the validation is identical/redundant, but keep as-is for now
     # Will return double-errors if both words are identical AND unrecognized
+    # Words are recognized if they are in the precomputed neighbors (store, data bundle, or FasttextNeighbor table), or in the neighbor index if one is configured
+    def get_canonical_graphemes(self):
+        '''
+        Resolve both inputs to their canonical graphemes in a single pass, the first time either of them is validated
+        Either is None if it is not recognized
+        '''
+        if getattr(self, '_canonical_graphemes', None) is None:
+            self._canonical_graphemes = resolve_graphemes([self.word1.data, self.word2.data])
+        return self._canonical_graphemes
+
     def validate_word1(self, word1):
-        word1_alternates = alternate_capitalizations(word1.data)
-        word1_grapheme = FasttextNeighbor.query.filter(FasttextNeighbor.grapheme.in_(word1_alternates)).first()
-        if word1_grapheme is None:
+        if self.get_canonical_graphemes()[0] is None:
             raise ValidationError('Word not recognized, check spelling and capitalization.')
 
     def validate_word2(self, word2):
-        word2_alternates = alternate_capitalizations(word2.data)
-        word2_grapheme = FasttextNeighbor.query.filter(FasttextNeighbor.grapheme.in_(word2_alternates)).first()
-        if word2_grapheme is None:
+        if self.get_canonical_graphemes()[1] is None:
             raise ValidationError('Word not recognized, check spelling and capitalization.')
@@ -0,0 +1,52 @@
+import numpy as np
+
+
+class FrequencyStore(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    In-memory copy of a subgrapheme/subphoneme frequency table
+
+    Each key (subgrapheme string or subphoneme tuple) maps to a row of a compact
+    (n_keys x 3) int32 array holding its 'all', 'head', and 'tail' counts, so that
+    lookups are a single dict probe rather than a database round trip
+
+    Keys which are absent from the store (e.g. because they are longer than the
+    longest n-gram that was counted) fall back to the default frequency of 1
+    '''
+    SIDES = {'all': 0, 'head': 1, 'tail': 2}
+    DEFAULT_FREQUENCY = 1
+
+    def __init__(self, keys, counts):
+        self.index = dict((key, i) for i, key in enumerate(keys))
+        self.counts = np.asarray(counts, dtype=np.int32).reshape(-1, 3)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    @classmethod
+    def from_rows(cls, rows, key_func=None):
+        '''
+        Build the store from (key, frequency, frequency_head, frequency_tail) rows
+        key_func is applied to each key, e.g. to convert ARRAY columns into hashable tuples
+        '''
+        keys, counts = [], []
+        for key, frequency, frequency_head, frequency_tail in rows:
+            keys.append(key_func(key) if key_func else key)
+            counts.append((frequency, frequency_head, frequency_tail))
+        return cls(keys, counts)
+
+    def get_frequency(self, key, side='all'):
+        '''
+        Return the frequency of the key, or the default frequency of 1 if the key is not present
+        '''
+        if side not in self.SIDES:
+            raise ValueError("Argument 'side' must be either 'head', 'tail', or 'all'")
+        i = self.index.get(key)
+        if i is None:
+            return self.DEFAULT_FREQUENCY
+        return int(self.counts[i, self.SIDES[side]])
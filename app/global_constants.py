@@ -14,6 +14,13 @@ ARPABET_RHOTICS = set(['ER'])
 MAX_PORTMANTEAUS = 100
 MAX_RHYMES = 100
 MAX_VOCAB = 300000
+# Longest subgrapheme/subphoneme whose frequency is stored, longer ones default to a frequency of 1
+MAX_NGRAM_LENGTH = 5
+SEMANTIC_NEIGHBOR_CACHE_SIZE = 10000
+# Most semantic neighbors the API computes per input word, which bounds the |words1| x |words2| grid of pairs it scores
+MAX_API_NEIGHBORS = 200
+# Number of neighbors processed per batch when streaming puns from the API
+API_STREAM_BLOCK_SIZE = 10
 # TEST_INPUT = 'rosemary marriott'
 TEST_INPUT = 'master blaster'
 
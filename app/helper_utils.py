@@ -4,8 +4,16 @@ from nltk.stem import WordNetLemmatizer
 from nltk.stem.porter import PorterStemmer
 from portmanteau import Portmanteau
 from rhyme import Rhyme
+from vectorized_puns import get_portmanteau_overlaps, get_rhyme_overlaps, get_portmanteau_criteria
 from app.models import FasttextNeighbor
-from global_constants import GRAPHEME_BLACKLIST
+from result_cache import LRUResultCache
+from top_k import TopKCollector
+from neighbor_index import get_neighbor_index, DEFAULT_N_NEIGHBORS, DEFAULT_MIN_SIMILARITY
+from neighbor_store import StringTable, get_neighbor_store
+from data_bundle import get_data_bundle
+from lexicon import LexiconWord, get_lexicon
+from pair_pool import get_pair_pool, get_pair_tile_size
+from global_constants import GRAPHEME_BLACKLIST, SEMANTIC_NEIGHBOR_CACHE_SIZE
 
 def alternate_capitalizations(grapheme):
     '''
@@ -22,6 +30,14 @@ def alternate_capitalizations(grapheme):
         capitalization_alternatives.append(grapheme[0].upper()+grapheme[1:].lower())
     return capitalization_alternatives
 
+# Memoized results of get_shortest_lemma, shared across requests
+# Bounded by the size of the FastText vocabulary, since only neighbor graphemes are ever reduced
+_shortest_lemma_cache = {}
+
+# Memoized results of get_semantic_neighbor_graphemes and get_canonical_grapheme
+_semantic_neighbor_cache = LRUResultCache(max_size=SEMANTIC_NEIGHBOR_CACHE_SIZE)
+_canonical_grapheme_cache = LRUResultCache(max_size=SEMANTIC_NEIGHBOR_CACHE_SIZE)
+
 def get_shortest_lemma(grapheme, lemmatizer=WordNetLemmatizer(), stemmer=PorterStemmer()):
     '''
     Don't want to produce multiple portmanteaus/rhymes where one of the words differs only by its e.g. pluralization
@@ -39,7 +55,10 @@ def get_shortest_lemma(grapheme, lemmatizer=WordNetLemmatizer(), stemmer=PorterS
       r : ADVERB
 
     Note: For efficiency, we instantiate the lemmatizer in advance, so that it doesn't need to be reinstantiated on each run
+    Results are memoized, since the same neighbors come up over and over again
     '''
+    if grapheme in _shortest_lemma_cache:
+        return _shortest_lemma_cache[grapheme]
 
     shortest_lemma = grapheme
 
@@ -56,24 +75,14 @@ def get_shortest_lemma(grapheme, lemmatizer=WordNetLemmatizer(), stemmer=PorterS
     if len(wn.synsets(stem)) >= 1 and len(stem) < len(shortest_lemma):
         shortest_lemma = stem
 
+    _shortest_lemma_cache[grapheme] = shortest_lemma
     return shortest_lemma
 
-# TODO: refactor so this function is a classmethod of FasttextVector
-def get_semantic_neighbor_graphemes(grapheme):
+def reduce_neighbor_graphemes(fasttext_neighbor_graphemes):
     '''
-    Fetch the precomputed n=100 nearest neighbors to the given grapheme
+    Reduce a list of raw FastText neighbor graphemes to the set of semantic neighbor graphemes used to build puns
+    Applied offline when populating FasttextNeighbor.semantic_neighbors or reducing the neighbor store, and at runtime for rows predating that column
     '''
-    # Possible that the input was only allowed through because an ALTERNATE capitalization was valid, i.e. 'robocop' matched 'Robocop'
-    grapheme_alternatives = alternate_capitalizations(grapheme)
-
-    for this_grapheme in grapheme_alternatives:
-        # Precomputed top-100 neighbors
-        fasttext_neighbor_graphemes_row = FasttextNeighbor.query.filter_by(grapheme=this_grapheme).first()
-        # If this capitalization variant matched, then keep it and move on
-        if fasttext_neighbor_graphemes_row:
-            fasttext_neighbor_graphemes = fasttext_neighbor_graphemes_row.neighbors
-            break
-
     # FastText sometimes returns funky unicode characters like umlouts, so make sure to catch/discard these before continuing
     fasttext_neighbor_graphemes_clean = []
     for g in fasttext_neighbor_graphemes:
@@ -91,55 +100,436 @@ def get_semantic_neighbor_graphemes(grapheme):
 
     return semantic_neighbor_graphemes
 
-def get_portmanteaus(words1_neighbors, words2_neighbors):
+# Process-wide set of the graphemes which have precomputed neighbors, loaded on first use
+_vocabulary = None
+
+def get_vocabulary():
+    '''
+    Return the graphemes which have precomputed neighbors, as a sorted StringTable, so that inputs are validated
+    without querying the database. This is the neighbor store's own vocab if one is configured, and is otherwise
+    loaded from the data bundle or the FasttextNeighbor table with a single query, the first time it is requested
+    '''
+    global _vocabulary
+    if _vocabulary is None:
+        neighbor_store = get_neighbor_store()
+        data_bundle = get_data_bundle() if neighbor_store is None else None
+        if neighbor_store is not None:
+            _vocabulary = neighbor_store.vocab
+        elif data_bundle is not None:
+            _vocabulary = StringTable.from_strings(data_bundle.iter_neighbor_graphemes())
+        else:
+            _vocabulary = StringTable.from_strings(grapheme for (grapheme,) in FasttextNeighbor.query.with_entities(FasttextNeighbor.grapheme))
+    return _vocabulary
+
+def set_vocabulary(vocabulary):
+    '''
+    Install a prebuilt vocabulary (anything supporting 'in', e.g. a StringTable or a set) as the process-wide vocabulary
+    '''
+    global _vocabulary
+    _vocabulary = vocabulary
+
+def get_vocabulary_grapheme(grapheme):
+    '''
+    Return the first capitalization variant of the grapheme which has precomputed neighbors, or None if none of them do
+    Possible that the input was only allowed through because an ALTERNATE capitalization was valid, i.e. 'robocop' matched 'Robocop'
+    '''
+    if not grapheme:
+        return None
+    vocabulary = get_vocabulary()
+    return next((this_grapheme for this_grapheme in alternate_capitalizations(grapheme) if this_grapheme in vocabulary), None)
+
+def get_neighbor_rows(graphemes):
+    '''
+    Return the precomputed neighbors row of each of the (exact) graphemes, or None for those without one
+    Rows are read from the memory-mapped neighbor store if one is configured, or else from the data bundle
+    if DATA_BACKEND is 'bundle', and otherwise from the FasttextNeighbor table, with a single query for all of them
+    '''
+    neighbor_store = get_neighbor_store()
+    data_bundle = get_data_bundle() if neighbor_store is None else None
+    if neighbor_store is not None:
+        return [neighbor_store.get_row(grapheme) for grapheme in graphemes]
+    elif data_bundle is not None:
+        return [data_bundle.get_neighbor_row(grapheme) for grapheme in graphemes]
+    if not graphemes:
+        return []
+    rows = dict((row.grapheme, row) for row in FasttextNeighbor.query.filter(FasttextNeighbor.grapheme.in_(set(graphemes))))
+    return [rows.get(grapheme) for grapheme in graphemes]
+
+def get_fasttext_neighbor_row(grapheme):
+    '''
+    Return the precomputed neighbors row matching the grapheme, or None if no capitalization variant matches
+    The matching variant is found in the vocabulary, so at most one row is read
+    '''
+    vocabulary_grapheme = get_vocabulary_grapheme(grapheme)
+    if vocabulary_grapheme is None:
+        return None
+    return get_neighbor_rows([vocabulary_grapheme])[0]
+
+def resolve_graphemes(graphemes):
+    '''
+    Return the canonical grapheme of each of the input graphemes, i.e. the capitalization variant under which its
+    precomputed neighbors are stored, or failing that in the neighbor index (if one is configured), or None if the
+    grapheme is not recognized. All the variants of all the inputs are checked against the in-memory vocabulary, so
+    resolving the inputs of a request takes no database queries
+    '''
+    canonical_graphemes = []
+    for grapheme in graphemes:
+        canonical_grapheme = _canonical_grapheme_cache.get(grapheme)
+        if canonical_grapheme is None:
+            canonical_grapheme = get_vocabulary_grapheme(grapheme)
+            if canonical_grapheme is None and grapheme:
+                # Words beyond the precomputed vocabulary cutoff may still be in the neighbor index
+                neighbor_index = get_neighbor_index()
+                if neighbor_index is not None:
+                    canonical_grapheme = next((g for g in alternate_capitalizations(grapheme) if g in neighbor_index), None)
+            if canonical_grapheme is not None:
+                _canonical_grapheme_cache.set(grapheme, canonical_grapheme)
+        canonical_graphemes.append(canonical_grapheme)
+    return canonical_graphemes
+
+def get_canonical_grapheme(grapheme):
+    '''
+    Return the canonical grapheme of the input grapheme, or None if it is not recognized, see resolve_graphemes
+    '''
+    return resolve_graphemes([grapheme])[0]
+
+def get_row_semantic_neighbor_graphemes(fasttext_neighbor_graphemes_row):
+    '''
+    Return the lemmatized/deduplicated semantic neighbors of a precomputed neighbors row
+    '''
+    if fasttext_neighbor_graphemes_row.semantic_neighbors is not None:
+        # Neighbors were already reduced when the table was populated
+        return set(map(str, fasttext_neighbor_graphemes_row.semantic_neighbors))
+    # Precomputed top-100 neighbors
+    return reduce_neighbor_graphemes(fasttext_neighbor_graphemes_row.neighbors)
+
+def prime_semantic_neighbor_graphemes(canonical_graphemes):
+    '''
+    Memoize the semantic neighbors of the (already resolved) canonical graphemes, reading all of their rows at once,
+    so that get_semantic_neighbor_graphemes finds them without another lookup, e.g. after a redirect to the results page
+    '''
+    canonical_graphemes = [grapheme for grapheme in canonical_graphemes if grapheme is not None and _semantic_neighbor_cache.get(grapheme) is None]
+    for grapheme, fasttext_neighbor_graphemes_row in zip(canonical_graphemes, get_neighbor_rows(canonical_graphemes)):
+        if fasttext_neighbor_graphemes_row is not None:
+            _semantic_neighbor_cache.set(grapheme, frozenset(get_row_semantic_neighbor_graphemes(fasttext_neighbor_graphemes_row)))
+
+def query_neighbor_index(grapheme, n=None, s=None):
+    '''
+    Compute the nearest neighbors of the grapheme at request time from the neighbor index, or return None if
+    no index is configured or the grapheme is not indexed. n and s default to the values used for the precomputed neighbors
+    '''
+    neighbor_index = get_neighbor_index()
+    canonical_grapheme = get_canonical_grapheme(grapheme)
+    if neighbor_index is None or canonical_grapheme is None:
+        return None
+    return neighbor_index.query(canonical_grapheme,
+                                n=DEFAULT_N_NEIGHBORS if n is None else n,
+                                s=DEFAULT_MIN_SIMILARITY if s is None else s)
+
+# TODO: refactor so this function is a classmethod of FasttextVector
+def get_semantic_neighbor_graphemes(grapheme, n=None, s=None):
+    '''
+    Fetch the precomputed n=100 nearest neighbors to the given grapheme
+    If a custom number of neighbors n or similarity cutoff s is requested, or the grapheme is beyond the
+    precomputed vocabulary, the neighbors are instead computed on demand from the neighbor index
+    Memoized, so repeat inputs cost a single dict lookup
+    '''
+    cache_key = grapheme if n is None and s is None else (grapheme, n, s)
+    semantic_neighbor_graphemes = _semantic_neighbor_cache.get(cache_key)
+    if semantic_neighbor_graphemes is not None:
+        return set(semantic_neighbor_graphemes)
+
+    fasttext_neighbor_graphemes_row = get_fasttext_neighbor_row(grapheme) if n is None and s is None else None
+    if fasttext_neighbor_graphemes_row is None:
+        neighbors = query_neighbor_index(grapheme, n=n, s=s)
+        if neighbors is None:
+            raise ValueError('No semantic neighbors available for \'{}\''.format(grapheme))
+        semantic_neighbor_graphemes = reduce_neighbor_graphemes(neighbors)
+    else:
+        semantic_neighbor_graphemes = get_row_semantic_neighbor_graphemes(fasttext_neighbor_graphemes_row)
+
+    _semantic_neighbor_cache.set(cache_key, frozenset(semantic_neighbor_graphemes))
+    return semantic_neighbor_graphemes
+
+def is_skipped_pair(neighbor1, neighbor2):
+    '''
+    Word pairs are skipped if the words are identical, or one of the graphemes is black-listed
+    '''
+    return neighbor1.grapheme == neighbor2.grapheme or neighbor1.grapheme.lower() in GRAPHEME_BLACKLIST or neighbor2.grapheme.lower() in GRAPHEME_BLACKLIST
+
+def iter_blocks(words, block_size=None):
+    '''
+    Split the list of words into consecutive blocks of at most block_size words (a single block if block_size is None)
+    '''
+    if block_size is None:
+        block_size = max(len(words), 1)
+    for block_start in range(0, len(words), block_size):
+        yield words[block_start:block_start+block_size]
+
+def iter_portmanteau_candidates(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=Portmanteau.ORDERING_CRITERION_CUTOFF, block_size=None):
     '''
     Given a two lists of words, attempt to construct portmanteaus out of each of the
-    |words1_neighbors| x |words2_neighbors| many word pairs. Order the generated portmanteaus
-    by quality before returning.
-    '''
-    # Store the results using a set to avoid duplicates in case the same words appears in both sets
-    portmanteau_set = set()
-    for neighbor1 in words1_neighbors:
-        for neighbor2 in words2_neighbors:
-            # If the words are identical, or one of the graphemes is black-listed, skip this word pair
-            if neighbor1.grapheme == neighbor2.grapheme or neighbor1.grapheme.lower() in GRAPHEME_BLACKLIST or neighbor2.grapheme.lower() in GRAPHEME_BLACKLIST:
-                continue
-            # Generate forward-ordered portmanteau
-            portmanteau, status, message = Portmanteau.get_pun(neighbor1, neighbor2)
-            if status == 0 and portmanteau.ordering_criterion() < Portmanteau.ORDERING_CRITERION_CUTOFF:
-                portmanteau_set.add(portmanteau)
-            # Generate reverse-ordered portmanteau
-            portmanteau, status, message = Portmanteau.get_pun(neighbor2, neighbor1)
-            if status == 0 and portmanteau.ordering_criterion() < Portmanteau.ORDERING_CRITERION_CUTOFF:
-                portmanteau_set.add(portmanteau)
+    |words1_neighbors| x |words2_neighbors| many word pairs, yielding every portmanteau
+    whose ordering criterion is below the cutoff as soon as it is found (i.e. unordered, and
+    possibly with duplicates in case the same words appears in both sets)
+
+    engine='scalar' runs Portmanteau.get_pun on every pair, and is kept as the reference implementation
+    engine='vectorized' finds the overlaps of all pairs at once with NumPy, and only constructs the survivors
+    With the vectorized engine, block_size bounds the number of first words processed per batch, so that
+    callers streaming the results receive the first ones before every pair has been evaluated
+    '''
+    if engine not in ('scalar', 'vectorized'):
+        raise ValueError("Argument 'engine' must be either 'scalar' or 'vectorized'")
+
+    words1_neighbors, words2_neighbors = list(words1_neighbors), list(words2_neighbors)
+    if engine == 'scalar':
+        for neighbor1 in words1_neighbors:
+            for neighbor2 in words2_neighbors:
+                # If the words are identical, or one of the graphemes is black-listed, skip this word pair
+                if is_skipped_pair(neighbor1, neighbor2):
+                    continue
+                # Generate forward-ordered portmanteau
+                portmanteau, status, message = Portmanteau.get_pun(neighbor1, neighbor2)
+                if status == 0 and portmanteau.ordering_criterion() < cutoff:
+                    yield portmanteau
+                # Generate reverse-ordered portmanteau
+                portmanteau, status, message = Portmanteau.get_pun(neighbor2, neighbor1)
+                if status == 0 and portmanteau.ordering_criterion() < cutoff:
+                    yield portmanteau
+    else:
+        # Generate both the forward-ordered and reverse-ordered portmanteaus
+        for first_words, second_words in [(words1_neighbors, words2_neighbors), (words2_neighbors, words1_neighbors)]:
+            for first_words_block in iter_blocks(first_words, block_size):
+                for i, j, overlap_len, overlap_distance, n_vowels, n_consonants in zip(*get_portmanteau_overlaps(first_words_block, second_words)):
+                    word1, word2 = first_words_block[i], second_words[j]
+                    if is_skipped_pair(word1, word2):
+                        continue
+                    portmanteau = Portmanteau.from_overlap(word1, word2, int(overlap_len), int(overlap_distance), int(n_vowels), int(n_consonants))
+                    if portmanteau.ordering_criterion() < cutoff:
+                        yield portmanteau
+
+def iter_unique(puns):
+    '''
+    Drop the repeated puns from a stream of candidates
+    '''
+    seen = set()
+    for pun in puns:
+        if pun not in seen:
+            seen.add(pun)
+            yield pun
+
+def iter_portmanteaus(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=Portmanteau.ORDERING_CRITERION_CUTOFF, block_size=None):
+    '''
+    Yield each distinct portmanteau of the two lists of words as soon as it is found, see iter_portmanteau_candidates
+    '''
+    return iter_unique(iter_portmanteau_candidates(words1_neighbors, words2_neighbors, engine=engine, cutoff=cutoff, block_size=block_size))
+
+def get_portmanteaus(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=Portmanteau.ORDERING_CRITERION_CUTOFF, k=None):
+    '''
+    Generate the portmanteaus of the two lists of words, see iter_portmanteau_candidates, and return the
+    k best of them (all of them if k is None), ordered by quality.
+    Only the current k best candidates are held at any time, so memory and sorting costs depend on k rather than the number of candidates
+
+    engine='pruned' computes the exact ordering criterion of every candidate pair up front, visits the candidates best-first,
+    and stops constructing Portmanteaus as soon as the next one can't beat the cutoff or the current k-th best, see get_pruned_portmanteaus
+    engine='pool' evaluates tiles of the pair grid across the process-wide worker pool, see get_pooled_puns
+    '''
+    if engine == 'pruned':
+        return get_pruned_portmanteaus(words1_neighbors, words2_neighbors, cutoff=cutoff, k=k)
+    if engine == 'pool':
+        words1_neighbors, words2_neighbors = list(words1_neighbors), list(words2_neighbors)
+        if is_poolable(words1_neighbors + words2_neighbors):
+            # Tiles of both the forward-ordered and reverse-ordered portmanteaus
+            tiles = list(iter_tiles(words1_neighbors, words2_neighbors)) + list(iter_tiles(words2_neighbors, words1_neighbors))
+            return get_pooled_puns(evaluate_portmanteau_tile, Portmanteau, tiles, cutoff=cutoff, k=k)
+        engine = 'vectorized'
 
     # Order the results in terms of portmanteau quality, with better portmanteaus appearing earlier
-    portmanteau_list = list(portmanteau_set)
-    portmanteau_list.sort(key=lambda x: x.ordering_criterion())
+    top_portmanteaus = TopKCollector(k)
+    for portmanteau in iter_portmanteau_candidates(words1_neighbors, words2_neighbors, engine=engine, cutoff=cutoff):
+        top_portmanteaus.add(portmanteau)
 
-    return portmanteau_list
+    return top_portmanteaus.get_puns()
 
-def get_rhymes(words1_neighbors, words2_neighbors):
+def get_pruned_portmanteaus(words1_neighbors, words2_neighbors, cutoff=Portmanteau.ORDERING_CRITERION_CUTOFF, k=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Branch-and-bound search for the k best portmanteaus of the two lists of words
+
+    The overlaps of every pair are found with the batched search, and the head/tail overlap probabilities are
+    looked up once per word, which gives the ordering criterion of every candidate before any Portmanteau is built,
+    see get_portmanteau_criteria. Candidates are then visited best-first, and only constructed until the next one
+    can no longer beat the cutoff or the k-th best portmanteau found so far. Returns the same portmanteaus as
+    get_portmanteaus, up to ties at the k-th place
+    '''
+    words1_neighbors, words2_neighbors = list(words1_neighbors), list(words2_neighbors)
+    top_portmanteaus = TopKCollector(k)
+
+    # Candidates of the forward-ordered and reverse-ordered portmanteaus
+    candidates = []
+    for first_words, second_words in [(words1_neighbors, words2_neighbors), (words2_neighbors, words1_neighbors)]:
+        inds1, inds2, overlap_lens, overlap_distances, n_vowels, n_consonants, criteria = get_portmanteau_criteria(first_words, second_words)
+        candidates.extend(zip(criteria.tolist(), [first_words[i] for i in inds1], [second_words[j] for j in inds2],
+                              overlap_lens.tolist(), overlap_distances.tolist(), n_vowels.tolist(), n_consonants.tolist()))
+    candidates.sort(key=lambda candidate: candidate[0])
+
+    for criterion, word1, word2, overlap_len, overlap_distance, n_vowels, n_consonants in candidates:
+        # Leave a small margin so that floating point rounding can never prune a candidate that would have been kept
+        threshold = top_portmanteaus.get_threshold()
+        if criterion - 1e-9 >= cutoff or (threshold is not None and criterion - 1e-9 >= threshold):
+            break
+        # If the words are identical, or one of the graphemes is black-listed, skip this word pair
+        if is_skipped_pair(word1, word2):
+            continue
+        portmanteau = Portmanteau.from_overlap(word1, word2, overlap_len, overlap_distance, n_vowels, n_consonants)
+        if portmanteau.ordering_criterion() < cutoff:
+            top_portmanteaus.add(portmanteau)
+
+    return top_portmanteaus.get_puns()
+
+def iter_rhyme_candidates(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=None, block_size=None):
     '''
     Given a two lists of words, attempt to construct rhyme out of each of the
-    |words1_neighbors| x |words2_neighbors| many word pairs. Order the generated rhymes
-    by quality before returning.
-    '''
-    # Store the results using a set to avoid duplicates in case the same words appears in both sets
-    rhyme_set = set()
-    for neighbor1 in words1_neighbors:
-        for neighbor2 in words2_neighbors:
-            # If the words are identical, or one of the graphemes is black-listed, skip this word pair
-            if neighbor1.grapheme == neighbor2.grapheme or neighbor1.grapheme.lower() in GRAPHEME_BLACKLIST or neighbor2.grapheme.lower() in GRAPHEME_BLACKLIST:
-                continue
-            # Generate the rhyme for only a single ordering, if the words need to be flipped
-            # for quality reasons, that's handled within the 'get_rhyme' function
-            rhyme, status, message = Rhyme.get_pun(neighbor1, neighbor2)
-            if status == 0:
-                rhyme_set.add(rhyme)
+    |words1_neighbors| x |words2_neighbors| many word pairs, yielding every rhyme as soon as it is found
+    (i.e. unordered, and possibly with duplicates in case the same words appears in both sets)
+    If a cutoff is given, only rhymes whose overlap phoneme probability (the primary ordering criterion) is below it are kept
+
+    engine='scalar' runs Rhyme.get_pun on every pair, and is kept as the reference implementation
+    engine='vectorized' finds the tail overlaps of all pairs at once with NumPy, and only constructs the survivors
+    With the vectorized engine, block_size bounds the number of first words processed per batch, see iter_portmanteau_candidates
+    '''
+    if engine not in ('scalar', 'vectorized'):
+        raise ValueError("Argument 'engine' must be either 'scalar' or 'vectorized'")
+
+    words1_neighbors, words2_neighbors = list(words1_neighbors), list(words2_neighbors)
+    if engine == 'scalar':
+        for neighbor1 in words1_neighbors:
+            for neighbor2 in words2_neighbors:
+                # If the words are identical, or one of the graphemes is black-listed, skip this word pair
+                if is_skipped_pair(neighbor1, neighbor2):
+                    continue
+                # Generate the rhyme for only a single ordering, if the words need to be flipped
+                # for quality reasons, that's handled within the 'get_rhyme' function
+                rhyme, status, message = Rhyme.get_pun(neighbor1, neighbor2)
+                if status == 0 and (cutoff is None or rhyme.ordering_criterion()[0] < cutoff):
+                    yield rhyme
+    else:
+        for words1_block in iter_blocks(words1_neighbors, block_size):
+            for i, j, overlap_len, overlap_distance, n_vowels, n_consonants in zip(*get_rhyme_overlaps(words1_block, words2_neighbors)):
+                word1, word2 = words1_block[i], words2_neighbors[j]
+                if is_skipped_pair(word1, word2):
+                    continue
+                rhyme = Rhyme.from_overlap(word1, word2, int(overlap_len), int(overlap_distance), int(n_vowels), int(n_consonants))
+                if cutoff is None or rhyme.ordering_criterion()[0] < cutoff:
+                    yield rhyme
+
+def iter_rhymes(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=None, block_size=None):
+    '''
+    Yield each distinct rhyme of the two lists of words as soon as it is found, see iter_rhyme_candidates
+    '''
+    return iter_unique(iter_rhyme_candidates(words1_neighbors, words2_neighbors, engine=engine, cutoff=cutoff, block_size=block_size))
+
+def get_rhymes(words1_neighbors, words2_neighbors, engine='vectorized', cutoff=None, k=None):
+    '''
+    Generate the rhymes of the two lists of words, see iter_rhyme_candidates, and return the
+    k best of them (all of them if k is None), ordered by quality.
+    engine='pool' evaluates tiles of the pair grid across the process-wide worker pool, see get_pooled_puns
+    '''
+    if engine == 'pool':
+        words1_neighbors, words2_neighbors = list(words1_neighbors), list(words2_neighbors)
+        if is_poolable(words1_neighbors + words2_neighbors):
+            tiles = list(iter_tiles(words1_neighbors, words2_neighbors))
+            return get_pooled_puns(evaluate_rhyme_tile, Rhyme, tiles, cutoff=cutoff, k=k)
+        engine = 'vectorized'
 
     # Order the results in terms of rhyme quality, with better rhymes appearing earlier
-    rhyme_list = list(rhyme_set)
-    rhyme_list.sort(key=lambda x: x.ordering_criterion())
+    top_rhymes = TopKCollector(k)
+    for rhyme in iter_rhyme_candidates(words1_neighbors, words2_neighbors, engine=engine, cutoff=cutoff):
+        top_rhymes.add(rhyme)
 
-    return rhyme_list
+    return top_rhymes.get_puns()
+
+def is_poolable(words):
+    '''
+    Workers look words up in their own copy of the lexicon, so only LexiconWords can be evaluated in the worker pool
+    '''
+    return all(isinstance(word, LexiconWord) for word in words)
+
+def iter_tiles(first_words, second_words, tile_size=None):
+    '''
+    Split the |first_words| x |second_words| pair grid into tiles of at most tile_size x tile_size pairs,
+    each described by the lexicon ids of its words, so that tiles are cheap to send to a worker process
+    '''
+    tile_size = tile_size or get_pair_tile_size()
+    for first_words_block in iter_blocks(first_words, tile_size):
+        for second_words_block in iter_blocks(second_words, tile_size):
+            yield [word.id for word in first_words_block], [word.id for word in second_words_block]
+
+def evaluate_tile(pun_class, get_overlaps, is_below_cutoff, first_ids, second_ids, cutoff, k):
+    '''
+    Evaluate one tile of the pair grid in a worker process, returning the tile's k best puns as compact
+    (ordering_criterion, word1_id, word2_id, overlap_len, overlap_distance, n_vowels, n_consonants) tuples, best first,
+    from which the parent can rebuild the puns with pun_class.from_overlap
+    '''
+    lexicon = get_lexicon()
+    first_words = [LexiconWord(lexicon, idx) for idx in first_ids]
+    second_words = [LexiconWord(lexicon, idx) for idx in second_ids]
+
+    top_puns = TopKCollector(k)
+    pun_overlaps = {}
+    for i, j, overlap_len, overlap_distance, n_vowels, n_consonants in zip(*get_overlaps(first_words, second_words)):
+        word1, word2 = first_words[i], second_words[j]
+        if is_skipped_pair(word1, word2):
+            continue
+        overlap = (int(overlap_len), int(overlap_distance), int(n_vowels), int(n_consonants))
+        pun = pun_class.from_overlap(word1, word2, *overlap)
+        if is_below_cutoff(pun, cutoff) and top_puns.add(pun):
+            pun_overlaps[pun.get_key()] = (word1.id, word2.id) + overlap
+    return [(pun.ordering_criterion(),) + pun_overlaps[pun.get_key()] for pun in top_puns.get_puns()]
+
+def is_portmanteau_below_cutoff(portmanteau, cutoff):
+    return portmanteau.ordering_criterion() < cutoff
+
+def is_rhyme_below_cutoff(rhyme, cutoff):
+    return cutoff is None or rhyme.ordering_criterion()[0] < cutoff
+
+def evaluate_portmanteau_tile(args):
+    return evaluate_tile(Portmanteau, get_portmanteau_overlaps, is_portmanteau_below_cutoff, *args)
+
+def evaluate_rhyme_tile(args):
+    return evaluate_tile(Rhyme, get_rhyme_overlaps, is_rhyme_below_cutoff, *args)
+
+def get_pooled_puns(evaluate_tile_function, pun_class, tiles, cutoff=None, k=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Evaluate the tiles of a pair grid across the process-wide worker pool, and merge the k best puns of every tile
+    into the overall k best, which are the same puns the serial engine returns (up to ties at the k-th place)
+
+    The k best puns of a tile include all of its share of the overall k best, so the merge visits the tiles'
+    candidates best-first, and stops as soon as the next one can no longer beat the k-th best pun found so far.
+    Only these candidates are rebuilt in the parent, from the compact tuples returned by the workers
+
+    ----------
+    # INPUTS #
+    ----------
+    evaluate_tile_function, Function : evaluate_portmanteau_tile or evaluate_rhyme_tile
+    pun_class, Class : Portmanteau or Rhyme
+    tiles, List[Tuple] : (first_ids, second_ids) of each tile, see iter_tiles
+    '''
+    tile_results = get_pair_pool().map(evaluate_tile_function, [(first_ids, second_ids, cutoff, k) for first_ids, second_ids in tiles])
+    # Sorting is stable, so tied candidates keep the order in which the serial engine would have found them
+    candidates = sorted((candidate for tile_result in tile_results for candidate in tile_result), key=lambda candidate: candidate[0])
+
+    lexicon = get_lexicon()
+    top_puns = TopKCollector(k)
+    for criterion, word1_id, word2_id, overlap_len, overlap_distance, n_vowels, n_consonants in candidates:
+        threshold = top_puns.get_threshold()
+        if threshold is not None and criterion >= threshold:
+            break
+        top_puns.add(pun_class.from_overlap(LexiconWord(lexicon, word1_id), LexiconWord(lexicon, word2_id),
+                                            overlap_len, overlap_distance, n_vowels, n_consonants))
+    return top_puns.get_puns()
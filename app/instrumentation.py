@@ -0,0 +1,229 @@
+import os
+import random
+import cProfile
+from bisect import bisect_left
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from threading import Lock
+from time import time
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from app import app
+
+# Upper bounds of the latency histogram buckets, in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"')) for name, value in labels) + '}'
+
+
+class Counter(object):
+    '''
+    Prometheus-style counter, with one value per combination of label values
+    '''
+    type_name = 'counter'
+
+    def __init__(self, name, description, labelnames=()):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self._values = OrderedDict()
+        self._lock = Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def iter_samples(self):
+        with self._lock:
+            values = self._values.items()
+        for key, value in values:
+            yield self.name, zip(self.labelnames, key), value
+
+
+class Histogram(object):
+    '''
+    Prometheus-style histogram, with one set of cumulative buckets per combination of label values
+    '''
+    type_name = 'histogram'
+
+    def __init__(self, name, description, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = OrderedDict() # label values -> [bucket counts..., sum, count]
+        self._lock = Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0]*len(self.buckets) + [0.0, 0]
+            bucket_idx = bisect_left(self.buckets, value)
+            if bucket_idx < len(self.buckets):
+                values[bucket_idx] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def iter_samples(self):
+        with self._lock:
+            values = [(key, list(value)) for key, value in self._values.items()]
+        for key, value in values:
+            labels = zip(self.labelnames, key)
+            cumulative_count = 0
+            for upper_bound, bucket_count in zip(self.buckets, value):
+                cumulative_count += bucket_count
+                yield self.name + '_bucket', labels + [('le', repr(upper_bound))], cumulative_count
+            yield self.name + '_bucket', labels + [('le', '+Inf')], value[-1]
+            yield self.name + '_sum', labels, value[-2]
+            yield self.name + '_count', labels, value[-1]
+
+
+class StatsCollector(object):
+    '''
+    Gauges of the numeric stats() of the registered objects (e.g. caches), read at scrape time
+    '''
+    type_name = 'gauge'
+
+    def __init__(self, name, description, labelname):
+        self.name = name
+        self.description = description
+        self.labelname = labelname
+        self.sources = OrderedDict()
+
+    def iter_samples(self):
+        for source_name, source in self.sources.items():
+            for stat, value in sorted(source.stats().items()):
+                if stat != 'backend':
+                    yield self.name, [(self.labelname, source_name), ('stat', stat)], value
+
+
+STAGE_DURATION = Histogram('pun_stage_duration_seconds', 'Time spent in each stage of generating puns', labelnames=('stage',))
+REQUEST_DURATION = Histogram('http_request_duration_seconds', 'Time spent handling each request', labelnames=('endpoint', 'status'))
+DB_QUERY_DURATION = Histogram('db_query_duration_seconds', 'Time spent executing each database query')
+DB_QUERIES_PER_REQUEST = Histogram('db_queries_per_request', 'Number of database queries issued by each request', buckets=(0, 1, 2, 5, 10, 25, 50, 100))
+SLOW_REQUEST_PROFILES = Counter('slow_request_profiles_total', 'Number of cProfile dumps written for slow requests', labelnames=('endpoint',))
+CACHE_STATS = StatsCollector('cache_stats', 'Size, hits, and misses of the in-process caches', 'cache')
+LOGGER_STATS = StatsCollector('logger_stats', 'Queued, written, dropped, and failed rows of the background loggers', 'logger')
+
+METRICS = [STAGE_DURATION, REQUEST_DURATION, DB_QUERY_DURATION, DB_QUERIES_PER_REQUEST, SLOW_REQUEST_PROFILES, CACHE_STATS, LOGGER_STATS]
+
+def register_cache(name, cache):
+    '''
+    Export the stats() of the cache on the /metrics endpoint
+    '''
+    if cache is not None:
+        CACHE_STATS.sources[name] = cache
+
+def register_logger(name, logger):
+    '''
+    Export the stats() of the background logger on the /metrics endpoint
+    '''
+    if logger is not None:
+        LOGGER_STATS.sources[name] = logger
+
+def render_metrics():
+    '''
+    Render every metric in the Prometheus text exposition format
+    Metrics are held per process, so with several gunicorn workers each scrape sees a single worker's values
+    '''
+    lines = []
+    for metric in METRICS:
+        lines.append('# HELP {} {}'.format(metric.name, metric.description))
+        lines.append('# TYPE {} {}'.format(metric.name, metric.type_name))
+        for name, labels, value in metric.iter_samples():
+            lines.append('{}{} {}'.format(name, format_labels(labels), repr(value) if isinstance(value, float) else value))
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def stage_timer(stage):
+    '''
+    Time the enclosed block as the named stage, recording it in the stage histogram, and in the
+    current request's Server-Timing header if there is one
+    '''
+    start = time()
+    try:
+        yield
+    finally:
+        elapsed = time() - start
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        if has_request_context():
+            stage_timings = g.setdefault('stage_timings', OrderedDict())
+            stage_timings[stage] = stage_timings.get(stage, 0.) + elapsed
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_start_times', []).append(time())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time() - conn.info['query_start_times'].pop()
+    DB_QUERY_DURATION.observe(elapsed)
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+        g.db_seconds = g.get('db_seconds', 0.) + elapsed
+
+
+def get_server_timing():
+    '''
+    Server-Timing header value of the current request, with durations in milliseconds
+    '''
+    metrics = ['{};dur={:.1f}'.format(stage, 1000*seconds) for stage, seconds in g.get('stage_timings', {}).items()]
+    metrics.append('db;dur={:.1f};desc="{} queries"'.format(1000*g.get('db_seconds', 0.), g.get('db_queries', 0)))
+    metrics.append('total;dur={:.1f}'.format(1000*(time()-g.request_start)))
+    return ', '.join(metrics)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time()
+    # Opt-in profiling of a random sample of requests, of which only the slow ones are dumped
+    if app.config.get('PROFILE_DIR') and random.random() < app.config.get('PROFILE_SAMPLE_RATE', 1.0):
+        g.profiler = cProfile.Profile()
+        g.profiler.enable()
+
+@app.after_request
+def record_request_timings(response):
+    # Requests answered by an earlier before_request hook (e.g. SSLify's redirects) were never timed
+    if 'request_start' not in g:
+        return response
+    elapsed = time() - g.request_start
+    endpoint = request.endpoint or 'unknown'
+    REQUEST_DURATION.observe(elapsed, endpoint=endpoint, status=response.status_code)
+    DB_QUERIES_PER_REQUEST.observe(g.get('db_queries', 0))
+    response.headers['Server-Timing'] = get_server_timing()
+
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+        if elapsed >= app.config.get('PROFILE_SLOW_REQUEST_SECONDS', 1.0):
+            profile_dir = app.config['PROFILE_DIR']
+            if not os.path.isdir(profile_dir):
+                os.makedirs(profile_dir)
+            profiler.dump_stats(os.path.join(profile_dir, '{}_{}_{}.prof'.format(
+                datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'), endpoint, os.getpid())))
+            SLOW_REQUEST_PROFILES.inc(endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def stop_profiler(exception):
+    # after_request is skipped when a request fails, so make sure its profiler is never left running
+    profiler = g.pop('profiler', None)
+    if profiler is not None:
+        profiler.disable()
+
+@app.route('/metrics')
+def metrics():
+    '''
+    Prometheus scrape endpoint
+    '''
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
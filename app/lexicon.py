@@ -0,0 +1,255 @@
+import numpy as np
+from app.phones import PHONES, PHONE_IS_VOWEL, PHONE_IS_CONSONANT, PHONE_IS_STRESSED_VOWEL, get_phone_ids
+from app.alignment import iter_aligned_words
+
+# Phones come back from the words table as unicode strings, and e.g. Pun.subscript_phone_stress relies on that
+UNICODE_PHONES = [unicode(phone) for phone in PHONES]
+
+
+class LexiconWord(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Lightweight, DB-free stand-in for a Word row, backed by the arrays of a Lexicon
+    Exposes the same attributes/methods that Portmanteau.get_pun and Rhyme.get_pun rely on
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    id, Int : index of the word within the lexicon
+    grapheme, String : the word's spelling
+    phoneme, List[String] : the word's stressed phones
+    phone_ids, Array[Int] : integer IDs of the word's phones
+    '''
+
+    def __init__(self, lexicon, idx):
+        self.lexicon = lexicon
+        self.id = idx
+        self.grapheme = lexicon.graphemes[idx]
+        phone_start, phone_end = lexicon.phone_offsets[idx], lexicon.phone_offsets[idx+1]
+        self.phone_ids = lexicon.phone_ids[phone_start:phone_end]
+        self.phoneme = [UNICODE_PHONES[phone_id] for phone_id in self.phone_ids]
+        # Boundary lookups are indexed by phone position + 1, so that positions -1..len(phoneme) are all addressable
+        boundary_start = phone_start + 2*idx
+        self._start_chunks = lexicon.start_chunks[boundary_start:boundary_start+len(self.phoneme)+2].tolist()
+        self._end_chunks = lexicon.end_chunks[boundary_start:boundary_start+len(self.phoneme)+2].tolist()
+        chunk_start, chunk_end = lexicon.chunk_offsets[idx], lexicon.chunk_offsets[idx+1]
+        self._grapheme_chunk_offsets = lexicon.grapheme_chunk_offsets[chunk_start+idx:chunk_end+idx+1].tolist()
+        self._phoneme_chunk_offsets = lexicon.phoneme_chunk_offsets[chunk_start+idx:chunk_end+idx+1].tolist()
+        self._vowel_counts = None
+        self._consonant_counts = None
+
+    def __repr__(self):
+        return "<Word(grapheme='%s', phoneme='%s')>" % (self.grapheme, '-'.join(self.phoneme))
+
+    @property
+    def grapheme_chunks(self):
+        offsets = self._grapheme_chunk_offsets
+        return [tuple(self.grapheme[offsets[c]:offsets[c+1]]) for c in range(len(offsets)-1)]
+
+    @property
+    def phoneme_chunks(self):
+        offsets = self._phoneme_chunk_offsets
+        return [tuple(self.phoneme[offsets[c]:offsets[c+1]]) for c in range(len(offsets)-1)]
+
+    def get_subgrapheme_from_subphoneme_inds(self, start_idx, end_idx, return_inds=False):
+        '''
+        Return the subgrapheme string (return_inds=False), or inclusive subgrapheme indices (return_inds=True),
+        corresponding to the subphoneme starting at start_idx and ending at end_idx, inclusive
+
+        Equivalent to Word.get_subgrapheme_from_subphoneme_inds, but the chunk boundaries are precomputed,
+        so each check is a single list lookup
+        '''
+        n_phones = len(self.phoneme)
+
+        # Include null-graphs at the boundaries, i.e. the first chunk starting at start_idx and the last chunk ending at end_idx
+        start_chunk_idx = self._start_chunks[start_idx+1] if -1 <= start_idx <= n_phones else -1
+        if start_chunk_idx < 0:
+            raise Exception('\'start_idx\' falls in the middle of a phoneme chunk')
+
+        end_chunk_idx = self._end_chunks[end_idx+1] if -1 <= end_idx <= n_phones else -1
+        if end_chunk_idx < 0:
+            raise Exception('\'end_idx\' falls in the middle of a phoneme chunk')
+
+        subgrapheme_start_idx = self._grapheme_chunk_offsets[start_chunk_idx]
+        subgrapheme_end_idx = self._grapheme_chunk_offsets[end_chunk_idx+1] - 1
+        if not return_inds:
+            # Return the subgrapheme corresponding to the providing subphoneme indices
+            return list(self.grapheme[subgrapheme_start_idx:subgrapheme_end_idx+1])
+        else:
+            # Return the subgrapheme *indices* corresponding to the providing subphoneme indices
+            return subgrapheme_start_idx, subgrapheme_end_idx
+
+    def get_destressed_phoneme(self):
+        '''
+        Strip the stress information off of the phoneme
+        '''
+        return [filter(str.isalpha, str(phone)) for phone in self.phoneme]
+
+    def _build_prefix_counts(self):
+        self._vowel_counts = [0] + np.cumsum(PHONE_IS_VOWEL[self.phone_ids]).tolist()
+        self._consonant_counts = [0] + np.cumsum(PHONE_IS_CONSONANT[self.phone_ids]).tolist()
+
+    def get_num_vowel_phones(self, start_idx, end_idx):
+        '''
+        Return the number of vowel phones in the subphoneme starting at start_idx and ending at end_idx, inclusive
+        '''
+        if self._vowel_counts is None:
+            self._build_prefix_counts()
+        return self._vowel_counts[end_idx+1] - self._vowel_counts[start_idx]
+
+    def get_num_consonant_phones(self, start_idx, end_idx):
+        '''
+        Return the number of consonant phones in the subphoneme starting at start_idx and ending at end_idx, inclusive
+        '''
+        if self._consonant_counts is None:
+            self._build_prefix_counts()
+        return self._consonant_counts[end_idx+1] - self._consonant_counts[start_idx]
+
+    def is_stressed_vowel(self, idx):
+        '''
+        Return True iff the phone at idx is a vowel carrying a primary or secondary stress
+        '''
+        return bool(PHONE_IS_STRESSED_VOWEL[self.phone_ids[idx]])
+
+
+class Lexicon(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Read-only, in-memory copy of the words table, built once per process
+
+    Every word's phones are stored as integer phone IDs in a single flat array, and the
+    grapheme/phoneme alignment is precomputed into flat arrays of chunk boundaries, so
+    the alignment checks made while generating puns are constant-time index lookups
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    graphemes, List[String] : spelling of each word
+    grapheme_index, Dict[String,Int] : index of each grapheme in the lexicon
+    phone_ids, Array[Int] : concatenated phone IDs of every word
+    phone_offsets, Array[Int] : word i's phone IDs are phone_ids[phone_offsets[i]:phone_offsets[i+1]]
+    start_chunks, Array[Int] : first chunk starting at each phone position -1..len(phoneme), or -1 if none
+    end_chunks, Array[Int] : last chunk ending at each phone position -1..len(phoneme), or -1 if none
+    chunk_offsets, Array[Int] : word i has chunk_offsets[i+1]-chunk_offsets[i] grapheme/phoneme chunks
+    grapheme_chunk_offsets, Array[Int] : start index of each grapheme chunk within its grapheme, plus the grapheme length
+    phoneme_chunk_offsets, Array[Int] : start index of each phoneme chunk within its phoneme, plus the phoneme length
+    '''
+
+    def __init__(self, rows):
+        '''
+        rows is an iterable of (grapheme, phoneme, grapheme_chunks, phoneme_chunks) tuples
+        '''
+        self.graphemes = []
+        self.grapheme_index = {}
+        phone_ids, phone_offsets = [], [0]
+        start_chunks, end_chunks = [], []
+        chunk_offsets, grapheme_chunk_offsets, phoneme_chunk_offsets = [0], [], []
+
+        for grapheme, phoneme, grapheme_chunks, phoneme_chunks in rows:
+            grapheme = str(grapheme)
+            self.grapheme_index.setdefault(grapheme, len(self.graphemes))
+            self.graphemes.append(grapheme)
+
+            phone_ids.extend(get_phone_ids(phoneme))
+            phone_offsets.append(len(phone_ids))
+
+            # Mirror the cumsum logic in Word.get_subgrapheme_from_subphoneme_inds:
+            # keep the *first* chunk starting at a position, and the *last* chunk ending at a position
+            word_start_chunks = [-1] * (len(phoneme)+2)
+            word_end_chunks = [-1] * (len(phoneme)+2)
+            chunk_start = 0
+            for chunk_idx, chunk in enumerate(phoneme_chunks):
+                if word_start_chunks[chunk_start+1] < 0:
+                    word_start_chunks[chunk_start+1] = chunk_idx
+                word_end_chunks[chunk_start+len(chunk)] = chunk_idx
+                chunk_start += len(chunk)
+            start_chunks.extend(word_start_chunks)
+            end_chunks.extend(word_end_chunks)
+
+            chunk_offsets.append(chunk_offsets[-1] + len(grapheme_chunks))
+            grapheme_chunk_offsets.extend(np.cumsum([0] + map(len, grapheme_chunks)).tolist())
+            phoneme_chunk_offsets.extend(np.cumsum([0] + map(len, phoneme_chunks)).tolist())
+
+        self.phone_ids = np.array(phone_ids, dtype=np.int16)
+        self.phone_offsets = np.array(phone_offsets, dtype=np.int32)
+        self.start_chunks = np.array(start_chunks, dtype=np.int16)
+        self.end_chunks = np.array(end_chunks, dtype=np.int16)
+        self.chunk_offsets = np.array(chunk_offsets, dtype=np.int32)
+        self.grapheme_chunk_offsets = np.array(grapheme_chunk_offsets, dtype=np.int16)
+        self.phoneme_chunk_offsets = np.array(phoneme_chunk_offsets, dtype=np.int16)
+
+    def __len__(self):
+        return len(self.graphemes)
+
+    def __contains__(self, grapheme):
+        return grapheme in self.grapheme_index
+
+    @classmethod
+    def from_word_table(cls, Word, db):
+        '''
+        Build the lexicon from the words table with a single query
+        '''
+        rows = db.session.query(Word.grapheme, Word.phoneme, Word.grapheme_chunks, Word.phoneme_chunks).order_by(Word.id)
+        return cls(rows)
+
+    @classmethod
+    def from_align_file(cls, align_path, cmu_dict):
+        '''
+        Build the lexicon straight from the m2m-aligner output, without touching the database
+        '''
+        return cls(iter_aligned_words(align_path, cmu_dict))
+
+    @classmethod
+    def from_data_bundle(cls, data_bundle):
+        '''
+        Build the lexicon from the words of a local data bundle, see app.data_bundle
+        '''
+        return cls(data_bundle.iter_words())
+
+    def get_word(self, grapheme):
+        '''
+        Return the LexiconWord for the grapheme, or None if it is not in the lexicon
+        '''
+        idx = self.grapheme_index.get(grapheme)
+        if idx is None:
+            return None
+        return LexiconWord(self, idx)
+
+    def get_words(self, graphemes):
+        '''
+        Return LexiconWords for each of the graphemes present in the lexicon; drop-in for
+        Word.query.filter(Word.grapheme.in_(graphemes)).all()
+        '''
+        return [LexiconWord(self, self.grapheme_index[g]) for g in set(graphemes) if g in self.grapheme_index]
+
+
+# Process-wide lexicon, loaded on first use
+_lexicon = None
+
+def get_lexicon():
+    '''
+    Return the process-wide Lexicon, building it from the data bundle if DATA_BACKEND is 'bundle', and from the
+    words table otherwise, the first time it is requested
+    '''
+    global _lexicon
+    if _lexicon is None:
+        from app import db
+        from app.models import Word
+        from app.data_bundle import get_data_bundle
+        data_bundle = get_data_bundle()
+        if data_bundle is not None:
+            _lexicon = Lexicon.from_data_bundle(data_bundle)
+        else:
+            _lexicon = Lexicon.from_word_table(Word, db)
+    return _lexicon
+
+def set_lexicon(lexicon):
+    '''
+    Install a prebuilt Lexicon as the process-wide lexicon, e.g. one built with Lexicon.from_align_file
+    '''
+    global _lexicon
+    _lexicon = lexicon
@@ -1,4 +1,7 @@
 from app import db
+from app.frequency_store import FrequencyStore
+from app.data_bundle import get_data_bundle
+from app.phones import DESTRESSED_PHONES, get_phoneme_features, get_mask_prefix_counts
 import numpy as np
 
 
@@ -10,6 +13,11 @@ class Word(db.Model):
     phoneme = db.Column(db.ARRAY(db.String))
     grapheme_chunks = db.Column(db.JSON)
     phoneme_chunks = db.Column(db.JSON)
+    # Phonetic features precomputed by app.phones.get_phoneme_features when the table is populated
+    destressed_phone_ids = db.Column(db.ARRAY(db.Integer))
+    vowel_mask = db.Column(db.BigInteger)
+    consonant_mask = db.Column(db.BigInteger)
+    stressed_vowel_mask = db.Column(db.BigInteger)
 
     def __repr__(self):
         return "<Word(grapheme='%s', phoneme='%s')>" % (self.grapheme, '-'.join(self.phoneme))
@@ -47,7 +55,54 @@ class Word(db.Model):
         '''
         Strip the stress information off of the phoneme
         '''
-        return [filter(str.isalpha, str(phone)) for phone in self.phoneme]
+        if self.destressed_phone_ids is None:
+            return [filter(str.isalpha, str(phone)) for phone in self.phoneme]
+        return [DESTRESSED_PHONES[phone_id] for phone_id in self.destressed_phone_ids]
+
+    def get_phoneme_features(self):
+        '''
+        Return the precomputed phonetic features, computing them on the fly for rows populated before the feature columns existed
+        '''
+        if self.vowel_mask is None:
+            return get_phoneme_features(self.phoneme)
+        return {
+            'destressed_phone_ids': self.destressed_phone_ids,
+            'vowel_mask': self.vowel_mask,
+            'consonant_mask': self.consonant_mask,
+            'stressed_vowel_mask': self.stressed_vowel_mask,
+            }
+
+    def _get_prefix_counts(self):
+        '''
+        Prefix counts of the vowel and consonant phones, built from the bitmasks once per instance
+        '''
+        if getattr(self, '_prefix_counts', None) is None:
+            features = self.get_phoneme_features()
+            self._stressed_vowel_mask = features['stressed_vowel_mask']
+            self._prefix_counts = (get_mask_prefix_counts(features['vowel_mask'], len(self.phoneme)),
+                                   get_mask_prefix_counts(features['consonant_mask'], len(self.phoneme)))
+        return self._prefix_counts
+
+    def get_num_vowel_phones(self, start_idx, end_idx):
+        '''
+        Return the number of vowel phones in the subphoneme starting at start_idx and ending at end_idx, inclusive
+        '''
+        vowel_counts = self._get_prefix_counts()[0]
+        return vowel_counts[end_idx+1] - vowel_counts[start_idx]
+
+    def get_num_consonant_phones(self, start_idx, end_idx):
+        '''
+        Return the number of consonant phones in the subphoneme starting at start_idx and ending at end_idx, inclusive
+        '''
+        consonant_counts = self._get_prefix_counts()[1]
+        return consonant_counts[end_idx+1] - consonant_counts[start_idx]
+
+    def is_stressed_vowel(self, idx):
+        '''
+        Return True iff the phone at idx is a vowel carrying a primary or secondary stress
+        '''
+        self._get_prefix_counts()
+        return bool((self._stressed_vowel_mask >> idx) & 1)
 
 
 class SubgraphemeFrequency(db.Model):
@@ -62,24 +117,31 @@ class SubgraphemeFrequency(db.Model):
     def __repr__(self):
         return "<SubgraphemeFrequency(grapheme='%s', frequency=%i, frequency_head=%i, frequency_tail=%i)>" % (self.grapheme, self.frequency, self.frequency_head, self.frequency_tail)
 
+    # Process-wide in-memory copy of the table, loaded on first use
+    _frequency_store = None
+
+    @classmethod
+    def get_frequency_store(cls):
+        '''
+        Load the full table into a FrequencyStore with a single query, and cache it for the life of the process
+        The table is read from the data bundle instead if DATA_BACKEND is 'bundle'
+        '''
+        if cls._frequency_store is None:
+            data_bundle = get_data_bundle()
+            if data_bundle is not None:
+                rows = data_bundle.iter_subgrapheme_frequencies()
+            else:
+                rows = db.session.query(cls.grapheme, cls.frequency, cls.frequency_head, cls.frequency_tail)
+            cls._frequency_store = FrequencyStore.from_rows(rows)
+        return cls._frequency_store
+
     @classmethod
     def get_subgrapheme_frequency(cls, this_grapheme, side='all'):
         '''
         Return the frequency of the grapheme
+        If the grapheme is not present in the table i.e. because it is too long, return the default frequency of 1
         '''
-        try:
-            subgrapheme_frequency = cls.query.filter_by(grapheme=this_grapheme).one()
-        except:
-            # if the grapheme is not present in the database i.e. because it is too long, return the default frequency of 1
-            return 1
-        if side == 'head':
-            return subgrapheme_frequency.frequency_head
-        elif side == 'tail':
-            return subgrapheme_frequency.frequency_tail
-        elif side == 'all':
-            return subgrapheme_frequency.frequency
-        else:
-            raise "Argument 'side' must be either 'head', 'tail', or 'all'"
+        return cls.get_frequency_store().get_frequency(this_grapheme, side)
 
 
 class SubphonemeFrequency(db.Model):
@@ -94,24 +156,32 @@ class SubphonemeFrequency(db.Model):
     def __repr__(self):
         return "<SubphonemeFrequency(phoneme='%s', frequency=%i, frequency_head=%i, frequency_tail=%i)>" % (self.phoneme, self.frequency, self.frequency_head, self.frequency_tail)
 
+    # Process-wide in-memory copy of the table, loaded on first use
+    _frequency_store = None
+
+    @classmethod
+    def get_frequency_store(cls):
+        '''
+        Load the full table into a FrequencyStore with a single query, and cache it for the life of the process
+        Phonemes are stored as ARRAYs, so convert them to tuples to make them hashable
+        The table is read from the data bundle instead if DATA_BACKEND is 'bundle'
+        '''
+        if cls._frequency_store is None:
+            data_bundle = get_data_bundle()
+            if data_bundle is not None:
+                rows = data_bundle.iter_subphoneme_frequencies()
+            else:
+                rows = db.session.query(cls.phoneme, cls.frequency, cls.frequency_head, cls.frequency_tail)
+            cls._frequency_store = FrequencyStore.from_rows(rows, key_func=tuple)
+        return cls._frequency_store
+
     @classmethod
     def get_subphoneme_frequency(cls, this_phoneme, side='all'):
         '''
         Return the frequency of the phoneme
+        If the phoneme is not present in the table i.e. because it is too long, return the default frequency of 1
         '''
-        try:
-            subphoneme_frequency = cls.query.filter_by(phoneme=this_phoneme).one()
-        except:
-            # if the phoneme is not present in the database i.e. because it is too long, return the default frequency of 1
-            return 1
-        if side == 'head':
-            return subphoneme_frequency.frequency_head
-        elif side == 'tail':
-            return subphoneme_frequency.frequency_tail
-        elif side == 'all':
-            return subphoneme_frequency.frequency
-        else:
-            raise "Argument 'side' must be either 'head', 'tail', or 'all'"
+        return cls.get_frequency_store().get_frequency(tuple(this_phoneme), side)
 
 
 class FasttextNeighbor(db.Model):
@@ -120,6 +190,8 @@ class FasttextNeighbor(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     grapheme = db.Column(db.String, index=True, unique=True)
     neighbors = db.Column(db.ARRAY(db.String))
+    # Neighbors already downcased, reduced to their shortest lemmas, and deduplicated (see helper_utils.reduce_neighbor_graphemes)
+    semantic_neighbors = db.Column(db.ARRAY(db.String))
 
     def __repr__(self):
         return "<FasttextNeighbor(grapheme='%s', neighbors=...)>" % (self.grapheme)
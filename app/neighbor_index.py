@@ -0,0 +1,190 @@
+import os
+import json
+import numpy as np
+
+# Files making up an index directory
+VECTORS_FILE = 'vectors.npy'
+CENTROIDS_FILE = 'centroids.npy'
+LIST_OFFSETS_FILE = 'list_offsets.npy'
+GRAPHEMES_FILE = 'graphemes.json'
+METADATA_FILE = 'index.json'
+
+# Defaults matching the precomputed neighbors, see scripts/precompute_word_vector_nearest_neighbors.py
+DEFAULT_N_NEIGHBORS = 200
+DEFAULT_MIN_SIMILARITY = 0.35
+
+
+def normalize_rows(vectors):
+    '''
+    Scale each row to unit length, so that inner products are cosine similarities
+    '''
+    norms = np.linalg.norm(vectors, axis=1)
+    norms[norms == 0] = 1
+    return vectors / norms[:, np.newaxis]
+
+def assign_to_centroids(vectors, centroids, block_size=10000):
+    '''
+    Return the index of the most similar centroid to each (normalized) vector, processing the vectors in blocks to bound memory
+    '''
+    assignments = np.zeros(len(vectors), dtype=np.int32)
+    for block_start in range(0, len(vectors), block_size):
+        block = np.asarray(vectors[block_start:block_start+block_size], dtype=np.float32)
+        assignments[block_start:block_start+len(block)] = block.dot(centroids.T).argmax(axis=1)
+    return assignments
+
+def train_centroids(vectors, n_lists, n_iter=10, sample_size=100000, seed=0):
+    '''
+    Spherical k-means over a random sample of the (normalized) vectors, returning an (n_lists x dim) matrix of unit-length centroids
+    '''
+    rng = np.random.RandomState(seed)
+    sample_inds = np.sort(rng.choice(len(vectors), size=min(sample_size, len(vectors)), replace=False))
+    sample = np.asarray(vectors[sample_inds], dtype=np.float32)
+    centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)]
+    for _ in range(n_iter):
+        assignments = assign_to_centroids(sample, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignments, sample)
+        # Re-seed empty lists with random sample vectors
+        empty = np.bincount(assignments, minlength=n_lists) == 0
+        sums[empty] = sample[rng.choice(len(sample), size=empty.sum(), replace=False)]
+        centroids = normalize_rows(sums).astype(np.float32)
+    return centroids
+
+def build_neighbor_index(vectors, graphemes, path, n_lists=1024, n_probe=32, n_iter=10, sample_size=100000, seed=0):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Build an inverted-file (IVF) index over the word vectors and save it to the directory 'path'
+
+    The vectors are clustered around n_lists centroids with spherical k-means, and stored grouped by
+    centroid, so that the vectors of each list are a contiguous slice of a single memory-mapped matrix
+
+    ----------
+    # INPUTS #
+    ----------
+    vectors, Array[Float] : (n_words x dim) word vectors, already post-processed (normalized here)
+    graphemes, List[String] : grapheme of each row of vectors
+    path, String : directory to write the index to
+    n_lists, Int : number of inverted lists (centroids)
+    n_probe, Int : default number of lists searched per query
+    '''
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    vectors = normalize_rows(np.asarray(vectors, dtype=np.float32))
+    centroids = train_centroids(vectors, n_lists, n_iter=n_iter, sample_size=sample_size, seed=seed)
+    assignments = assign_to_centroids(vectors, centroids)
+    order = np.argsort(assignments, kind='mergesort')
+    list_offsets = np.concatenate([[0], np.cumsum(np.bincount(assignments, minlength=n_lists))]).astype(np.int64)
+
+    # Write the vectors in list order, one block at a time
+    index_vectors = np.lib.format.open_memmap(os.path.join(path, VECTORS_FILE), mode='w+', dtype=np.float32, shape=(len(order), vectors.shape[1]))
+    block_size = 10000
+    for block_start in range(0, len(order), block_size):
+        block_inds = order[block_start:block_start+block_size]
+        index_vectors[block_start:block_start+len(block_inds)] = vectors[block_inds]
+    index_vectors.flush()
+    del index_vectors
+
+    np.save(os.path.join(path, CENTROIDS_FILE), centroids)
+    np.save(os.path.join(path, LIST_OFFSETS_FILE), list_offsets)
+    with open(os.path.join(path, GRAPHEMES_FILE), 'w') as f:
+        json.dump([graphemes[idx] for idx in order], f)
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump({'n_vectors': len(order), 'dim': vectors.shape[1], 'n_lists': n_lists, 'n_probe': n_probe}, f)
+
+
+class NeighborIndex(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Read-only approximate nearest-neighbor index over the normalized word vectors, see build_neighbor_index
+
+    A query only scores the vectors in the n_probe lists whose centroids are most similar to it,
+    and the vectors are memory-mapped, so loading is instant and only the probed lists are paged in
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    vectors, Array[Float] : memory-mapped (n_words x dim) unit-length vectors, grouped by list
+    centroids, Array[Float] : (n_lists x dim) unit-length list centroids
+    list_offsets, Array[Int] : the vectors of list c are vectors[list_offsets[c]:list_offsets[c+1]]
+    graphemes, List[String] : grapheme of each row of vectors
+    grapheme_index, Dict[String,Int] : row of each grapheme
+    n_probe, Int : default number of lists searched per query
+    '''
+
+    def __init__(self, path):
+        with open(os.path.join(path, METADATA_FILE)) as f:
+            metadata = json.load(f)
+        self.vectors = np.load(os.path.join(path, VECTORS_FILE), mmap_mode='r')
+        self.centroids = np.load(os.path.join(path, CENTROIDS_FILE))
+        self.list_offsets = np.load(os.path.join(path, LIST_OFFSETS_FILE))
+        with open(os.path.join(path, GRAPHEMES_FILE)) as f:
+            self.graphemes = [grapheme.encode('utf-8') for grapheme in json.load(f)]
+        self.grapheme_index = dict((grapheme, idx) for idx, grapheme in enumerate(self.graphemes))
+        self.n_probe = metadata['n_probe']
+
+    def __len__(self):
+        return len(self.graphemes)
+
+    def __contains__(self, grapheme):
+        return grapheme in self.grapheme_index
+
+    def get_vector(self, grapheme):
+        return np.asarray(self.vectors[self.grapheme_index[grapheme]])
+
+    def query_vector(self, vector, n=DEFAULT_N_NEIGHBORS, s=DEFAULT_MIN_SIMILARITY, n_probe=None):
+        '''
+        Return the (grapheme, similarity) pairs of the (approximately) n+1 most similar vectors with similarity >= s, most similar first
+        n+1 rather than n, since a word's own vector is always its nearest neighbor, as in the precomputed neighbor lists
+        '''
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        vector = np.asarray(vector, dtype=np.float32)
+        vector = vector / max(np.linalg.norm(vector), 1e-12)
+
+        probed_lists = np.argpartition(-self.centroids.dot(vector), n_probe-1)[:n_probe]
+        row_inds = np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c+1]) for c in probed_lists])
+        if len(row_inds) == 0:
+            return []
+        sims = np.concatenate([self.vectors[self.list_offsets[c]:self.list_offsets[c+1]].dot(vector) for c in probed_lists])
+
+        n_top = min(n+1, len(sims))
+        top_inds = np.argpartition(-sims, n_top-1)[:n_top]
+        top_inds = top_inds[np.argsort(-sims[top_inds], kind='mergesort')]
+        return [(self.graphemes[row_inds[idx]], float(sims[idx])) for idx in top_inds if sims[idx] >= s]
+
+    def query(self, grapheme, n=DEFAULT_N_NEIGHBORS, s=DEFAULT_MIN_SIMILARITY, n_probe=None):
+        '''
+        Return the graphemes of the semantic neighbors of the grapheme, see query_vector, or None if the grapheme is not indexed
+        '''
+        if grapheme not in self.grapheme_index:
+            return None
+        return [neighbor for neighbor, sim in self.query_vector(self.get_vector(grapheme), n=n, s=s, n_probe=n_probe)]
+
+
+# Process-wide neighbor index, loaded on first use
+_neighbor_index = None
+
+def get_neighbor_index():
+    '''
+    Return the process-wide NeighborIndex, loading it from the app's NEIGHBOR_INDEX_PATH the first time it is requested,
+    or None if no index is configured
+    '''
+    global _neighbor_index
+    if _neighbor_index is None:
+        from app import app
+        path = app.config.get('NEIGHBOR_INDEX_PATH')
+        if not path:
+            return None
+        _neighbor_index = NeighborIndex(path)
+    return _neighbor_index
+
+def set_neighbor_index(neighbor_index):
+    '''
+    Install a prebuilt NeighborIndex as the process-wide index
+    '''
+    global _neighbor_index
+    _neighbor_index = neighbor_index
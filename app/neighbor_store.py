@@ -0,0 +1,237 @@
+import os
+import json
+import numpy as np
+from collections import namedtuple
+
+# Files making up a store directory
+VOCAB_PREFIX = 'vocab'
+SEMANTIC_VOCAB_PREFIX = 'semantic_vocab'
+OFFSETS_FILE = 'offsets.npy'
+NEIGHBOR_IDS_FILE = 'neighbor_ids.npy'
+SEMANTIC_OFFSETS_FILE = 'semantic_offsets.npy'
+SEMANTIC_NEIGHBOR_IDS_FILE = 'semantic_neighbor_ids.npy'
+METADATA_FILE = 'store.json'
+
+# Same fields as a FasttextNeighbor row, so that either can be used interchangeably
+NeighborRow = namedtuple('NeighborRow', ['grapheme', 'neighbors', 'semantic_neighbors'])
+
+INT32_MAX = np.iinfo(np.int32).max
+
+
+def encode_grapheme(grapheme):
+    return grapheme.encode('utf-8') if isinstance(grapheme, unicode) else grapheme
+
+def save_array(path, array):
+    '''
+    Save the array to path under a temporary name and then rename it, so readers never see a partial file,
+    and processes which already have the old file memory-mapped keep reading a consistent copy
+    '''
+    with open(path + '.tmp', 'wb') as f:
+        np.save(f, array)
+    os.rename(path + '.tmp', path)
+
+def write_string_table(path, prefix, strings):
+    '''
+    Write the (already sorted, utf-8 encoded) strings as one concatenated byte array plus an array of their offsets
+    '''
+    lengths = np.array(map(len, strings), dtype=np.int64)
+    save_array(os.path.join(path, prefix + '_offsets.npy'), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+    save_array(os.path.join(path, prefix + '_strings.npy'), np.frombuffer(''.join(strings), dtype=np.uint8))
+
+def write_csr(offsets_path, neighbor_ids_path, neighbor_id_lists):
+    lengths = np.array(map(len, neighbor_id_lists), dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    if offsets[-1] > INT32_MAX:
+        raise ValueError('Too many neighbors for int32 offsets: {}'.format(offsets[-1]))
+    neighbor_ids = np.concatenate(neighbor_id_lists) if neighbor_id_lists else np.zeros(0)
+    save_array(neighbor_ids_path, neighbor_ids.astype(np.int32))
+    save_array(offsets_path, offsets.astype(np.int32))
+
+def write_neighbor_store(path, graphemes, offsets, neighbor_ids):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Write the precomputed neighbors to the directory 'path', as a sorted vocab string table plus a CSR-style
+    pair of int32 offsets/neighbor-ID arrays indexed by position in the vocab, see NeighborStore
+
+    ----------
+    # INPUTS #
+    ----------
+    graphemes, List[String] : grapheme of each word
+    offsets, Array[Int] : the neighbors of word i are neighbor_ids[offsets[i]:offsets[i+1]]
+    neighbor_ids, Array[Int] : indices into graphemes of the neighbors of every word, most similar first
+    '''
+    if not os.path.isdir(path):
+        os.makedirs(path)
+
+    encoded_graphemes = map(encode_grapheme, graphemes)
+    order = sorted(range(len(encoded_graphemes)), key=encoded_graphemes.__getitem__)
+    sorted_graphemes = [encoded_graphemes[idx] for idx in order]
+    if any(g1 == g2 for g1, g2 in zip(sorted_graphemes, sorted_graphemes[1:])):
+        raise ValueError('Graphemes must be unique')
+
+    # Renumber the words by their position in the sorted vocab
+    vocab_ids = np.zeros(len(order), dtype=np.int32)
+    vocab_ids[order] = np.arange(len(order), dtype=np.int32)
+
+    write_string_table(path, VOCAB_PREFIX, sorted_graphemes)
+    write_csr(os.path.join(path, OFFSETS_FILE), os.path.join(path, NEIGHBOR_IDS_FILE),
+              [vocab_ids[neighbor_ids[offsets[idx]:offsets[idx+1]]] for idx in order])
+    with open(os.path.join(path, METADATA_FILE), 'w') as f:
+        json.dump({'n_words': len(order), 'n_neighbors': int(offsets[-1]) if len(offsets) else 0}, f)
+
+def write_semantic_neighbors(path, semantic_neighbor_lists):
+    '''
+    Add the lemmatized/deduplicated neighbors of every word to an existing store, in the same format as the raw neighbors
+    semantic_neighbor_lists[i] are the semantic neighbor graphemes of the i'th word of the store's vocab
+    The semantic neighbors are not necessarily words in the vocab, so they get a string table of their own
+    '''
+    semantic_neighbor_lists = [map(encode_grapheme, neighbors) for neighbors in semantic_neighbor_lists]
+    semantic_vocab = sorted(set(g for neighbors in semantic_neighbor_lists for g in neighbors))
+    semantic_vocab_ids = dict((g, idx) for idx, g in enumerate(semantic_vocab))
+
+    write_string_table(path, SEMANTIC_VOCAB_PREFIX, semantic_vocab)
+    write_csr(os.path.join(path, SEMANTIC_OFFSETS_FILE), os.path.join(path, SEMANTIC_NEIGHBOR_IDS_FILE),
+              [np.array(sorted(semantic_vocab_ids[g] for g in neighbors), dtype=np.int32) for neighbors in semantic_neighbor_lists])
+
+
+class StringTable(object):
+    '''
+    Read-only sorted table of strings, stored as one concatenated byte array plus an array of their offsets
+    Strings are looked up by binary search over the raw bytes, so no per-string Python objects are held
+    '''
+
+    def __init__(self, data, offsets):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def load(cls, path, prefix):
+        '''
+        Memory-map a table written by write_string_table
+        '''
+        return cls(np.load(os.path.join(path, prefix + '_strings.npy'), mmap_mode='r'),
+                   np.load(os.path.join(path, prefix + '_offsets.npy'), mmap_mode='r'))
+
+    @classmethod
+    def from_strings(cls, strings):
+        '''
+        Build an in-memory table of the (not necessarily sorted or distinct) strings
+        '''
+        strings = sorted(set(map(encode_grapheme, strings)))
+        lengths = np.array(map(len, strings), dtype=np.int64)
+        return cls(np.frombuffer(''.join(strings), dtype=np.uint8), np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64))
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __contains__(self, string):
+        return self.index(string) is not None
+
+    def get_bytes(self, idx):
+        return self.data[self.offsets[idx]:self.offsets[idx+1]].tostring()
+
+    def __getitem__(self, idx):
+        return self.get_bytes(idx).decode('utf-8')
+
+    def index(self, string):
+        '''
+        Return the position of the string in the table, or None if it is absent
+        '''
+        string = encode_grapheme(string)
+        low, high = 0, len(self)
+        while low < high:
+            mid = (low + high) // 2
+            if self.get_bytes(mid) < string:
+                low = mid + 1
+            else:
+                high = mid
+        if low < len(self) and self.get_bytes(low) == string:
+            return low
+        return None
+
+
+class NeighborStore(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Read-only store of the precomputed semantic neighbors, see write_neighbor_store
+
+    Every array is memory-mapped, so loading takes milliseconds, and the pages are shared by every process
+    (e.g. gunicorn worker) reading the same store, rather than each holding its own copy
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    vocab, StringTable : sorted graphemes, the i'th of which is word i
+    offsets, Array[Int] : the neighbors of word i are neighbor_ids[offsets[i]:offsets[i+1]]
+    neighbor_ids, Array[Int] : word ids of the neighbors of every word, most similar first
+    semantic_vocab, StringTable : sorted semantic neighbor graphemes (None if the store has not been reduced)
+    semantic_offsets, Array[Int] : the semantic neighbors of word i are semantic_neighbor_ids[semantic_offsets[i]:semantic_offsets[i+1]]
+    semantic_neighbor_ids, Array[Int] : semantic_vocab ids of the semantic neighbors of every word
+    '''
+
+    def __init__(self, path):
+        self.vocab = StringTable.load(path, VOCAB_PREFIX)
+        self.offsets = np.load(os.path.join(path, OFFSETS_FILE), mmap_mode='r')
+        self.neighbor_ids = np.load(os.path.join(path, NEIGHBOR_IDS_FILE), mmap_mode='r')
+        if os.path.exists(os.path.join(path, SEMANTIC_OFFSETS_FILE)):
+            self.semantic_vocab = StringTable.load(path, SEMANTIC_VOCAB_PREFIX)
+            self.semantic_offsets = np.load(os.path.join(path, SEMANTIC_OFFSETS_FILE), mmap_mode='r')
+            self.semantic_neighbor_ids = np.load(os.path.join(path, SEMANTIC_NEIGHBOR_IDS_FILE), mmap_mode='r')
+        else:
+            self.semantic_vocab, self.semantic_offsets, self.semantic_neighbor_ids = None, None, None
+
+    def __len__(self):
+        return len(self.vocab)
+
+    def __contains__(self, grapheme):
+        return self.vocab.index(grapheme) is not None
+
+    def get_word_neighbors(self, idx):
+        return [self.vocab[neighbor_id] for neighbor_id in self.neighbor_ids[self.offsets[idx]:self.offsets[idx+1]]]
+
+    def get_word_semantic_neighbors(self, idx):
+        if self.semantic_vocab is None:
+            return None
+        return [self.semantic_vocab[neighbor_id] for neighbor_id in self.semantic_neighbor_ids[self.semantic_offsets[idx]:self.semantic_offsets[idx+1]]]
+
+    def get_row(self, grapheme):
+        '''
+        Return the NeighborRow of the grapheme, or None if it is not in the store
+        '''
+        idx = self.vocab.index(grapheme)
+        if idx is None:
+            return None
+        return NeighborRow(self.vocab[idx], self.get_word_neighbors(idx), self.get_word_semantic_neighbors(idx))
+
+    def iter_rows(self):
+        for idx in range(len(self)):
+            yield NeighborRow(self.vocab[idx], self.get_word_neighbors(idx), self.get_word_semantic_neighbors(idx))
+
+
+# Process-wide neighbor store, loaded on first use
+_neighbor_store = None
+
+def get_neighbor_store():
+    '''
+    Return the process-wide NeighborStore, loading it from the app's NEIGHBOR_STORE_PATH the first time it is requested,
+    or None if no store is configured (in which case the FasttextNeighbor table is used instead)
+    '''
+    global _neighbor_store
+    if _neighbor_store is None:
+        from app import app
+        path = app.config.get('NEIGHBOR_STORE_PATH')
+        if not path:
+            return None
+        _neighbor_store = NeighborStore(path)
+    return _neighbor_store
+
+def set_neighbor_store(neighbor_store):
+    '''
+    Install a prebuilt NeighborStore as the process-wide store
+    '''
+    global _neighbor_store
+    _neighbor_store = neighbor_store
@@ -0,0 +1,70 @@
+from multiprocessing import Pool, cpu_count, current_process
+
+# Engines used by get_pair_engine, see helper_utils.get_portmanteaus and helper_utils.get_rhymes
+SERIAL_ENGINE = 'vectorized'
+POOL_ENGINE = 'pool'
+
+
+def init_worker():
+    '''
+    Runs once in each worker process
+    Forked workers must not share the parent's database connections, so drop them; the lexicon and frequency
+    tables are loaded by the parent before forking (see get_pair_pool), so these calls are no-ops unless
+    the platform spawns rather than forks its workers
+    '''
+    from app import db
+    from app.lexicon import get_lexicon
+    from app.models import SubgraphemeFrequency, SubphonemeFrequency
+    db.engine.dispose()
+    get_lexicon()
+    SubgraphemeFrequency.get_frequency_store()
+    SubphonemeFrequency.get_frequency_store()
+
+
+# Process-wide pool of pair-evaluation workers, started on first use and reused by every request
+_pair_pool = None
+
+def get_pair_pool():
+    '''
+    Return the process-wide worker Pool, starting it the first time it is requested
+    The read-only tables are loaded before the workers are forked, so that every worker shares the parent's copy
+    '''
+    global _pair_pool
+    if _pair_pool is None:
+        from app import app, db
+        from app.lexicon import get_lexicon
+        from app.models import SubgraphemeFrequency, SubphonemeFrequency
+        get_lexicon()
+        SubgraphemeFrequency.get_frequency_store()
+        SubphonemeFrequency.get_frequency_store()
+        db.session.remove()
+        db.engine.dispose()
+        _pair_pool = Pool(app.config.get('PAIR_POOL_PROCESSES') or cpu_count(), initializer=init_worker)
+    return _pair_pool
+
+def close_pair_pool():
+    '''
+    Shut down the process-wide pool, if it was started
+    '''
+    global _pair_pool
+    if _pair_pool is not None:
+        _pair_pool.close()
+        _pair_pool.join()
+        _pair_pool = None
+
+def get_pair_tile_size():
+    from app import app
+    return app.config.get('PAIR_POOL_TILE_SIZE') or 50
+
+def get_pair_engine(n_pairs):
+    '''
+    Return the engine with which to evaluate n_pairs word pairs: the worker pool if it is enabled (PAIR_EVALUATION_MODE='pool')
+    and there are at least PAIR_POOL_THRESHOLD pairs, so that small queries don't pay the IPC overhead, and serial otherwise
+    Daemonic processes, e.g. the workers of generate_batch_puns, may not start a pool of their own, so they always evaluate serially
+    '''
+    from app import app
+    if current_process().daemon:
+        return SERIAL_ENGINE
+    if app.config.get('PAIR_EVALUATION_MODE') == 'pool' and n_pairs >= app.config.get('PAIR_POOL_THRESHOLD', 0):
+        return POOL_ENGINE
+    return SERIAL_ENGINE
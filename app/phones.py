@@ -0,0 +1,129 @@
+import numpy as np
+from app.global_constants import ARPABET_VOWELS, ARPABET_CONSONANTS, NEAR_MISS_CONSONANTS, NEAR_MISS_VOWELS
+
+# Vowels are stressed ('0' unstressed, '1' primary stress, '2' secondary stress) in the
+# CMU Pronouncing Dictionary, consonants are not, but intern every combination so that
+# any ARPABET phone can be converted to an integer ID
+STRESS_MARKERS = ['', '0', '1', '2']
+
+# ID 0 is reserved for padding, so that phonemes of different lengths can be packed into a single matrix
+PAD_PHONE_ID = 0
+
+PHONES = [''] + [base + stress for base in sorted(ARPABET_VOWELS | ARPABET_CONSONANTS) for stress in STRESS_MARKERS]
+PHONE_IDS = dict((phone, phone_id) for phone_id, phone in enumerate(PHONES))
+N_PHONES = len(PHONES)
+
+def get_phone_id(phone):
+    '''
+    Return the integer ID of a (possibly stressed) ARPABET phone
+    '''
+    return PHONE_IDS[str(phone)]
+
+def get_phone_ids(phoneme):
+    '''
+    Return the integer IDs of each phone in the phoneme
+    '''
+    return [PHONE_IDS[str(phone)] for phone in phoneme]
+
+# Per-phone class masks, indexed by phone ID
+PHONE_IS_VOWEL = np.array([phone.rstrip(''.join(STRESS_MARKERS)) in ARPABET_VOWELS for phone in PHONES])
+PHONE_IS_CONSONANT = np.array([phone.rstrip(''.join(STRESS_MARKERS)) in ARPABET_CONSONANTS for phone in PHONES])
+# Vowels carrying either a primary ('1') or secondary ('2') stress
+PHONE_IS_STRESSED_VOWEL = np.array([phone[:-1] in ARPABET_VOWELS and phone[-1:] in ('1','2') for phone in PHONES])
+
+# Stand-in for an infinite phone distance in integer distance matrices
+# Large enough that any phoneme containing a mismatched phone exceeds every MAX_OVERLAP_DIST
+INFINITE_PHONE_DISTANCE = 1000
+
+def build_phone_distance_matrix(phone_distance):
+    '''
+    Evaluate the scalar phone_distance(phone1, phone2) function on every pair of phones in the inventory,
+    and return the results as an (N_PHONES x N_PHONES) integer matrix indexed by phone ID
+    Infinite distances, and any distance involving the padding phone, are stored as INFINITE_PHONE_DISTANCE
+    '''
+    distance_matrix = np.full((N_PHONES, N_PHONES), INFINITE_PHONE_DISTANCE, dtype=np.int32)
+    for phone_id1 in range(1, N_PHONES):
+        for phone_id2 in range(1, N_PHONES):
+            distance = phone_distance(PHONES[phone_id1], PHONES[phone_id2])
+            if distance != np.inf:
+                distance_matrix[phone_id1, phone_id2] = distance
+    return distance_matrix
+
+def get_phone_distance_by_rule(phone1, phone2):
+    '''
+    String-based phone-level distance, used to build the lookup tables below:
+    1) identical phones --> d=0
+    2) unstressed phone vs primary stress phone --> d=1
+    3) phones in near-miss consonant set --> d=2
+    4) phones in near-miss vowel set --> d=4
+    5) otherwise --> d=infty
+    '''
+    if phone1 == phone2:
+        return 0
+    elif filter(str.isalpha, phone1) == filter(str.isalpha, phone2):
+        # small penalty if identical BUT one has a primary stress and the other is nonstressed
+        if (phone1[-1], phone2[-1]) == ('0','1') or (phone1[-1], phone2[-1]) == ('1','0'):
+            return 1
+        # no penalty for secondary stress discrepancies
+        else:
+            return 0
+    elif (phone1,phone2) in NEAR_MISS_CONSONANTS or (phone2,phone1) in NEAR_MISS_CONSONANTS:
+        return 2
+    # make sure to strip off the stresses before checking for set inclusion
+    # if the vowels don't match then the stresses DEFINITELY need to match
+    elif ((phone1[:-1],phone2[:-1]) in NEAR_MISS_VOWELS or (phone2[:-1],phone1[:-1]) in NEAR_MISS_VOWELS) and phone1[-1] == phone2[-1]:
+        return 4
+    else:
+        return np.inf
+
+# Dense (N_PHONES x N_PHONES) phone-distance matrix, for batched lookups with NumPy fancy indexing
+PHONE_DISTANCE_MATRIX = build_phone_distance_matrix(get_phone_distance_by_rule)
+
+# The same table as nested lists, with infinite distances restored, for fast scalar lookups from Python
+PHONE_DISTANCE_ROWS = [[np.inf if distance == INFINITE_PHONE_DISTANCE else distance for distance in row] for row in PHONE_DISTANCE_MATRIX.tolist()]
+
+# Inventory of phones with their stresses stripped, used for the destressed phone IDs stored in the words table
+DESTRESSED_PHONES = [''] + sorted(ARPABET_VOWELS | ARPABET_CONSONANTS)
+DESTRESSED_PHONE_IDS = dict((phone, phone_id) for phone_id, phone in enumerate(DESTRESSED_PHONES))
+
+def get_phoneme_features(phoneme):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Compute the per-word phonetic features stored in the words table, so that the pun generators
+    never need to re-parse phone strings at request time
+
+    Bitmasks have bit p set iff the property holds at phone p
+
+    -----------
+    # OUTPUTS #
+    -----------
+    Dict with keys:
+    destressed_phone_ids, List[Int] : IDs of the phones with their stresses stripped, see DESTRESSED_PHONES
+    vowel_mask, Int : bitmask of vowel phones
+    consonant_mask, Int : bitmask of consonant phones
+    stressed_vowel_mask, Int : bitmask of vowels carrying a primary or secondary stress
+    '''
+    phone_ids = get_phone_ids(phoneme)
+    features = {
+        'destressed_phone_ids': [DESTRESSED_PHONE_IDS[PHONES[phone_id].rstrip(''.join(STRESS_MARKERS))] for phone_id in phone_ids],
+        'vowel_mask': 0,
+        'consonant_mask': 0,
+        'stressed_vowel_mask': 0,
+        }
+    for idx, phone_id in enumerate(phone_ids):
+        features['vowel_mask'] |= int(PHONE_IS_VOWEL[phone_id]) << idx
+        features['consonant_mask'] |= int(PHONE_IS_CONSONANT[phone_id]) << idx
+        features['stressed_vowel_mask'] |= int(PHONE_IS_STRESSED_VOWEL[phone_id]) << idx
+    return features
+
+def get_mask_prefix_counts(mask, n_phones):
+    '''
+    Convert a phone bitmask into prefix sums, i.e. counts[p] = number of set bits among phones 0..p-1,
+    so that the number of set bits in any window start_idx..end_idx is counts[end_idx+1] - counts[start_idx]
+    '''
+    counts = [0]
+    for idx in range(n_phones):
+        counts.append(counts[-1] + ((mask >> idx) & 1))
+    return counts
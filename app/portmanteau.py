@@ -1,7 +1,5 @@
-from global_constants import *
 import numpy as np
 from pun import Pun
-from time import time
 
 class Portmanteau(Pun):
 	'''
@@ -36,6 +34,8 @@ class Portmanteau(Pun):
 	'''
 	# Class Constants
 	ORDERING_CRITERION_CUTOFF = -7.5
+	OVERLAP_DISTANCE_COEF = 0.62
+	OVERLAP_PHONEME_PROB_COEF = 0.79
 
 	def __init__(self,
 				word1,
@@ -65,6 +65,9 @@ class Portmanteau(Pun):
 		self.n_overlapping_phones = n_overlapping_phones
 		self.overlap_distance = overlap_distance
 		self.overlap_phoneme_prob = overlap_phoneme_prob
+		# Computed once, since candidates are compared against each other many times while being ranked
+		self._ordering_criterion = self.OVERLAP_DISTANCE_COEF * self.overlap_distance + self.OVERLAP_PHONEME_PROB_COEF * np.log(self.overlap_phoneme_prob)
+		self._key = (word1.id, word2.id, grapheme_portmanteau1)
 
 	@classmethod
 	def get_pun(cls, word1, word2):
@@ -113,8 +116,8 @@ class Portmanteau(Pun):
 			overlap_distance = cls.get_phoneme_distance(word1_phoneme_overlap, word2_phoneme_overlap)
 			if overlap_distance <= cls.MAX_OVERLAP_DIST:
 				# It's only possible to match vowels with vowels, and consonants with consonants, so only need to run the check on one of the phonemes
-				num_overlap_vowel_phones1 = sum([1 if filter(str.isalpha, str(phone)) in ARPABET_VOWELS else 0 for phone in word1_phoneme_overlap])
-				num_overlap_consonant_phones1 = sum([1 if filter(str.isalpha, str(phone)) in ARPABET_CONSONANTS else 0 for phone in word1_phoneme_overlap])
+				num_overlap_vowel_phones1 = word1.get_num_vowel_phones(word1_idx, len(word1.phoneme)-1)
+				num_overlap_consonant_phones1 = word1.get_num_consonant_phones(word1_idx, len(word1.phoneme)-1)
 				num_non_overlap_phones1 = len(word1_phoneme_nonoverlap)
 				num_non_overlap_phones2 = len(word2_phoneme_nonoverlap)
 
@@ -151,58 +154,76 @@ class Portmanteau(Pun):
 					continue
 
 				# All alignments and min-char requirements have been met, so create the Portmanteau, and return it
-
-				# Select the graphemetric representation such that the constituent words are most easily reconstruble
-				# i.e. choose the grapheme_portmanteau which maximizes p(grapheme1, grapheme2 | grapheme_portmanteau)
-				# See paper for details
-
-				word1_grapheme_nonoverlap = ''.join(word1.get_subgrapheme_from_subphoneme_inds(0, word1_phoneme_overlap_start_idx-1, return_inds=False))
-				word2_grapheme_nonoverlap = ''.join(word2.get_subgrapheme_from_subphoneme_inds(word2_phoneme_overlap_end_idx+1, len(word2.phoneme)-1, return_inds=False))
-
-				start = time()
-				word1_prob_given_dangling_graphs = cls.get_prob_word_given_subgrapheme(word1_grapheme_nonoverlap, 'head')
-				word2_prob_given_dangling_graphs = cls.get_prob_word_given_subgrapheme(word2_grapheme_nonoverlap, 'tail')
-
-				grapheme_portmanteau1 = word1.grapheme + word2_grapheme_nonoverlap
-				grapheme_portmanteau2 = word1_grapheme_nonoverlap + word2.grapheme
-				phoneme_portmanteau1 = word1.phoneme + word2_phoneme_nonoverlap
-				phoneme_portmanteau2 = word1_phoneme_nonoverlap + word2.phoneme
-
-				# If first word can be more easily reconstructed than the second, flip the ordering of the graphemes
-				# This ensures that the grapheme_portmanteau maximizing p(grapheme1, grapheme2 | grapheme_portmanteau)
-				# will be stored in the variable 'grapheme_portmanteau1'
-				if word1_prob_given_dangling_graphs > word2_prob_given_dangling_graphs:
-					grapheme_portmanteau1, grapheme_portmanteau2 = grapheme_portmanteau2, grapheme_portmanteau1
-					phoneme_portmanteau1, phoneme_portmanteau2 = phoneme_portmanteau2, phoneme_portmanteau1
-
-				# Compute p(p_overlap, q_overlap) (see paper)
-				start = time()
-				word1_overlap_phoneme_prob = cls.get_subphoneme_prob(tuple(word1_phoneme_overlap), 'tail')
-				word2_overlap_phoneme_prob = cls.get_subphoneme_prob(tuple(word2_phoneme_overlap), 'head')
-				overlap_phoneme_prob = word1_overlap_phoneme_prob * word2_overlap_phoneme_prob
-
-				# Instantiate the constructed portmanteau, and return it
-				portmanteau = cls(
-					word1,
-					word2,
-					grapheme_portmanteau1,
-					grapheme_portmanteau2,
-					phoneme_portmanteau1,
-					phoneme_portmanteau2,
-					word1_prob_given_dangling_graphs,
-					word2_prob_given_dangling_graphs,
-					# both overlap_phonemes1 and overlap_phonemes2 will have the same number of vowels and consonants, so can use either one
-					num_overlap_vowel_phones1,
-					num_overlap_consonant_phones1,
-					num_overlap_vowel_phones1+num_overlap_consonant_phones1,
-					overlap_distance,
-					overlap_phoneme_prob
-					)
+				portmanteau = cls.from_overlap(word1, word2, overlap_len, overlap_distance, num_overlap_vowel_phones1, num_overlap_consonant_phones1)
 				return portmanteau, 0, 'portmanteau found!'
 
 		# Failed to find any overlaps meeting the 'MAX_OVERLAP_DIST' criteria, so return with the default error message
 		return portmanteau, status, message
 
+	@classmethod
+	def from_overlap(cls, word1, word2, overlap_len, overlap_distance, num_overlap_vowel_phones1, num_overlap_consonant_phones1):
+		'''
+		---------------
+		# DESCRIPTION #
+		---------------
+		Construct the Portmanteau formed by overlapping the last 'overlap_len' phones of word1 with the first
+		'overlap_len' phones of word2. Assumes that the overlap has already been verified to satisfy all of the
+		constraints checked in 'get_pun' (distance, vowels/consonants, non-overlap lengths, alignment)
+
+		Shared by 'get_pun' and the batched search in vectorized_puns.py, so that both produce identical Portmanteaus
+		'''
+		word1_idx = len(word1.phoneme) - overlap_len
+		word2_idx = overlap_len
+		word1_phoneme_overlap = word1.phoneme[word1_idx:]
+		word2_phoneme_overlap = word2.phoneme[:word2_idx]
+		word1_phoneme_nonoverlap = word1.phoneme[:word1_idx]
+		word2_phoneme_nonoverlap = word2.phoneme[word2_idx:]
+
+		# Select the graphemetric representation such that the constituent words are most easily reconstruble
+		# i.e. choose the grapheme_portmanteau which maximizes p(grapheme1, grapheme2 | grapheme_portmanteau)
+		# See paper for details
+
+		word1_grapheme_nonoverlap = ''.join(word1.get_subgrapheme_from_subphoneme_inds(0, word1_idx-1, return_inds=False))
+		word2_grapheme_nonoverlap = ''.join(word2.get_subgrapheme_from_subphoneme_inds(word2_idx, len(word2.phoneme)-1, return_inds=False))
+
+		word1_prob_given_dangling_graphs = cls.get_prob_word_given_subgrapheme(word1_grapheme_nonoverlap, 'head')
+		word2_prob_given_dangling_graphs = cls.get_prob_word_given_subgrapheme(word2_grapheme_nonoverlap, 'tail')
+
+		grapheme_portmanteau1 = word1.grapheme + word2_grapheme_nonoverlap
+		grapheme_portmanteau2 = word1_grapheme_nonoverlap + word2.grapheme
+		phoneme_portmanteau1 = word1.phoneme + word2_phoneme_nonoverlap
+		phoneme_portmanteau2 = word1_phoneme_nonoverlap + word2.phoneme
+
+		# If first word can be more easily reconstructed than the second, flip the ordering of the graphemes
+		# This ensures that the grapheme_portmanteau maximizing p(grapheme1, grapheme2 | grapheme_portmanteau)
+		# will be stored in the variable 'grapheme_portmanteau1'
+		if word1_prob_given_dangling_graphs > word2_prob_given_dangling_graphs:
+			grapheme_portmanteau1, grapheme_portmanteau2 = grapheme_portmanteau2, grapheme_portmanteau1
+			phoneme_portmanteau1, phoneme_portmanteau2 = phoneme_portmanteau2, phoneme_portmanteau1
+
+		# Compute p(p_overlap, q_overlap) (see paper)
+		word1_overlap_phoneme_prob = cls.get_subphoneme_prob(tuple(word1_phoneme_overlap), 'tail')
+		word2_overlap_phoneme_prob = cls.get_subphoneme_prob(tuple(word2_phoneme_overlap), 'head')
+		overlap_phoneme_prob = word1_overlap_phoneme_prob * word2_overlap_phoneme_prob
+
+		# Instantiate the constructed portmanteau, and return it
+		return cls(
+			word1,
+			word2,
+			grapheme_portmanteau1,
+			grapheme_portmanteau2,
+			phoneme_portmanteau1,
+			phoneme_portmanteau2,
+			word1_prob_given_dangling_graphs,
+			word2_prob_given_dangling_graphs,
+			# both overlap_phonemes1 and overlap_phonemes2 will have the same number of vowels and consonants, so can use either one
+			num_overlap_vowel_phones1,
+			num_overlap_consonant_phones1,
+			num_overlap_vowel_phones1+num_overlap_consonant_phones1,
+			overlap_distance,
+			overlap_phoneme_prob
+			)
+
 	def __repr__(self):
 		return '''
 		-------------------------------------------------------------------------------
@@ -248,11 +269,20 @@ class Portmanteau(Pun):
 		Return a scalar used for ordering the Portmanteaus in terms of quality
 		Smaller values correspond to "better" portmanteaus
 		'''
-		overlap_distance_coef, overlap_phoneme_prob_coef = 0.62, 0.79
-		return overlap_distance_coef * self.overlap_distance + overlap_phoneme_prob_coef * np.log(self.overlap_phoneme_prob)
+		return self._ordering_criterion
+
+	def get_key(self):
+		'''
+		Return a cheap key identifying the portmanteau, used for deduplication
+		A given ordered word pair yields at most one portmanteau, so the word IDs and grapheme suffice
+		'''
+		return self._key
 
 	def __eq__(self, other):
-		return self.serialize() == other.serialize()
+		return self._key == other._key
+
+	def __ne__(self, other):
+		return not self == other
 
 	def __hash__(self):
-		return hash(self.__repr__())
+		return hash(self._key)
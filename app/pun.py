@@ -1,6 +1,7 @@
 from global_constants import *
 import numpy as np
 from models import SubgraphemeFrequency, SubphonemeFrequency
+from phones import PHONE_IDS, PHONE_DISTANCE_MATRIX, PHONE_DISTANCE_ROWS, INFINITE_PHONE_DISTANCE, get_phone_distance_by_rule
 
 class Pun(object):
 	'''
@@ -45,31 +46,21 @@ class Pun(object):
 
 	@staticmethod
 	def get_phone_distance(phone1, phone2):
-	    '''
+		'''
 		Compute phone-level distance:
 		1) identical phones --> d=0
 		2) unstressed phone vs primary stress phone --> d=1
 		3) phones in near-miss consonant set --> d=2
 		4) phones in near-miss vowel set --> d=4
 		5) otherwise --> d=infty
-	    '''
-	    if phone1 == phone2:
-	        return 0
-	    elif filter(str.isalpha, phone1) == filter(str.isalpha, phone2):
-	        # small penalty if identical BUT one has a primary stress and the other is nonstressed
-	        if (phone1[-1], phone2[-1]) == ('0','1') or (phone1[-1], phone2[-1]) == ('1','0'):
-	            return 1
-	        # no penalty for secondary stress discrepancies
-	        else:
-	            return 0
-	    elif (phone1,phone2) in NEAR_MISS_CONSONANTS or (phone2,phone1) in NEAR_MISS_CONSONANTS:
-	        return 2
-	    # make sure to strip off the stresses before checking for set inclusion
-	    # if the vowels don't match then the stresses DEFINITELY need to match
-	    elif ((phone1[:-1],phone2[:-1]) in NEAR_MISS_VOWELS or (phone2[:-1],phone1[:-1]) in NEAR_MISS_VOWELS) and phone1[-1] == phone2[-1]:
-	        return 4
-	    else:
-	        return np.inf
+
+		The rules are evaluated once for every pair of phones in the inventory (see phones.py),
+		so this is a table lookup; phones outside the inventory fall back to evaluating the rules directly
+		'''
+		try:
+			return PHONE_DISTANCE_ROWS[PHONE_IDS[phone1]][PHONE_IDS[phone2]]
+		except KeyError:
+			return get_phone_distance_by_rule(phone1, phone2)
 
 	@staticmethod
 	def subscript_phone_stress(phone):
@@ -89,6 +80,18 @@ class Pun(object):
 	    '''
 	    return sum([cls.get_phone_distance(str(p1),str(p2)) for (p1,p2) in zip(phoneme1, phoneme2)])
 
+	@staticmethod
+	def get_phoneme_distance_many(phone_ids1, phone_ids2):
+		'''
+		Batched get_phoneme_distance over arrays of phone-ID sequences
+		phone_ids1 and phone_ids2 are integer arrays of shape (..., overlap_len), broadcastable against each other,
+		and the result holds the phoneme distance of each pair of sequences, with np.inf for unmatchable sequences
+		'''
+		distances = PHONE_DISTANCE_MATRIX[phone_ids1, phone_ids2]
+		phoneme_distances = distances.sum(axis=-1).astype(float)
+		phoneme_distances[(distances == INFINITE_PHONE_DISTANCE).any(axis=-1)] = np.inf
+		return phoneme_distances
+
 	def serialize(self):
 		'''
 		Implemented in the derived class
@@ -100,3 +103,9 @@ class Pun(object):
 		Implemented in the derived class
 		'''
 		pass
+
+	def get_key(self):
+		'''
+		Implemented in the derived class
+		'''
+		pass
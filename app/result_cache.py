@@ -0,0 +1,241 @@
+import os
+import json
+import sqlite3
+from collections import OrderedDict
+from contextlib import closing, contextmanager
+from threading import Lock
+from time import time
+
+
+class LRUResultCache(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    In-process cache of pun results, with least-recently-used eviction and a time-to-live
+    Each gunicorn worker holds its own copy, so hits are not shared between workers, but it is shared by the worker's
+    request threads, so every access to the entries is guarded by a lock
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    max_size, Int : maximum number of entries held before the least recently used one is evicted
+    ttl, Float : number of seconds after which an entry expires (None to never expire)
+    hits, Int : number of lookups which found an unexpired entry
+    misses, Int : number of lookups which did not
+    '''
+
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict() # key -> (created_at, value), ordered from least to most recently used
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        '''
+        Return the cached value for the key, or None if it is absent or expired
+        '''
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None or (self.ttl is not None and time() - entry[0] > self.ttl):
+                self.misses += 1
+                return None
+            # Re-insert the entry to mark it as the most recently used
+            self._entries[key] = entry
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (time(), value)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'backend': 'memory', 'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+class DiskResultCache(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    On-disk cache of pun results, backed by a SQLite file, so that every gunicorn worker on a host shares the same hits
+    Values must be JSON-serializable. Entries are evicted least-recently-used first once there are more than
+    max_size of them, and expire after ttl seconds. Hit/miss counters are also stored in the file, so they are
+    aggregated across workers
+
+    Lookups only read the file: each process buffers its hit/miss counts and access times, and writes them in a single
+    transaction once flush_every lookups or flush_seconds have gone by, or along with its next set(). So workers don't
+    serialize their reads on SQLite's write lock, at the cost of other workers' recent accesses reaching the LRU order late
+
+    A fresh connection is opened (and closed) for each operation, which keeps the cache safe to use across forks and threads
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    flush_every, Int : number of buffered lookups after which they are written
+    flush_seconds, Float : longest time a lookup stays buffered, checked on the next lookup
+    '''
+
+    def __init__(self, path, max_size=10000, ttl=None, flush_every=100, flush_seconds=10.0):
+        self.path = path
+        self.max_size = max_size
+        self.ttl = ttl
+        self.flush_every = flush_every
+        self.flush_seconds = flush_seconds
+        self._lock = Lock()
+        self._reset_pending()
+        with self._transaction() as conn:
+            # Write-ahead logging lets readers carry on while a worker flushes or sets
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT, created_at REAL, accessed_at REAL)')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_results_accessed_at ON results (accessed_at)')
+            conn.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('hits', 0)")
+            conn.execute("INSERT OR IGNORE INTO counters VALUES ('misses', 0)")
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=10)
+
+    @contextmanager
+    def _transaction(self):
+        '''
+        Open a connection for a single transaction, committing it on success, and always closing the connection
+        '''
+        with closing(self._connect()) as conn:
+            with conn:
+                yield conn
+
+    @staticmethod
+    def _serialize_key(key):
+        return json.dumps(key)
+
+    def _reset_pending(self):
+        self._pid = os.getpid()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_accesses = {} # serialized key -> latest access time
+        self._last_flush = time()
+
+    def _take_pending(self):
+        '''
+        Return and clear this process's buffered (hits, misses, accesses); the caller must hold the lock
+        '''
+        if self._pid != os.getpid():
+            # Lookups buffered by the parent before the fork are the parent's to write
+            self._reset_pending()
+        pending = (self._pending_hits, self._pending_misses, self._pending_accesses.items())
+        self._reset_pending()
+        return pending
+
+    def _write_pending(self, conn, pending):
+        hits, misses, accesses = pending
+        if hits:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'hits'", (hits,))
+        if misses:
+            conn.execute("UPDATE counters SET value = value + ? WHERE name = 'misses'", (misses,))
+        if accesses:
+            conn.executemany('UPDATE results SET accessed_at = MAX(accessed_at, ?) WHERE key = ?', [(accessed_at, key) for key, accessed_at in accesses])
+
+    def flush(self):
+        '''
+        Write this process's buffered hit/miss counts and access times to the file
+        '''
+        with self._lock:
+            pending = self._take_pending()
+        if any(pending):
+            with self._transaction() as conn:
+                self._write_pending(conn, pending)
+
+    def _record_lookup(self, serialized_key, now, hit):
+        with self._lock:
+            if self._pid != os.getpid():
+                self._reset_pending()
+            if hit:
+                self._pending_hits += 1
+                self._pending_accesses[serialized_key] = now
+            else:
+                self._pending_misses += 1
+            is_due = self._pending_hits + self._pending_misses >= self.flush_every or now - self._last_flush >= self.flush_seconds
+        if is_due:
+            self.flush()
+
+    def get(self, key):
+        '''
+        Return the cached value for the key, or None if it is absent or expired
+        '''
+        now = time()
+        serialized_key = self._serialize_key(key)
+        with closing(self._connect()) as conn:
+            row = conn.execute('SELECT value, created_at FROM results WHERE key = ?', (serialized_key,)).fetchone()
+        hit = row is not None and (self.ttl is None or now - row[1] <= self.ttl)
+        self._record_lookup(serialized_key, now, hit)
+        return json.loads(row[0]) if hit else None
+
+    def set(self, key, value):
+        now = time()
+        with self._lock:
+            pending = self._take_pending()
+        with self._transaction() as conn:
+            # Buffered access times go in first, so that the eviction below sees them
+            self._write_pending(conn, pending)
+            conn.execute('INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?)', (self._serialize_key(key), json.dumps(value), now, now))
+            # Evict the least recently used entries beyond max_size, along with anything that has expired
+            conn.execute('DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)', (self.max_size,))
+            if self.ttl is not None:
+                conn.execute('DELETE FROM results WHERE created_at < ?', (now - self.ttl,))
+
+    def clear(self):
+        with self._transaction() as conn:
+            conn.execute('DELETE FROM results')
+
+    def __len__(self):
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT COUNT(*) FROM results').fetchone()[0]
+
+    @property
+    def hits(self):
+        return self._get_counter('hits')
+
+    @property
+    def misses(self):
+        return self._get_counter('misses')
+
+    def _get_counter(self, name):
+        # Include this process's buffered lookups, so that its own counts are never stale
+        self.flush()
+        with closing(self._connect()) as conn:
+            return conn.execute('SELECT value FROM counters WHERE name = ?', (name,)).fetchone()[0]
+
+    def stats(self):
+        return {'backend': 'disk', 'size': len(self), 'hits': self.hits, 'misses': self.misses}
+
+
+def get_result_cache(config):
+    '''
+    Build the result cache selected by the app config:
+    RESULT_CACHE_BACKEND, String : 'memory', 'disk', or None to disable caching
+    RESULT_CACHE_MAX_SIZE, Int : maximum number of cached input pairs
+    RESULT_CACHE_TTL, Int : seconds before a cached result expires
+    RESULT_CACHE_PATH, String : SQLite file used by the 'disk' backend
+    '''
+    backend = config.get('RESULT_CACHE_BACKEND')
+    if backend == 'memory':
+        return LRUResultCache(max_size=config['RESULT_CACHE_MAX_SIZE'], ttl=config['RESULT_CACHE_TTL'])
+    elif backend == 'disk':
+        return DiskResultCache(config['RESULT_CACHE_PATH'], max_size=config['RESULT_CACHE_MAX_SIZE'], ttl=config['RESULT_CACHE_TTL'])
+    elif backend is None:
+        return None
+    else:
+        raise ValueError("RESULT_CACHE_BACKEND must be either 'memory', 'disk', or None")
@@ -2,7 +2,6 @@ from global_constants import *
 import numpy as np
 from nltk.corpus import wordnet as wn
 from pun import Pun
-from time import time
 
 class Rhyme(Pun):
 	'''
@@ -49,6 +48,9 @@ class Rhyme(Pun):
 		self.n_overlapping_phones = n_overlapping_phones
 		self.overlap_distance = overlap_distance
 		self.overlap_phoneme_prob = overlap_phoneme_prob
+		# Computed once, since candidates are compared against each other many times while being ranked
+		self._ordering_criterion = (self.overlap_phoneme_prob, self.overlap_distance)
+		self._key = (word1.id, word2.id)
 
 	@classmethod
 	def get_pun(cls, word1, word2):
@@ -89,18 +91,12 @@ class Rhyme(Pun):
 		for overlap_len in range(min_word_len-1,0,-1):
 			word1_phoneme_overlap = word1.phoneme[-overlap_len:]
 			word2_phoneme_overlap = word2.phoneme[-overlap_len:]
-			word1_phoneme_nonoverlap = word1.phoneme[:-overlap_len]
-			word2_phoneme_nonoverlap = word2.phoneme[:-overlap_len]
 			overlap_distance = cls.get_phoneme_distance(word1_phoneme_overlap, word2_phoneme_overlap)
 			if overlap_distance <= cls.MAX_OVERLAP_DIST:
 				# It's only possible to match vowels with vowels, and consonants with consonants, so only need to run the check on one of the phonemes
-				num_overlap_vowel_phones1 = sum([1 if filter(str.isalpha, str(phone)) in ARPABET_VOWELS else 0 for phone in word1_phoneme_overlap])
-				num_overlap_consonant_phones1 = sum([1 if filter(str.isalpha, str(phone)) in ARPABET_CONSONANTS else 0 for phone in word1_phoneme_overlap])
-				num_non_overlap_phones1 = len(word1_phoneme_nonoverlap)
+				num_overlap_vowel_phones1 = word1.get_num_vowel_phones(len(word1.phoneme)-overlap_len, len(word1.phoneme)-1)
+				num_overlap_consonant_phones1 = word1.get_num_consonant_phones(len(word1.phoneme)-overlap_len, len(word1.phoneme)-1)
 				num_overlap_phones1 = len(word1_phoneme_overlap)
-				num_non_overlap_phones2 = len(word2_phoneme_nonoverlap) # need to save this for later
-				first_overlap_phone1 = str(word1_phoneme_overlap[0])
-				first_overlap_phone2 = str(word2_phoneme_overlap[0])
 
 				# Verify the the overlapping/nonoverlapping phones satisfy the desired constraints on e.g. length
 				if num_overlap_vowel_phones1 < cls.MIN_OVERLAP_VOWEL_PHONES:
@@ -112,7 +108,7 @@ class Rhyme(Pun):
 				elif num_overlap_phones1 < cls.MIN_OVERLAP_PHONES:
 					rhyme, status, message = None, 1, 'phoneme overlap does not have enough phones'
 					continue
-				elif not (first_overlap_phone1[:-1] in ARPABET_VOWELS and first_overlap_phone1[-1] in ('1','2') and first_overlap_phone2[:-1] in ARPABET_VOWELS and first_overlap_phone2[-1] in ('1','2')):
+				elif not (word1.is_stressed_vowel(len(word1.phoneme)-overlap_len) and word2.is_stressed_vowel(len(word2.phoneme)-overlap_len)):
 					rhyme, status, message = None, 1, 'phoneme overlap does not start with a stressed vowel phone'
 					continue
 
@@ -135,31 +131,47 @@ class Rhyme(Pun):
 					continue
 
 				# All alignments and min-char requirements have been met, so create the Rhyme, and return it
-
-				# Compute p(p_overlap, q_overlap) (see paper)
-				start = time()
-				word1_tail_phoneme_prob = cls.get_subphoneme_prob(tuple(word1_phoneme_overlap), 'tail')
-				word2_tail_phoneme_prob = cls.get_subphoneme_prob(tuple(word2_phoneme_overlap), 'tail')
-				overlap_phoneme_prob = word1_tail_phoneme_prob * word2_tail_phoneme_prob
-
-				# Use POS + grapheme_length ordering rules to decide which word to put first
-				word1_ordered, word2_ordered = cls.get_word_ordering(word1, word2, num_non_overlap_phones1, num_non_overlap_phones2)
-
-				rhyme = cls(
-					word1_ordered,
-					word2_ordered,
-					# both overlap_phonemes1 and overlap_phonemes2 will have the same number of vowels and consonants, so can use either one
-					num_overlap_vowel_phones1,
-					num_overlap_consonant_phones1,
-					num_overlap_vowel_phones1+num_overlap_consonant_phones1,
-					overlap_distance,
-					overlap_phoneme_prob
-					)
+				rhyme = cls.from_overlap(word1, word2, overlap_len, overlap_distance, num_overlap_vowel_phones1, num_overlap_consonant_phones1)
 				return rhyme, 0, 'rhyme found!'
 
 		# failed to find any overlaps meeting the 'MAX_OVERLAP_DIST' criteria, so return with default error message
 		return rhyme, status, message
 
+	@classmethod
+	def from_overlap(cls, word1, word2, overlap_len, overlap_distance, num_overlap_vowel_phones1, num_overlap_consonant_phones1):
+		'''
+		---------------
+		# DESCRIPTION #
+		---------------
+		Construct the Rhyme formed by the last 'overlap_len' phones of word1 and word2. Assumes that the overlap
+		has already been verified to satisfy all of the constraints checked in 'get_pun'
+
+		Shared by 'get_pun' and the batched search in vectorized_puns.py, so that both produce identical Rhymes
+		'''
+		word1_phoneme_overlap = word1.phoneme[-overlap_len:]
+		word2_phoneme_overlap = word2.phoneme[-overlap_len:]
+		num_non_overlap_phones1 = len(word1.phoneme) - overlap_len
+		num_non_overlap_phones2 = len(word2.phoneme) - overlap_len
+
+		# Compute p(p_overlap, q_overlap) (see paper)
+		word1_tail_phoneme_prob = cls.get_subphoneme_prob(tuple(word1_phoneme_overlap), 'tail')
+		word2_tail_phoneme_prob = cls.get_subphoneme_prob(tuple(word2_phoneme_overlap), 'tail')
+		overlap_phoneme_prob = word1_tail_phoneme_prob * word2_tail_phoneme_prob
+
+		# Use POS + grapheme_length ordering rules to decide which word to put first
+		word1_ordered, word2_ordered = cls.get_word_ordering(word1, word2, num_non_overlap_phones1, num_non_overlap_phones2)
+
+		return cls(
+			word1_ordered,
+			word2_ordered,
+			# both overlap_phonemes1 and overlap_phonemes2 will have the same number of vowels and consonants, so can use either one
+			num_overlap_vowel_phones1,
+			num_overlap_consonant_phones1,
+			num_overlap_vowel_phones1+num_overlap_consonant_phones1,
+			overlap_distance,
+			overlap_phoneme_prob
+			)
+
 	@staticmethod
 	def get_word_ordering(word1, word2, num_non_overlap_phones1, num_non_overlap_phones2):
 		'''
@@ -250,10 +262,20 @@ class Rhyme(Pun):
 		Return a tuple used for ordering the Rhymes in terms of quality
 		Smaller values correspond to "better" rhymes
 		'''
-		return (self.overlap_phoneme_prob, self.overlap_distance)
+		return self._ordering_criterion
+
+	def get_key(self):
+		'''
+		Return a cheap key identifying the rhyme, used for deduplication
+		A given ordered word pair yields at most one rhyme, so the word IDs suffice
+		'''
+		return self._key
 
 	def __eq__(self, other):
-		return self.serialize() == other.serialize()
+		return self._key == other._key
+
+	def __ne__(self, other):
+		return not self == other
 
 	def __hash__(self):
-		return hash(self.__repr__())
+		return hash(self._key)
@@ -1,48 +1,105 @@
-from flask import render_template, url_for, redirect, request, session
+from flask import render_template, url_for, redirect, request, session, jsonify, Response, stream_with_context
 from app import app, db
-from app.models import Word, UserInput
+from app.models import UserInput
+from app.lexicon import get_lexicon
 from app.forms import InputWords
-from app.helper_utils import get_semantic_neighbor_graphemes, get_portmanteaus, get_rhymes
-from app.global_constants import MAX_PORTMANTEAUS, MAX_RHYMES
-from time import time
+from app.portmanteau import Portmanteau
+from app.helper_utils import _semantic_neighbor_cache, _canonical_grapheme_cache, get_semantic_neighbor_graphemes, resolve_graphemes, prime_semantic_neighbor_graphemes, get_portmanteaus, get_rhymes, iter_portmanteaus, iter_rhymes
+from app.result_cache import get_result_cache
+from app.top_k import TopKCollector
+from app.neighbor_index import get_neighbor_index
+from app.pair_pool import get_pair_engine
+from app.instrumentation import stage_timer, register_cache, register_logger
+from app.user_input_log import get_user_input_logger
+from app.global_constants import MAX_PORTMANTEAUS, MAX_RHYMES, MAX_API_NEIGHBORS, API_STREAM_BLOCK_SIZE
 from datetime import datetime
+import json
 
-def get_puns_from_words(word1, word2):
+def get_nearest_words(word1, word2, n=None, s=None):
+    '''
+    Return the Word objects corresponding to the semantic neighbors of each of the two graphemes
+    n and s optionally override the number of neighbors and the similarity cutoff, see get_semantic_neighbor_graphemes
+    '''
     # Find the semantic neighbors of the graphemes
-    start = time()
-    nearest_graphemes1 = get_semantic_neighbor_graphemes(word1)
-    nearest_graphemes2 = get_semantic_neighbor_graphemes(word2)
-    print "Semantic neighbors: {:.2f} seconds".format(time()-start)
+    with stage_timer('neighbors'):
+        nearest_graphemes1 = get_semantic_neighbor_graphemes(word1, n=n, s=s)
+        nearest_graphemes2 = get_semantic_neighbor_graphemes(word2, n=n, s=s)
 
     # Find the Word objects corresponding to each of the semantic neighbors
-    start = time()
-    nearest_words1 = Word.query.filter(Word.grapheme.in_(nearest_graphemes1)).all()
-    nearest_words2 = Word.query.filter(Word.grapheme.in_(nearest_graphemes2)).all()
-    print "Word conversion: {:.2f} seconds".format(time()-start)
+    # These come from the in-memory lexicon rather than the words table, to keep the DB out of the hot path
+    with stage_timer('words'):
+        lexicon = get_lexicon()
+        nearest_words1 = lexicon.get_words(nearest_graphemes1)
+        nearest_words2 = lexicon.get_words(nearest_graphemes2)
+
+    return nearest_words1, nearest_words2
+
+def get_puns_from_words(word1, word2):
+    nearest_words1, nearest_words2 = get_nearest_words(word1, word2)
+
+    # Large pair grids are spread across the worker pool, if enabled
+    engine = get_pair_engine(len(nearest_words1)*len(nearest_words2))
 
     # Generate the ordered portmanteaus
-    start = time()
-    portmanteaus = get_portmanteaus(nearest_words1, nearest_words2)
-    print "Portmanteaus: {:.2f} seconds".format(time()-start)
+    with stage_timer('portmanteaus'):
+        portmanteaus = get_portmanteaus(nearest_words1, nearest_words2, engine=engine, k=MAX_PORTMANTEAUS)
 
     # Generate the ordered rhymes
-    start = time()
-    rhymes = get_rhymes(nearest_words1, nearest_words2)
-    print "Rhymes: {:.2f} seconds".format(time()-start)
+    with stage_timer('rhymes'):
+        rhymes = get_rhymes(nearest_words1, nearest_words2, engine=engine, k=MAX_RHYMES)
+
+    with stage_timer('serialization'):
+        return {'portmanteaus': map(lambda x: x.serialize(), portmanteaus), 'rhymes': map(lambda x: x.serialize(), rhymes)}
+
+# Cache of serialized pun results, shared by all requests handled by this worker (or all workers, for the 'disk' backend)
+result_cache = get_result_cache(app.config)
+register_cache('results', result_cache)
+register_cache('semantic_neighbors', _semantic_neighbor_cache)
+register_cache('canonical_graphemes', _canonical_grapheme_cache)
 
-    return {'portmanteaus': map(lambda x: x.serialize(), portmanteaus[:MAX_PORTMANTEAUS]), 'rhymes': map(lambda x: x.serialize(), rhymes[:MAX_RHYMES])}
+def get_cached_puns_from_words(word1, word2):
+    '''
+    Look up the puns for the input pair in the result cache, generating and caching them on a miss
+    The cache is keyed by the canonical capitalization of each input, so e.g. 'Master' and 'master' share an entry
+    '''
+    if result_cache is None:
+        return get_puns_from_words(word1, word2)
+
+    cache_key = tuple(resolve_graphemes([word1, word2]))
+    pun_results = result_cache.get(cache_key)
+    if pun_results is None:
+        pun_results = get_puns_from_words(word1, word2)
+        result_cache.set(cache_key, pun_results)
+    return pun_results
+
+# Background writer of the user_inputs table, shared by all requests handled by this worker (None to write on the request path)
+user_input_logger = get_user_input_logger()
+register_logger('user_inputs', user_input_logger)
 
 def log_user_inputs(grapheme1, grapheme2, is_valid):
     '''
     Log the user's inputs
     IP address logic from here: https://stackoverflow.com/a/51088317/2562771
     Using ProxyFix is necessitated by the app's use of CloudFlare, which acts as a proxy
+    The row is handed to the background logger, so the request doesn't wait on the database
     '''
     ts = datetime.utcnow()
     user_ip = request.remote_addr
-    user_inputs = UserInput(grapheme1=grapheme1, grapheme2=grapheme2, is_valid=is_valid, ip_address=user_ip, created_at=ts, updated_at=ts)
-    db.session.add(user_inputs)
-    db.session.commit()
+    row = dict(grapheme1=grapheme1, grapheme2=grapheme2, is_valid=is_valid, ip_address=user_ip, created_at=ts, updated_at=ts)
+    if user_input_logger is not None:
+        user_input_logger.log(row)
+    else:
+        db.session.add(UserInput(**row))
+        db.session.commit()
+
+def redirect_to_results(form):
+    '''
+    Redirect to the results page of the validated input words, under their canonical graphemes as resolved by the form,
+    so that the results page needn't resolve them again, and with their semantic neighbors already memoized
+    '''
+    canonical_grapheme1, canonical_grapheme2 = form.get_canonical_graphemes()
+    prime_semantic_neighbor_graphemes([canonical_grapheme1, canonical_grapheme2])
+    return redirect(url_for('results', word1=canonical_grapheme1, word2=canonical_grapheme2))
 
 @app.route('/')
 def home():
@@ -63,7 +120,7 @@ def pun_generator():
         # Add user inputs to the user_inputs table
         log_user_inputs(form.word1.data, form.word2.data, True)
         # Redirect to the results page, passing along the (valid) input words
-        return redirect(url_for('results', word1=form.word1.data, word2=form.word2.data))
+        return redirect_to_results(form)
 
     # Submit button was clicked, but words were invalid
     if form.word1.data is not None and form.word2.data is not None: # submit button was pressed, but the inputs were invalid
@@ -84,10 +141,10 @@ def results(word1, word2):
         # Add user inputs to the user_inputs table
         log_user_inputs(form.word1.data, form.word2.data, True)
         # Redirect to new results page with appropriate url path
-        return redirect(url_for('results', word1=form.word1.data, word2=form.word2.data))
+        return redirect_to_results(form)
     elif form.word1.data is None and form.word2.data is None: # Option (2) user just landed on this url
         # Generate the puns, impute the form data, and display the results
-        pun_results = get_puns_from_words(word1, word2)
+        pun_results = get_cached_puns_from_words(word1, word2)
         form.word1.data, form.word2.data = word1, word2
         return render_template('pun_generator.html', form=form, results=pun_results)
     else: # Option (3) user just inputed a new invalid word pair
@@ -95,3 +152,119 @@ def results(word1, word2):
         log_user_inputs(form.word1.data, form.word2.data, False)
         # Render the page as-is, with the errors shown
         return render_template('pun_generator.html', form=form)
+
+API_PUN_TYPES = ('portmanteau', 'rhyme', 'all')
+
+def api_error(message, status_code=400):
+    response = jsonify({'error': message})
+    response.status_code = status_code
+    return response
+
+def get_pun_cutoffs(portmanteau_cutoff, rhyme_cutoff):
+    '''
+    Fill in the defaults of the API's portmanteau and rhyme cutoffs, which are on different scales:
+    portmanteaus are filtered on their (negative, log-scale) ordering criterion, and rhymes on their overlap phoneme probability
+    Without a cutoff, portmanteaus keep their default ORDERING_CRITERION_CUTOFF and rhymes are not filtered
+    '''
+    if portmanteau_cutoff is None:
+        portmanteau_cutoff = Portmanteau.ORDERING_CRITERION_CUTOFF
+    return portmanteau_cutoff, rhyme_cutoff
+
+def iter_pun_events(word1, word2, pun_type, k, portmanteau_cutoff=None, rhyme_cutoff=None, n=None, s=None):
+    '''
+    Generate the NDJSON lines of a streaming /api/puns response
+    Every pun is emitted as soon as it is found, as {"event": "pun", "type": ..., "score": ..., "pun": ...},
+    followed by a single {"event": "done", ...} line holding the k best puns of each requested type, in order
+    '''
+    nearest_words1, nearest_words2 = get_nearest_words(word1, word2, n=n, s=s)
+    portmanteau_cutoff, rhyme_cutoff = get_pun_cutoffs(portmanteau_cutoff, rhyme_cutoff)
+    done = {'event': 'done'}
+    for this_type, iter_puns, this_cutoff in [('portmanteau', iter_portmanteaus, portmanteau_cutoff), ('rhyme', iter_rhymes, rhyme_cutoff)]:
+        if pun_type not in (this_type, 'all'):
+            continue
+        top_puns = TopKCollector(k)
+        for pun in iter_puns(nearest_words1, nearest_words2, cutoff=this_cutoff, block_size=API_STREAM_BLOCK_SIZE):
+            top_puns.add(pun)
+            yield json.dumps({'event': 'pun', 'type': this_type, 'score': pun.ordering_criterion(), 'pun': pun.serialize()}) + '\n'
+        done[this_type+'s'] = map(lambda x: x.serialize(), top_puns.get_puns())
+    yield json.dumps(done) + '\n'
+
+@app.route('/api/puns')
+def api_puns():
+    '''
+    JSON API returning the same serialized puns as the results page
+    Query parameters:
+    word1, word2 : the input words (required)
+    k : maximum number of puns of each type to return (default MAX_PORTMANTEAUS)
+    type : 'portmanteau', 'rhyme', or 'all' (default)
+    portmanteau_cutoff : only keep portmanteaus whose ordering criterion is below this value (default Portmanteau.ORDERING_CRITERION_CUTOFF)
+    rhyme_cutoff : only keep rhymes whose overlap phoneme probability is below this value (default no cutoff)
+    stream : if '1' or 'true', respond with NDJSON lines as the puns are found, see iter_pun_events
+    n, s : number of semantic neighbors (at most MAX_API_NEIGHBORS) and their minimum cosine similarity (between -1 and 1),
+           computed on demand (requires a neighbor index)
+    '''
+    word1, word2 = request.args.get('word1', '').strip(), request.args.get('word2', '').strip()
+    if not word1 or not word2:
+        return api_error("Query parameters 'word1' and 'word2' are required")
+
+    if 'cutoff' in request.args:
+        # Portmanteaus and rhymes are scored on different scales, so no single cutoff suits both
+        return api_error("Query parameter 'cutoff' is not supported, use 'portmanteau_cutoff' and/or 'rhyme_cutoff'")
+    try:
+        k = int(request.args.get('k', MAX_PORTMANTEAUS))
+        portmanteau_cutoff = request.args.get('portmanteau_cutoff')
+        portmanteau_cutoff = float(portmanteau_cutoff) if portmanteau_cutoff is not None else None
+        rhyme_cutoff = request.args.get('rhyme_cutoff')
+        rhyme_cutoff = float(rhyme_cutoff) if rhyme_cutoff is not None else None
+        n = request.args.get('n')
+        n = int(n) if n is not None else None
+        s = request.args.get('s')
+        s = float(s) if s is not None else None
+    except ValueError:
+        return api_error("Query parameters 'k', 'portmanteau_cutoff', 'rhyme_cutoff', 'n', and 's' must be numbers")
+    if k < 1 or (n is not None and n < 1):
+        return api_error("Query parameters 'k' and 'n' must be positive")
+    if n is not None and n > MAX_API_NEIGHBORS:
+        return api_error("Query parameter 'n' must be at most {}".format(MAX_API_NEIGHBORS))
+    if s is not None and not -1. <= s <= 1.:
+        return api_error("Query parameter 's' must be between -1 and 1")
+    if (n is not None or s is not None) and get_neighbor_index() is None:
+        return api_error("Query parameters 'n' and 's' require a neighbor index, see NEIGHBOR_INDEX_PATH")
+
+    pun_type = request.args.get('type', 'all')
+    if pun_type not in API_PUN_TYPES:
+        return api_error("Query parameter 'type' must be one of: " + ', '.join(API_PUN_TYPES))
+
+    canonical_grapheme1, canonical_grapheme2 = resolve_graphemes([word1, word2])
+    for word, canonical_grapheme in [(word1, canonical_grapheme1), (word2, canonical_grapheme2)]:
+        if canonical_grapheme is None:
+            return api_error('Word not recognized: ' + word, 404)
+
+    if request.args.get('stream', '').lower() in ('1', 'true'):
+        return Response(stream_with_context(iter_pun_events(word1, word2, pun_type, k, portmanteau_cutoff, rhyme_cutoff, n=n, s=s)), mimetype='application/x-ndjson')
+
+    if portmanteau_cutoff is None and rhyme_cutoff is None and n is None and s is None and k <= min(MAX_PORTMANTEAUS, MAX_RHYMES):
+        # The default query is a prefix of the results page, so share its cache
+        pun_results = get_cached_puns_from_words(word1, word2)
+    else:
+        nearest_words1, nearest_words2 = get_nearest_words(word1, word2, n=n, s=s)
+        portmanteau_cutoff, rhyme_cutoff = get_pun_cutoffs(portmanteau_cutoff, rhyme_cutoff)
+        engine = get_pair_engine(len(nearest_words1)*len(nearest_words2))
+        pun_results = {}
+        if pun_type in ('portmanteau', 'all'):
+            with stage_timer('portmanteaus'):
+                portmanteaus = get_portmanteaus(nearest_words1, nearest_words2, engine=engine, cutoff=portmanteau_cutoff, k=k)
+            with stage_timer('serialization'):
+                pun_results['portmanteaus'] = map(lambda x: x.serialize(), portmanteaus)
+        if pun_type in ('rhyme', 'all'):
+            with stage_timer('rhymes'):
+                rhymes = get_rhymes(nearest_words1, nearest_words2, engine=engine, cutoff=rhyme_cutoff, k=k)
+            with stage_timer('serialization'):
+                pun_results['rhymes'] = map(lambda x: x.serialize(), rhymes)
+
+    response = {'word1': canonical_grapheme1, 'word2': canonical_grapheme2}
+    if pun_type in ('portmanteau', 'all'):
+        response['portmanteaus'] = pun_results['portmanteaus'][:k]
+    if pun_type in ('rhyme', 'all'):
+        response['rhymes'] = pun_results['rhymes'][:k]
+    return jsonify(response)
@@ -0,0 +1,81 @@
+import heapq
+from itertools import count
+
+
+class _HeapEntry(object):
+    '''
+    Heap entry whose comparison is reversed, so that heapq's min-heap keeps the *worst* retained pun at the root
+    '''
+    __slots__ = ('rank', 'pun')
+
+    def __init__(self, rank, pun):
+        self.rank = rank
+        self.pun = pun
+
+    def __lt__(self, other):
+        return self.rank > other.rank
+
+
+class TopKCollector(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Collects the k best puns (those with the smallest ordering criteria) out of a stream of candidates,
+    deduplicating them by their get_key(), in O(k) memory and O(log k) time per candidate
+
+    Ties in the ordering criterion are broken by arrival order, so the result matches a stable sort of the
+    deduplicated candidates truncated to k. An evicted pun's duplicates can never be re-admitted, since they
+    rank strictly below everything retained, so only the keys of the retained puns need to be kept
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    k, Int : maximum number of puns retained (None to retain them all)
+    '''
+
+    def __init__(self, k=None):
+        self.k = k
+        self._heap = []
+        self._keys = set()
+        self._arrivals = count()
+
+    def __len__(self):
+        return len(self._heap)
+
+    def is_full(self):
+        return self.k is not None and len(self._heap) >= self.k
+
+    def get_threshold(self):
+        '''
+        Return the ordering criterion a candidate must beat to be retained, or None while fewer than k puns are held
+        '''
+        if not self.is_full():
+            return None
+        return self._heap[0].rank[0]
+
+    def add(self, pun):
+        '''
+        Offer a candidate pun, returning True iff it was retained
+        '''
+        if self.k == 0:
+            return False
+        key = pun.get_key()
+        if key in self._keys:
+            return False
+        entry = _HeapEntry((pun.ordering_criterion(), next(self._arrivals)), pun)
+        if not self.is_full():
+            heapq.heappush(self._heap, entry)
+        elif entry.rank < self._heap[0].rank:
+            evicted = heapq.heapreplace(self._heap, entry)
+            self._keys.discard(evicted.pun.get_key())
+        else:
+            return False
+        self._keys.add(key)
+        return True
+
+    def get_puns(self):
+        '''
+        Return the retained puns, with better puns appearing earlier
+        '''
+        return [entry.pun for entry in sorted(self._heap, key=lambda entry: entry.rank)]
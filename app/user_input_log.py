@@ -0,0 +1,151 @@
+import os
+import atexit
+from Queue import Queue, Full, Empty
+from threading import Thread, Lock
+from time import time
+
+# Marker telling the writer thread to flush what it has and exit
+_STOP = object()
+
+
+class UserInputLogger(object):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Logs UserInput rows off the request path: rows are put on a bounded in-process queue, and a background writer
+    thread bulk-inserts them in batches, as soon as batch_size rows are waiting or flush_seconds after the first of them
+
+    Requests never wait on the database. If the writer falls behind and the queue is full, new rows are dropped and
+    counted rather than blocking the request. Rows still queued when the process exits are flushed by an atexit hook
+
+    The writer thread is started on first use in each process, so that it survives gunicorn forking its workers
+
+    -------------------
+    # CLASS VARIABLES #
+    -------------------
+    table, Table : the table to insert into, i.e. UserInput.__table__
+    max_queue_size, Int : maximum number of rows waiting to be written
+    batch_size, Int : maximum number of rows inserted per statement
+    flush_seconds, Float : longest time a row waits for its batch to fill up
+    written, Int : number of rows inserted
+    dropped, Int : number of rows dropped because the queue was full
+    failed, Int : number of rows whose insert raised an error
+    '''
+
+    def __init__(self, table, get_engine, max_queue_size=10000, batch_size=100, flush_seconds=1.0):
+        self.table = table
+        self.get_engine = get_engine
+        self.max_queue_size = max_queue_size
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue = Queue(max_queue_size)
+        self._lock = Lock()
+        self._thread = None
+        self._pid = None
+
+    def _ensure_writer(self):
+        with self._lock:
+            if self._pid != os.getpid() or not self._thread.is_alive():
+                # Threads don't survive a fork, and neither should rows queued by the parent
+                if self._pid != os.getpid():
+                    self._queue = Queue(self.max_queue_size)
+                    self._pid = os.getpid()
+                self._thread = Thread(target=self._run, name='user-input-logger')
+                self._thread.daemon = True
+                self._thread.start()
+
+    def log(self, row):
+        '''
+        Queue the row (a dict mapping UserInput column names to values) to be written, returning False if it was dropped
+        '''
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except Full:
+            with self._lock:
+                self.dropped += 1
+            return False
+
+    def _next_batch(self):
+        '''
+        Block until a row is queued, then collect up to batch_size rows for at most flush_seconds
+        Returns the batch, and whether the stop marker was reached
+        '''
+        batch = []
+        row = self._queue.get()
+        deadline = time() + self.flush_seconds
+        while row is not _STOP:
+            batch.append(row)
+            if len(batch) >= self.batch_size:
+                return batch, False
+            try:
+                row = self._queue.get(timeout=max(deadline - time(), 0))
+            except Empty:
+                return batch, False
+        return batch, True
+
+    def _write(self, batch):
+        try:
+            with self.get_engine().begin() as connection:
+                connection.execute(self.table.insert(), batch)
+            self.written += len(batch)
+        except Exception:
+            # Logging must never take the app down, so count the lost rows (see /metrics) and carry on
+            from app import app
+            self.failed += len(batch)
+            app.logger.exception('Failed to log {} user inputs'.format(len(batch)))
+
+    def _run(self):
+        while True:
+            batch, stopped = self._next_batch()
+            if batch:
+                self._write(batch)
+            if stopped:
+                return
+
+    def close(self, timeout=5.0):
+        '''
+        Flush the queued rows and stop the writer thread, waiting at most timeout seconds
+        '''
+        with self._lock:
+            thread = self._thread if self._pid == os.getpid() else None
+        if thread is None or not thread.is_alive():
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout)
+        except Full:
+            return
+        thread.join(timeout)
+
+    def stats(self):
+        return {'backend': 'queue', 'size': self._queue.qsize(), 'written': self.written, 'dropped': self.dropped, 'failed': self.failed}
+
+
+# Process-wide logger, created on first use
+_user_input_logger = None
+
+def get_user_input_logger():
+    '''
+    Return the process-wide UserInputLogger, configured by the app's USER_INPUT_LOG_* settings,
+    or None if USER_INPUT_LOG_MODE is 'sync' (in which case rows are written on the request path)
+    '''
+    global _user_input_logger
+    if _user_input_logger is None:
+        from app import app, db
+        from app.models import UserInput
+        mode = app.config.get('USER_INPUT_LOG_MODE') or 'async'
+        if mode == 'sync':
+            return None
+        elif mode != 'async':
+            raise ValueError("USER_INPUT_LOG_MODE must be either 'async' or 'sync'")
+        _user_input_logger = UserInputLogger(UserInput.__table__, lambda: db.engine,
+                                             max_queue_size=app.config.get('USER_INPUT_LOG_QUEUE_SIZE', 10000),
+                                             batch_size=app.config.get('USER_INPUT_LOG_BATCH_SIZE', 100),
+                                             flush_seconds=app.config.get('USER_INPUT_LOG_FLUSH_SECONDS', 1.0))
+        atexit.register(_user_input_logger.close)
+    return _user_input_logger
@@ -0,0 +1,245 @@
+import numpy as np
+from app.phones import PAD_PHONE_ID, PHONE_IS_VOWEL, PHONE_IS_CONSONANT, PHONE_IS_STRESSED_VOWEL, PHONE_DISTANCE_MATRIX, get_phone_ids
+from app.portmanteau import Portmanteau
+from app.rhyme import Rhyme
+
+def get_word_phone_ids(word):
+    '''
+    Return the word's phone IDs, reusing the precomputed IDs of LexiconWords
+    '''
+    phone_ids = getattr(word, 'phone_ids', None)
+    if phone_ids is None:
+        phone_ids = get_phone_ids(word.phoneme)
+    return np.asarray(phone_ids, dtype=np.int16)
+
+def get_word_chunk_boundaries(word):
+    '''
+    Return boolean arrays (valid_starts, valid_ends) of length len(phoneme)+1, where
+    valid_starts[p] is True iff a phoneme chunk starts at phone p, and
+    valid_ends[p+1] is True iff a phoneme chunk ends at phone p
+    i.e. the positions accepted by Word.get_subgrapheme_from_subphoneme_inds
+    '''
+    chunk_lengths = np.array(map(len, word.phoneme_chunks), dtype=np.int32)
+    chunk_ends = np.cumsum(chunk_lengths)
+    valid_starts = np.zeros(len(word.phoneme)+1, dtype=bool)
+    valid_ends = np.zeros(len(word.phoneme)+1, dtype=bool)
+    valid_starts[chunk_ends - chunk_lengths] = True
+    valid_ends[chunk_ends] = True
+    return valid_starts, valid_ends
+
+def pack_words(words, align='left'):
+    '''
+    Pack the phone IDs and chunk boundaries of the words into padded matrices
+
+    With align='left' phone p of word i is stored in column p, with align='right' the last phone of
+    every word is stored in the last column, so that head (resp. tail) overlaps of a given length
+    occupy the same columns for every word
+
+    Returns (phone_ids, lengths, valid_starts, valid_ends), where the boundary matrices are
+    always left-aligned and have one more column than phone_ids
+    '''
+    word_phone_ids = [get_word_phone_ids(word) for word in words]
+    lengths = np.array([len(phone_ids) for phone_ids in word_phone_ids], dtype=np.int32)
+    max_len = lengths.max() if len(words) else 0
+
+    phone_ids = np.full((len(words), max_len), PAD_PHONE_ID, dtype=np.int16)
+    valid_starts = np.zeros((len(words), max_len+1), dtype=bool)
+    valid_ends = np.zeros((len(words), max_len+1), dtype=bool)
+    for i, word in enumerate(words):
+        if align == 'left':
+            phone_ids[i, :lengths[i]] = word_phone_ids[i]
+        else:
+            phone_ids[i, max_len-lengths[i]:] = word_phone_ids[i]
+        word_valid_starts, word_valid_ends = get_word_chunk_boundaries(word)
+        valid_starts[i, :lengths[i]+1] = word_valid_starts
+        valid_ends[i, :lengths[i]+1] = word_valid_ends
+    return phone_ids, lengths, valid_starts, valid_ends
+
+def get_tail_counts(phone_ids, phone_mask):
+    '''
+    Given right-aligned phone IDs, return counts[i,k] = number of phones in the last k phones of word i
+    for which phone_mask is True, for k = 0..max_len
+    '''
+    flags = phone_mask[phone_ids][:, ::-1].astype(np.int32)
+    return np.hstack([np.zeros((phone_ids.shape[0], 1), dtype=np.int32), np.cumsum(flags, axis=1)])
+
+def get_portmanteau_overlaps(words1, words2, phone_distance_matrix=PHONE_DISTANCE_MATRIX):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Batched equivalent of running Portmanteau.get_pun(word1, word2) on every pair in words1 x words2,
+    stopping short of constructing the Portmanteau objects
+
+    For every overlap length, the tail(word1)/head(word2) phoneme distances of all pairs are computed at once
+    via the phone-distance lookup table, and combined with the per-word vowel/consonant/alignment checks.
+    As in Portmanteau.get_pun, each pair keeps the shortest overlap satisfying every constraint
+
+    ----------
+    # INPUTS #
+    ----------
+    words1, List[Word] : candidate first words
+    words2, List[Word] : candidate second words
+
+    -----------
+    # OUTPUTS #
+    -----------
+    Tuple of equal-length arrays, one entry per (word1, word2) pair admitting a portmanteau:
+    inds1, Array[Int] : index of word1 within words1
+    inds2, Array[Int] : index of word2 within words2
+    overlap_lens, Array[Int] : number of overlapping phones
+    overlap_distances, Array[Int] : phoneme distance of the overlap
+    n_vowels, Array[Int] : number of vowel phones in the overlap
+    n_consonants, Array[Int] : number of consonant phones in the overlap
+    '''
+    empty = np.zeros(0, dtype=np.int32)
+    if not words1 or not words2:
+        return empty, empty, empty, empty, empty, empty
+
+    phone_ids1, lengths1, valid_starts1, _ = pack_words(words1, align='right')
+    phone_ids2, lengths2, _, valid_ends2 = pack_words(words2, align='left')
+    max_len1, max_len2 = phone_ids1.shape[1], phone_ids2.shape[1]
+    vowel_counts1 = get_tail_counts(phone_ids1, PHONE_IS_VOWEL)
+    consonant_counts1 = get_tail_counts(phone_ids1, PHONE_IS_CONSONANT)
+    rows1 = np.arange(len(words1))
+
+    found = np.zeros((len(words1), len(words2)), dtype=bool)
+    overlap_lens = np.zeros((len(words1), len(words2)), dtype=np.int32)
+    overlap_distances = np.zeros((len(words1), len(words2)), dtype=np.int32)
+
+    for overlap_len in range(1, min(max_len1, max_len2)):
+        # Constraints which only depend on word1: enough vowels/consonants, enough non-overlapping phones,
+        # and the overlap must start on a chunk boundary
+        word1_ok = (lengths1 - overlap_len >= Portmanteau.MIN_NON_OVERLAP_PHONES) \
+            & (vowel_counts1[:, overlap_len] >= Portmanteau.MIN_OVERLAP_VOWEL_PHONES) \
+            & (consonant_counts1[:, overlap_len] >= Portmanteau.MIN_OVERLAP_CONSONANT_PHONES) \
+            & valid_starts1[rows1, np.maximum(lengths1 - overlap_len, 0)]
+        # Constraints which only depend on word2: enough non-overlapping phones, and the overlap must end on a chunk boundary
+        word2_ok = (lengths2 - overlap_len >= Portmanteau.MIN_NON_OVERLAP_PHONES) & valid_ends2[:, overlap_len]
+        # Get_pun only considers overlaps shorter than both words
+        word1_ok &= lengths1 > overlap_len
+        word2_ok &= lengths2 > overlap_len
+
+        candidates = word1_ok[:, np.newaxis] & word2_ok[np.newaxis, :] & ~found
+        if not candidates.any():
+            continue
+
+        # Sum the phone distances between the last overlap_len phones of word1 and the first overlap_len phones of word2
+        tails1 = phone_ids1[:, max_len1-overlap_len:]
+        heads2 = phone_ids2[:, :overlap_len]
+        distances = phone_distance_matrix[tails1[:, np.newaxis, :], heads2[np.newaxis, :, :]].sum(axis=2)
+
+        hits = candidates & (distances <= Portmanteau.MAX_OVERLAP_DIST)
+        overlap_lens[hits] = overlap_len
+        overlap_distances[hits] = distances[hits]
+        found |= hits
+
+    inds1, inds2 = np.nonzero(found)
+    overlap_lens = overlap_lens[inds1, inds2]
+    n_vowels = vowel_counts1[inds1, overlap_lens]
+    n_consonants = consonant_counts1[inds1, overlap_lens]
+    return inds1, inds2, overlap_lens, overlap_distances[inds1, inds2], n_vowels, n_consonants
+
+def get_rhyme_overlaps(words1, words2, phone_distance_matrix=PHONE_DISTANCE_MATRIX):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Batched equivalent of running Rhyme.get_pun(word1, word2) on every pair in words1 x words2,
+    stopping short of constructing the Rhyme objects
+
+    Both sets of words are right-aligned, so the phone distances of every pair can be computed once per
+    position, and a cumulative sum from the right gives the tail distances for every overlap length at once.
+    The stressed-vowel, vowel/consonant, and alignment checks are applied with per-phone class masks and
+    per-word chunk boundaries. As in Rhyme.get_pun, each pair keeps the longest overlap satisfying every constraint
+
+    ----------
+    # INPUTS #
+    ----------
+    words1, List[Word] : candidate first words
+    words2, List[Word] : candidate second words
+
+    -----------
+    # OUTPUTS #
+    -----------
+    Tuple of equal-length arrays, one entry per (word1, word2) pair admitting a rhyme:
+    inds1, Array[Int] : index of word1 within words1
+    inds2, Array[Int] : index of word2 within words2
+    overlap_lens, Array[Int] : number of overlapping phones
+    overlap_distances, Array[Int] : phoneme distance of the overlap
+    n_vowels, Array[Int] : number of vowel phones in the overlap
+    n_consonants, Array[Int] : number of consonant phones in the overlap
+    '''
+    empty = np.zeros(0, dtype=np.int32)
+    if not words1 or not words2:
+        return empty, empty, empty, empty, empty, empty
+
+    phone_ids1, lengths1, valid_starts1, valid_ends1 = pack_words(words1, align='right')
+    phone_ids2, lengths2, valid_starts2, valid_ends2 = pack_words(words2, align='right')
+    # Pad both matrices on the left to a common width
+    max_len = max(phone_ids1.shape[1], phone_ids2.shape[1])
+    phone_ids1 = np.pad(phone_ids1, ((0, 0), (max_len-phone_ids1.shape[1], 0)), 'constant', constant_values=PAD_PHONE_ID)
+    phone_ids2 = np.pad(phone_ids2, ((0, 0), (max_len-phone_ids2.shape[1], 0)), 'constant', constant_values=PAD_PHONE_ID)
+
+    # Per-word checks for every overlap length k = 0..max_len, stored in column k
+    overlap_range = np.arange(max_len+1)
+    def get_word_ok(phone_ids, lengths, valid_starts, valid_ends):
+        rows = np.arange(phone_ids.shape[0])[:, np.newaxis]
+        overlap_starts = np.maximum(lengths[:, np.newaxis] - overlap_range, 0)
+        # The first overlapping phone must be a stressed vowel (column 0 corresponds to an empty overlap)
+        first_phone_stressed = np.hstack([np.zeros((phone_ids.shape[0], 1), dtype=bool), PHONE_IS_STRESSED_VOWEL[phone_ids[:, ::-1]]])
+        return (overlap_range < lengths[:, np.newaxis]) \
+            & (overlap_range >= Rhyme.MIN_OVERLAP_PHONES) \
+            & first_phone_stressed \
+            & valid_starts[rows, overlap_starts] \
+            & valid_ends[rows, lengths[:, np.newaxis]]
+    vowel_counts1 = get_tail_counts(phone_ids1, PHONE_IS_VOWEL)
+    consonant_counts1 = get_tail_counts(phone_ids1, PHONE_IS_CONSONANT)
+    word1_ok = get_word_ok(phone_ids1, lengths1, valid_starts1, valid_ends1) \
+        & (vowel_counts1 >= Rhyme.MIN_OVERLAP_VOWEL_PHONES) \
+        & (consonant_counts1 >= Rhyme.MIN_OVERLAP_CONSONANT_PHONES)
+    word2_ok = get_word_ok(phone_ids2, lengths2, valid_starts2, valid_ends2)
+
+    # distances[i,j,k] = phoneme distance between the last k phones of word1 and word2
+    position_distances = phone_distance_matrix[phone_ids1[:, np.newaxis, ::-1], phone_ids2[np.newaxis, :, ::-1]]
+    distances = np.concatenate([np.zeros((len(words1), len(words2), 1), dtype=np.int32), np.cumsum(position_distances, axis=2)], axis=2)
+
+    ok = (distances <= Rhyme.MAX_OVERLAP_DIST) & word1_ok[:, np.newaxis, :] & word2_ok[np.newaxis, :, :]
+
+    # Keep the longest qualifying overlap of each pair
+    inds1, inds2 = np.nonzero(ok.any(axis=2))
+    overlap_lens = max_len - np.argmax(ok[inds1, inds2, ::-1], axis=1)
+    overlap_distances = distances[inds1, inds2, overlap_lens]
+    return inds1, inds2, overlap_lens, overlap_distances, vowel_counts1[inds1, overlap_lens], consonant_counts1[inds1, overlap_lens]
+
+def get_portmanteau_criteria(words1, words2):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Run get_portmanteau_overlaps, and compute the ordering criterion of every portmanteau it finds without constructing them
+
+    Portmanteau.ordering_criterion is OVERLAP_DISTANCE_COEF*overlap_distance + OVERLAP_PHONEME_PROB_COEF*log(p_tail(word1)*p_head(word2)),
+    where both probabilities only depend on one word and the overlap length, so they are looked up once per (word, overlap length)
+    rather than once per pair. The criteria agree with Portmanteau.ordering_criterion up to floating point rounding
+
+    -----------
+    # OUTPUTS #
+    -----------
+    The outputs of get_portmanteau_overlaps, followed by
+    criteria, Array[Float] : ordering criterion of each portmanteau
+    '''
+    overlaps = get_portmanteau_overlaps(words1, words2)
+    inds1, inds2, overlap_lens, overlap_distances = overlaps[:4]
+
+    def get_log_probs(words, inds, side):
+        log_probs = {}
+        for idx, overlap_len in set(zip(inds.tolist(), overlap_lens.tolist())):
+            phoneme = words[idx].phoneme
+            subphoneme = phoneme[len(phoneme)-overlap_len:] if side == 'tail' else phoneme[:overlap_len]
+            log_probs[idx, overlap_len] = np.log(Portmanteau.get_subphoneme_prob(tuple(subphoneme), side))
+        return np.array([log_probs[key] for key in zip(inds.tolist(), overlap_lens.tolist())], dtype=float)
+
+    criteria = Portmanteau.OVERLAP_DISTANCE_COEF * overlap_distances \
+        + Portmanteau.OVERLAP_PHONEME_PROB_COEF * (get_log_probs(words1, inds1, 'tail') + get_log_probs(words2, inds2, 'head'))
+    return overlaps + (criteria,)
@@ -7,3 +7,34 @@ class Config(object):
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     TEMPLATES_AUTO_RELOAD = True
     SSLIFY_PERMANENT = True
+    # Cache of generated puns, keyed by the canonical input graphemes; backend is 'memory', 'disk', or None
+    RESULT_CACHE_BACKEND = os.environ.get('RESULT_CACHE_BACKEND', 'memory') or None
+    RESULT_CACHE_MAX_SIZE = int(os.environ.get('RESULT_CACHE_MAX_SIZE', 1024))
+    RESULT_CACHE_TTL = int(os.environ.get('RESULT_CACHE_TTL', 24*60*60))
+    RESULT_CACHE_PATH = os.environ.get('RESULT_CACHE_PATH', os.path.join(basedir, 'result_cache.sqlite'))
+    # The read-only tables (words, frequencies, neighbors) are read from 'postgres', or from the local SQLite file
+    # DATA_BUNDLE_PATH built by 'manage.py build_data_bundle' ('bundle'); UserInput logging always goes to Postgres
+    DATA_BACKEND = os.environ.get('DATA_BACKEND', 'postgres')
+    DATA_BUNDLE_PATH = os.environ.get('DATA_BUNDLE_PATH', os.path.join(basedir, 'data', 'data_bundle.sqlite'))
+    # Directory of the approximate nearest-neighbor index used to compute semantic neighbors on demand (None to disable)
+    NEIGHBOR_INDEX_PATH = os.environ.get('NEIGHBOR_INDEX_PATH')
+    # Directory of the memory-mapped precomputed neighbor store, which replaces the FasttextNeighbor table (None to use the table)
+    NEIGHBOR_STORE_PATH = os.environ.get('NEIGHBOR_STORE_PATH')
+    # Pair evaluation is 'serial', or 'pool' to spread queries of at least PAIR_POOL_THRESHOLD word pairs across a
+    # persistent pool of PAIR_POOL_PROCESSES workers (default: one per CPU), in tiles of PAIR_POOL_TILE_SIZE x PAIR_POOL_TILE_SIZE pairs
+    PAIR_EVALUATION_MODE = os.environ.get('PAIR_EVALUATION_MODE', 'serial')
+    PAIR_POOL_PROCESSES = int(os.environ.get('PAIR_POOL_PROCESSES', 0)) or None
+    PAIR_POOL_THRESHOLD = int(os.environ.get('PAIR_POOL_THRESHOLD', 10000))
+    PAIR_POOL_TILE_SIZE = int(os.environ.get('PAIR_POOL_TILE_SIZE', 50))
+    # User inputs are logged by a background thread ('async'), which bulk-inserts them in batches of up to
+    # USER_INPUT_LOG_BATCH_SIZE rows, at most USER_INPUT_LOG_FLUSH_SECONDS after they're queued, or on the request path ('sync')
+    # Rows are dropped rather than queued beyond USER_INPUT_LOG_QUEUE_SIZE
+    USER_INPUT_LOG_MODE = os.environ.get('USER_INPUT_LOG_MODE', 'async')
+    USER_INPUT_LOG_QUEUE_SIZE = int(os.environ.get('USER_INPUT_LOG_QUEUE_SIZE', 10000))
+    USER_INPUT_LOG_BATCH_SIZE = int(os.environ.get('USER_INPUT_LOG_BATCH_SIZE', 100))
+    USER_INPUT_LOG_FLUSH_SECONDS = float(os.environ.get('USER_INPUT_LOG_FLUSH_SECONDS', 1.0))
+    # Opt-in profiling: a PROFILE_SAMPLE_RATE fraction of requests is run under cProfile, and the stats of those taking
+    # longer than PROFILE_SLOW_REQUEST_SECONDS are dumped to PROFILE_DIR (None to disable)
+    PROFILE_DIR = os.environ.get('PROFILE_DIR')
+    PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', 0.1))
+    PROFILE_SLOW_REQUEST_SECONDS = float(os.environ.get('PROFILE_SLOW_REQUEST_SECONDS', 1.0))
@@ -5,41 +5,91 @@ from flask_script import Manager
 from app import app, db
 from app.models import *
 from time import time
+from collections import OrderedDict
 
 import sys
 sys.path.insert(0, 'scripts') # need to add the code path for other imports to work
 from populate_word_table import populate_word_table
 from populate_subgrapheme_frequency_table import populate_subgrapheme_frequency_table
 from populate_subphoneme_frequency_table import populate_subphoneme_frequency_table
-from populate_fasttext_neighbor_table import populate_fasttext_neighbor_table
+from populate_fasttext_neighbor_table import populate_fasttext_neighbor_table, populate_semantic_neighbors, populate_store_semantic_neighbors, NEIGHBOR_STORE_PATH
+from generate_batch_puns import generate_batch_puns
+from bulk_load import run_loaders
+from build_data_bundle import build_data_bundle_file
 
 manager = Manager(app)
 
-@manager.command
-def populate_tables():
+# Table loaders run by populate_tables, as (populate_function, Model)
+TABLE_LOADERS = OrderedDict([
+    (Word.__tablename__, (populate_word_table, Word)),
+    (SubgraphemeFrequency.__tablename__, (populate_subgrapheme_frequency_table, SubgraphemeFrequency)),
+    (SubphonemeFrequency.__tablename__, (populate_subphoneme_frequency_table, SubphonemeFrequency)),
+    (FasttextNeighbor.__tablename__, (populate_fasttext_neighbor_table, FasttextNeighbor)),
+    ])
+
+@manager.option('--only', dest='only', default=None, choices=TABLE_LOADERS.keys(), help='Rebuild only this table')
+@manager.option('-p', '--processes', dest='processes', type=int, default=None, help='Number of tables loaded concurrently (default: all of them)')
+def populate_tables(only, processes):
     '''
     Pass in the Class instantiators directly to avoid import issues
-    Takes ~8min to run with the current 4 tables
+    Each table is emptied and bulk-loaded from a stream of rows, and the tables are loaded concurrently
     '''
     start = time()
-    # Populate the Word table, and commit the changes
-    populate_word_table(Word, db)
-    print 'Finished populating Word table after {:.0f} seconds'.format(time()-start)
+    loaders = TABLE_LOADERS if only is None else OrderedDict([(only, TABLE_LOADERS[only])])
+    run_loaders(loaders, db, processes=processes)
+    print 'Finished populating {} tables after {:.0f} seconds'.format(len(loaders), time()-start)
 
+@manager.command
+def reduce_fasttext_neighbors():
+    '''
+    Precompute the lemmatized/deduplicated neighbor lists of an already-populated FasttextNeighbor table
+    '''
     start = time()
-    # Populate the SubgraphemeFrequency table, and commit the changes
-    populate_subgrapheme_frequency_table(SubgraphemeFrequency, db)
-    print 'Finished populating SubgraphemeFrequency table after {:.0f} seconds'.format(time()-start)
+    populate_semantic_neighbors(FasttextNeighbor, db)
+    print 'Finished reducing FasttextNeighbor table after {:.0f} seconds'.format(time()-start)
 
+@manager.option('-s', '--store', dest='store_path', default=None, help='Neighbor store directory (default: data/word_vectors/neighbor_store)')
+def reduce_neighbor_store(store_path):
+    '''
+    Precompute the lemmatized/deduplicated neighbor lists of the memory-mapped neighbor store
+    '''
     start = time()
-    # Populate the SubphonemeFrequency table, and commit the changes
-    populate_subphoneme_frequency_table(SubphonemeFrequency, db)
-    print 'Finished populating SubphonemeFrequency table after {:.0f} seconds'.format(time()-start)
+    populate_store_semantic_neighbors(store_path or app.config.get('NEIGHBOR_STORE_PATH') or NEIGHBOR_STORE_PATH)
+    print 'Finished reducing neighbor store after {:.0f} seconds'.format(time()-start)
 
+@manager.option('-o', '--output', dest='bundle_path', default=None, help='Bundle file to write (default: DATA_BUNDLE_PATH)')
+@manager.option('-s', '--store', dest='store_path', default=None, help='Neighbor store directory (default: data/word_vectors/neighbor_store)')
+def build_data_bundle(bundle_path, store_path):
+    '''
+    Build the read-only words, frequency, and neighbor tables into a single local SQLite file,
+    which the app reads instead of Postgres when DATA_BACKEND=bundle
+    '''
     start = time()
-    # Populate the FasttextNeighbor table, and commit the changes
-    populate_fasttext_neighbor_table(FasttextNeighbor, db)
-    print 'Finished populating FasttextNeighbor table after {:.0f} seconds'.format(time()-start)
+    bundle_path = bundle_path or app.config['DATA_BUNDLE_PATH']
+    counts = build_data_bundle_file(bundle_path, store_path or app.config.get('NEIGHBOR_STORE_PATH') or NEIGHBOR_STORE_PATH)
+    for table, n_rows in sorted(counts.items()):
+        print '{}: {} rows'.format(table, n_rows)
+    print 'Finished building data bundle {} after {:.0f} seconds'.format(bundle_path, time()-start)
+
+@manager.option('-i', '--input', dest='input_path', default='-', help='File of word pairs, one pair per line (default: stdin)')
+@manager.option('-o', '--output', dest='output_path', default='-', help='JSON lines file to write the puns to (default: stdout)')
+@manager.option('-p', '--processes', dest='processes', type=int, default=None, help='Number of worker processes (default: number of CPUs)')
+@manager.option('--max-pending', dest='max_pending', type=int, default=None, help='Maximum number of pairs in flight at once')
+def generate_batch(input_path, output_path, processes, max_pending):
+    '''
+    Generate the puns for a file of word pairs, e.g.
+    > python manage.py generate_batch -i pairs.txt -o puns.jsonl
+    Progress and throughput are reported on stderr
+    '''
+    input_file = sys.stdin if input_path == '-' else open(input_path)
+    output_file = sys.stdout if output_path == '-' else open(output_path, 'w')
+    try:
+        generate_batch_puns(input_file, output_file, db, SubgraphemeFrequency, SubphonemeFrequency, processes=processes, max_pending=max_pending)
+    finally:
+        if input_file is not sys.stdin:
+            input_file.close()
+        if output_file is not sys.stdout:
+            output_file.close()
 
 if __name__ == "__main__":
     manager.run()
@@ -0,0 +1,143 @@
+# ALL-BUT-THE-TOP post-processing of word vectors, from
+# "ALL-BUT-THE-TOP: SIMPLE AND EFFECTIVE POSTPROCESSING FOR WORD REPRESENTATIONS"
+#
+# Memory-aware implementation: the vectors are processed in place in float32 chunks, and the statistics
+# can be accumulated in a streaming pass over a FastText .vec file, so the full 1M-word file fits on a commodity box
+
+import io
+import numpy as np
+
+CHUNK_SIZE = 10000
+
+def iter_vec_file(vec_path, limit=None, chunk_size=CHUNK_SIZE):
+    '''
+    Stream a word2vec-format text file (e.g. FastText .vec), yielding (graphemes, vectors) chunks of at most
+    chunk_size words, where vectors is a float32 (n_words x n_dims) array
+    Only the first 'limit' words are read, if given
+    '''
+    with io.open(vec_path, encoding='utf-8', errors='strict') as f:
+        n_words, n_dims = map(int, f.readline().split())
+        n_words = n_words if limit is None else min(n_words, limit)
+        for chunk_start in range(0, n_words, chunk_size):
+            chunk_len = min(chunk_size, n_words - chunk_start)
+            graphemes = []
+            vectors = np.empty((chunk_len, n_dims), dtype=np.float32)
+            for row in range(chunk_len):
+                grapheme, values = f.readline().rstrip().split(' ', 1)
+                graphemes.append(grapheme)
+                vectors[row] = np.fromstring(values, sep=' ', dtype=np.float32)
+            yield graphemes, vectors
+
+def get_vec_file_shape(vec_path, limit=None):
+    with io.open(vec_path, encoding='utf-8') as f:
+        n_words, n_dims = map(int, f.readline().split())
+    return (n_words if limit is None else min(n_words, limit)), n_dims
+
+def fit_chunks(chunks, D=3):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Accumulate the mean and covariance of the vectors over a stream of chunks, and return the mean along with the
+    top D principal components, i.e. the same components as sklearn's PCA(n_components=D) fit on the centered vectors
+    (up to sign, which the projection does not depend on)
+
+    The sums are accumulated in float64 around the mean of the first chunk, to avoid catastrophic cancellation
+
+    ----------
+    # INPUTS #
+    ----------
+    chunks, Iterable[Array[Float]] : (n_words x n_dims) chunks of word vectors
+    D, Int : number of dominating directions to remove
+
+    -----------
+    # OUTPUTS #
+    -----------
+    mean, Array[Float] : mean vector
+    U, Array[Float] : (D x n_dims) principal components, largest first
+    '''
+    n, shift, shifted_sum, shifted_outer = 0, None, None, None
+    for chunk in chunks:
+        chunk = np.asarray(chunk, dtype=np.float64)
+        if shift is None:
+            shift = chunk.mean(axis=0)
+            shifted_sum = np.zeros_like(shift)
+            shifted_outer = np.zeros((len(shift), len(shift)))
+        chunk -= shift
+        n += len(chunk)
+        shifted_sum += chunk.sum(axis=0)
+        shifted_outer += chunk.T.dot(chunk)
+
+    shifted_mean = shifted_sum / n
+    covariance = (shifted_outer - n * np.outer(shifted_mean, shifted_mean)) / (n - 1)
+    eigenvalues, eigenvectors = np.linalg.eigh(covariance)
+    U = eigenvectors[:, np.argsort(eigenvalues)[::-1][:D]].T
+    return shift + shifted_mean, U
+
+def transform_in_place(X, mean, U, chunk_size=CHUNK_SIZE):
+    '''
+    Remove the mean and the projection onto the dominating directions U from every row of X, in place, one chunk at a time
+    X may be a writable memory map, and is only ever touched a chunk at a time
+
+    The projection is taken of the uncentered vectors, i.e. X' = (X - mean) - (X U^T) U, as in the original implementation
+    '''
+    mean, U = mean.astype(np.float32), U.astype(np.float32)
+    for chunk_start in range(0, len(X), chunk_size):
+        chunk = X[chunk_start:chunk_start+chunk_size]
+        projection = chunk.dot(U.T).dot(U)
+        chunk -= mean
+        chunk -= projection
+    return X
+
+def post_process(X, D=3, chunk_size=CHUNK_SIZE):
+    '''
+    Post-process an in-memory (n_words x n_vector_dims) matrix of word vectors, returning a float32 copy
+    '''
+    X = np.array(X, dtype=np.float32)
+    mean, U = fit_chunks((X[i:i+chunk_size] for i in range(0, len(X), chunk_size)), D=D)
+    return transform_in_place(X, mean, U, chunk_size=chunk_size)
+
+def load_post_processed_vec_file(vec_path, limit=None, D=3, normalize=True, out_path=None, chunk_size=CHUNK_SIZE):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Load and post-process the word vectors of a .vec file in two streaming passes: the first accumulates the
+    mean/covariance, and the second parses the vectors straight into the output matrix and transforms them in place,
+    so peak memory is a single float32 copy of the vectors (or none at all, if out_path is given)
+
+    ----------
+    # INPUTS #
+    ----------
+    vec_path, String : word2vec-format text file
+    limit, Int : number of words to load, most frequent first (None for all of them)
+    D, Int : number of dominating directions to remove
+    normalize, Boolean : whether to scale the post-processed vectors to unit length
+    out_path, String : if given, the vectors are written to a .npy file at this path and returned memory-mapped
+
+    -----------
+    # OUTPUTS #
+    -----------
+    graphemes, List[String] : the words, in file order
+    vectors, Array[Float] : (n_words x n_dims) float32 post-processed vectors
+    '''
+    mean, U = fit_chunks((vectors for graphemes, vectors in iter_vec_file(vec_path, limit=limit, chunk_size=chunk_size)), D=D)
+
+    shape = get_vec_file_shape(vec_path, limit=limit)
+    if out_path is None:
+        X = np.empty(shape, dtype=np.float32)
+    else:
+        X = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float32, shape=shape)
+
+    graphemes = []
+    chunk_start = 0
+    for chunk_graphemes, chunk in iter_vec_file(vec_path, limit=limit, chunk_size=chunk_size):
+        transform_in_place(chunk, mean, U, chunk_size=chunk_size)
+        if normalize:
+            chunk /= np.linalg.norm(chunk, axis=1)[:, np.newaxis]
+        X[chunk_start:chunk_start+len(chunk)] = chunk
+        graphemes.extend(chunk_graphemes)
+        chunk_start += len(chunk)
+    if out_path is not None:
+        X.flush()
+    return graphemes, X
@@ -0,0 +1,64 @@
+# Micro-benchmark comparing the string-based phone distance rules against the precomputed lookup tables
+# Script is called from the top-level entendrepreneur-web directory as:
+# > python scripts/benchmark_phone_distance.py
+
+import numpy as np
+import sys
+sys.path.insert(0, '.') # need to add the top-level directory for the 'app' imports to work
+from timeit import timeit
+from app.global_constants import ARPABET_VOWELS, ARPABET_CONSONANTS
+from app.phones import PHONE_IDS, get_phone_distance_by_rule
+from app.pun import Pun
+
+N_PAIRS = 100000
+OVERLAP_LEN = 3
+
+# Sample phone pairs uniformly from the phones which actually occur in the CMU Pronouncing Dictionary,
+# i.e. stressed vowels and unstressed consonants
+rng = np.random.RandomState(0)
+cmu_phones = [vowel + stress for vowel in sorted(ARPABET_VOWELS) for stress in ('0', '1', '2')] + sorted(ARPABET_CONSONANTS)
+phones1 = [cmu_phones[i] for i in rng.randint(len(cmu_phones), size=N_PAIRS)]
+phones2 = [cmu_phones[i] for i in rng.randint(len(cmu_phones), size=N_PAIRS)]
+phone_pairs = zip(phones1, phones2)
+
+# Sanity-check that the lookup tables agree with the rules before timing them
+assert all(get_phone_distance_by_rule(p1, p2) == Pun.get_phone_distance(p1, p2) for (p1, p2) in phone_pairs)
+
+def run_rules():
+    return [get_phone_distance_by_rule(p1, p2) for (p1, p2) in phone_pairs]
+
+def run_table():
+    return [Pun.get_phone_distance(p1, p2) for (p1, p2) in phone_pairs]
+
+rule_seconds = timeit(run_rules, number=3) / 3
+table_seconds = timeit(run_table, number=3) / 3
+print 'get_phone_distance, {} pairs:'.format(N_PAIRS)
+print '  string rules: {:.3f} seconds ({:.0f} ns/pair)'.format(rule_seconds, 1e9*rule_seconds/N_PAIRS)
+print '  lookup table: {:.3f} seconds ({:.0f} ns/pair)'.format(table_seconds, 1e9*table_seconds/N_PAIRS)
+print '  speedup: {:.1f}x'.format(rule_seconds / table_seconds)
+
+# Phoneme-level distances over overlaps of OVERLAP_LEN phones
+n_phonemes = N_PAIRS // OVERLAP_LEN
+phonemes1 = [phones1[i*OVERLAP_LEN:(i+1)*OVERLAP_LEN] for i in range(n_phonemes)]
+phonemes2 = [phones2[i*OVERLAP_LEN:(i+1)*OVERLAP_LEN] for i in range(n_phonemes)]
+phone_ids1 = np.array([[PHONE_IDS[phone] for phone in phoneme] for phoneme in phonemes1])
+phone_ids2 = np.array([[PHONE_IDS[phone] for phone in phoneme] for phoneme in phonemes2])
+
+def run_phoneme_rules():
+    return [sum([get_phone_distance_by_rule(p1, p2) for (p1, p2) in zip(phoneme1, phoneme2)]) for (phoneme1, phoneme2) in zip(phonemes1, phonemes2)]
+
+def run_phoneme_table():
+    return [Pun.get_phoneme_distance(phoneme1, phoneme2) for (phoneme1, phoneme2) in zip(phonemes1, phonemes2)]
+
+def run_phoneme_batched():
+    return Pun.get_phoneme_distance_many(phone_ids1, phone_ids2)
+
+assert run_phoneme_rules() == list(run_phoneme_batched())
+
+rule_seconds = timeit(run_phoneme_rules, number=3) / 3
+table_seconds = timeit(run_phoneme_table, number=3) / 3
+batched_seconds = timeit(run_phoneme_batched, number=3) / 3
+print 'get_phoneme_distance, {} phonemes of length {}:'.format(n_phonemes, OVERLAP_LEN)
+print '  string rules: {:.3f} seconds'.format(rule_seconds)
+print '  lookup table: {:.3f} seconds ({:.1f}x)'.format(table_seconds, rule_seconds / table_seconds)
+print '  batched (get_phoneme_distance_many): {:.4f} seconds ({:.0f}x)'.format(batched_seconds, rule_seconds / batched_seconds)
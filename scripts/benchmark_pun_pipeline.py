@@ -0,0 +1,263 @@
+# Benchmark of the pun generation pipeline over a fixed corpus of input pairs
+# Script is called from the top-level entendrepreneur-web directory as:
+# > python scripts/benchmark_pun_pipeline.py --stand-in --save-baseline benchmark_baseline.json
+# > python scripts/benchmark_pun_pipeline.py --stand-in --baseline benchmark_baseline.json
+# Without --stand-in, the benchmark runs against the database/neighbor store configured for the app
+
+import os
+import sys
+sys.path.insert(0, '.') # need to add the top-level directory for the 'app' imports to work
+sys.path.insert(0, 'scripts') # and the scripts directory for the table population imports
+import json
+import shutil
+import argparse
+import tempfile
+import zlib
+import numpy as np
+from time import time
+from collections import OrderedDict
+from app.global_constants import TEST_INPUT, MAX_PORTMANTEAUS, MAX_RHYMES
+
+# Fixed corpus of input pairs, so that timings are comparable between runs
+BENCHMARK_CORPUS = [
+    tuple(TEST_INPUT.split()),
+    ('rosemary', 'marriott'),
+    ('drunk', 'angry'),
+    ('cute', 'dog'),
+    ('literary', 'cage'),
+    ('cat', 'lover'),
+    ('space', 'cowboy'),
+    ('coffee', 'morning'),
+    ]
+
+STAGES = ['neighbors', 'portmanteaus', 'rhymes', 'results']
+PERCENTILES = [50, 95, 99]
+
+# Number of neighbors given to each corpus word by the stand-in neighbor store
+STAND_IN_N_NEIGHBORS = 100
+
+
+def install_stand_in_tables():
+    '''
+    Install in-process stand-ins for the words and subgrapheme/subphoneme frequency tables, built from data/g2p_alignment
+    and the CMU dictionary in the same way as populate_tables builds the tables, and return the lexicon
+    '''
+    from app import app
+    from app.lexicon import Lexicon, set_lexicon
+    from app.frequency_store import FrequencyStore
+    from app.models import SubgraphemeFrequency, SubphonemeFrequency
+    from populate_word_table import ALIGN_PATH, cmu_dict
+    from populate_subgrapheme_frequency_table import iter_subgrapheme_frequency_rows
+    from populate_subphoneme_frequency_table import iter_subphoneme_frequency_rows
+
+    # Nothing is read from the database, but e.g. the pair pool's workers still drop their connections, which needs an engine
+    if not app.config.get('SQLALCHEMY_DATABASE_URI'):
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    lexicon = Lexicon.from_align_file(ALIGN_PATH, cmu_dict)
+    set_lexicon(lexicon)
+    SubgraphemeFrequency._frequency_store = FrequencyStore.from_rows(
+        (row['grapheme'], row['frequency'], row['frequency_head'], row['frequency_tail']) for row in iter_subgrapheme_frequency_rows())
+    SubphonemeFrequency._frequency_store = FrequencyStore.from_rows(
+        (row['phoneme'], row['frequency'], row['frequency_head'], row['frequency_tail']) for row in iter_subphoneme_frequency_rows())
+    return lexicon
+
+def get_plain_graphemes(lexicon):
+    '''
+    Return the plain lower-case words of the lexicon, in sorted order
+    '''
+    return sorted(grapheme for grapheme in lexicon.grapheme_index if grapheme.isalpha() and grapheme.islower())
+
+def build_stand_in(store_path):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Install an in-process stand-in for the database, see install_stand_in_tables, so that the benchmark needs neither
+    Postgres nor the word vectors
+
+    The words and subgrapheme/subphoneme frequencies are the real ones. The word vectors are not part of the repo,
+    so each corpus word instead gets STAND_IN_N_NEIGHBORS neighbors sampled from the lexicon, seeded by the word
+    so that every run sees the same neighbors. These have the size and phonetic variety of real neighbor lists,
+    which is what the pipeline's latency depends on, but of course not their meaning
+
+    ----------
+    # INPUTS #
+    ----------
+    store_path, String : directory to write the stand-in neighbor store to
+    '''
+    from app.neighbor_store import NeighborStore, write_neighbor_store, write_semantic_neighbors, set_neighbor_store
+
+    lexicon = install_stand_in_tables()
+    # Only plain lower-case words are sampled, as the reduced neighbor lists of real words would be
+    candidates = get_plain_graphemes(lexicon)
+    corpus_graphemes = sorted(set(grapheme for pair in BENCHMARK_CORPUS for grapheme in pair))
+    graphemes = sorted(set(corpus_graphemes + candidates))
+    grapheme_ids = dict((grapheme, idx) for idx, grapheme in enumerate(graphemes))
+    neighbor_lists = [[] for _ in graphemes]
+    for grapheme in corpus_graphemes:
+        rng = np.random.RandomState(zlib.crc32(grapheme) & 0xffffffff)
+        sample = rng.choice(len(candidates), size=STAND_IN_N_NEIGHBORS-1, replace=False)
+        neighbor_lists[grapheme_ids[grapheme]] = [grapheme] + [candidates[idx] for idx in sorted(sample)]
+
+    offsets = np.concatenate([[0], np.cumsum(map(len, neighbor_lists))])
+    neighbor_ids = np.array([grapheme_ids[neighbor] for neighbors in neighbor_lists for neighbor in neighbors], dtype=np.int32)
+    write_neighbor_store(store_path, graphemes, offsets, neighbor_ids)
+    # The store's vocab is sorted, as is graphemes, so the neighbor lists are already in vocab order
+    write_semantic_neighbors(store_path, [sorted(set(neighbors)) for neighbors in neighbor_lists])
+    set_neighbor_store(NeighborStore(store_path))
+
+def clear_caches():
+    '''
+    Empty the in-process caches, so that every timed call does the full amount of work
+    '''
+    from app.routes import result_cache
+    from app.helper_utils import _semantic_neighbor_cache, _canonical_grapheme_cache
+    for cache in (result_cache, _semantic_neighbor_cache, _canonical_grapheme_cache):
+        if cache is not None:
+            cache.clear()
+
+def run_benchmark(corpus, repeat=5):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Time each stage of the pipeline on every pair of the corpus, repeat times over, after one untimed warm-up pass
+    The caches are emptied before every call, so that each timing is that of a first request for the pair
+
+    ----------
+    # INPUTS #
+    ----------
+    corpus, List[Tuple] : (word1, word2) input pairs
+    repeat, Int : number of timed passes over the corpus
+
+    -----------
+    # OUTPUTS #
+    -----------
+    timings, OrderedDict[String,List[Float]] : seconds taken by every call, for each stage
+    '''
+    from app import app
+    from app.helper_utils import get_semantic_neighbor_graphemes, get_portmanteaus, get_rhymes
+    from app.pair_pool import get_pair_engine
+    from app.routes import get_nearest_words
+
+    # The results page renders a form, whose CSRF token needs a secret key
+    if not app.config.get('SECRET_KEY'):
+        app.config['SECRET_KEY'] = os.urandom(24)
+    client = app.test_client()
+
+    timings = OrderedDict((stage, []) for stage in STAGES)
+    for pass_idx in range(repeat+1):
+        for word1, word2 in corpus:
+            clear_caches()
+            start = time()
+            get_semantic_neighbor_graphemes(word1)
+            get_semantic_neighbor_graphemes(word2)
+            neighbors_seconds = time() - start
+
+            nearest_words1, nearest_words2 = get_nearest_words(word1, word2)
+            engine = get_pair_engine(len(nearest_words1)*len(nearest_words2))
+            start = time()
+            get_portmanteaus(nearest_words1, nearest_words2, engine=engine, k=MAX_PORTMANTEAUS)
+            portmanteaus_seconds = time() - start
+
+            start = time()
+            get_rhymes(nearest_words1, nearest_words2, engine=engine, k=MAX_RHYMES)
+            rhymes_seconds = time() - start
+
+            clear_caches()
+            start = time()
+            response = client.get('/pun_generator/{}+{}'.format(word1, word2), base_url='https://localhost')
+            results_seconds = time() - start
+            if response.status_code != 200:
+                raise RuntimeError('Results page for \'{} {}\' returned status {}'.format(word1, word2, response.status_code))
+
+            # The first pass only warms up the lexicon, frequency tables, etc.
+            if pass_idx > 0:
+                for stage, seconds in zip(STAGES, [neighbors_seconds, portmanteaus_seconds, rhymes_seconds, results_seconds]):
+                    timings[stage].append(seconds)
+    return timings
+
+def summarize_timings(timings):
+    '''
+    Reduce the timings of each stage to its number of calls, and its mean and percentile latencies in milliseconds
+    '''
+    summary = OrderedDict()
+    for stage, seconds in timings.items():
+        milliseconds = 1000*np.array(seconds)
+        stage_summary = OrderedDict([('calls', len(seconds)), ('mean', float(milliseconds.mean()))])
+        for percentile in PERCENTILES:
+            stage_summary['p{}'.format(percentile)] = float(np.percentile(milliseconds, percentile))
+        summary[stage] = stage_summary
+    return summary
+
+def print_summary(summary, baseline=None):
+    '''
+    Print the latencies of each stage, along with their ratio to the baseline's if there is one
+    '''
+    columns = ['mean'] + ['p{}'.format(percentile) for percentile in PERCENTILES]
+    print '{:<14}{:>7}'.format('stage', 'calls') + ''.join('{:>18}'.format(column+' (ms)') for column in columns)
+    for stage, stage_summary in summary.items():
+        line = '{:<14}{:>7}'.format(stage, stage_summary['calls'])
+        for column in columns:
+            if baseline is not None and stage in baseline:
+                line += '{:>18}'.format('{:.1f} ({:.2f}x)'.format(stage_summary[column], stage_summary[column] / baseline[stage][column]))
+            else:
+                line += '{:>18.1f}'.format(stage_summary[column])
+        print line
+
+def find_regressions(summary, baseline, tolerance=0.2):
+    '''
+    Return the (stage, statistic) pairs whose p50 or p95 latency is more than a 'tolerance' fraction above the baseline's
+    p99 is reported but not checked, since over a small corpus it is little more than the single slowest call
+    '''
+    regressions = []
+    for stage, stage_summary in summary.items():
+        if stage not in baseline:
+            continue
+        for column in ('p50', 'p95'):
+            if stage_summary[column] > (1+tolerance)*baseline[stage][column]:
+                regressions.append((stage, column))
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--stand-in', action='store_true', help='run against an in-process stand-in built from data/g2p_alignment, rather than the configured database')
+    parser.add_argument('--repeat', type=int, default=5, help='number of timed passes over the corpus')
+    parser.add_argument('--baseline', default=None, help='JSON file of a previous run to compare against')
+    parser.add_argument('--save-baseline', default=None, help='JSON file to save this run to, for later comparison')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='fractional slowdown of p50/p95 over the baseline reported as a regression')
+    args = parser.parse_args()
+
+    store_path = None
+    if args.stand_in:
+        start = time()
+        store_path = tempfile.mkdtemp(prefix='benchmark_neighbor_store_')
+        build_stand_in(store_path)
+        print 'Finished building the stand-in database: {:.0f} seconds'.format(time()-start)
+
+    try:
+        start = time()
+        timings = run_benchmark(BENCHMARK_CORPUS, repeat=args.repeat)
+        print 'Finished benchmarking {} pairs x {} passes: {:.0f} seconds'.format(len(BENCHMARK_CORPUS), args.repeat, time()-start)
+    finally:
+        if store_path is not None:
+            shutil.rmtree(store_path)
+
+    summary = summarize_timings(timings)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['stages']
+    print_summary(summary, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w') as f:
+            json.dump({'stand_in': args.stand_in, 'corpus': BENCHMARK_CORPUS, 'repeat': args.repeat, 'stages': summary}, f, indent=2)
+
+    if baseline is not None:
+        regressions = find_regressions(summary, baseline, tolerance=args.tolerance)
+        for stage, column in regressions:
+            print 'REGRESSION: {} {} is {:.1f} ms, vs {:.1f} ms in the baseline'.format(stage, column, summary[stage][column], baseline[stage][column])
+        if regressions:
+            sys.exit(1)
@@ -0,0 +1,15 @@
+from app.data_bundle import write_data_bundle
+from populate_word_table import iter_word_rows
+from populate_subgrapheme_frequency_table import iter_subgrapheme_frequency_rows
+from populate_subphoneme_frequency_table import iter_subphoneme_frequency_rows
+from populate_fasttext_neighbor_table import iter_fasttext_neighbor_rows, NEIGHBOR_STORE_PATH
+
+def build_data_bundle_file(bundle_path, store_path=NEIGHBOR_STORE_PATH):
+    '''
+    Build the local data bundle from the same rows that populate_tables loads into Postgres, see app.data_bundle
+    '''
+    return write_data_bundle(bundle_path,
+                             iter_word_rows(),
+                             iter_subgrapheme_frequency_rows(),
+                             iter_subphoneme_frequency_rows(),
+                             iter_fasttext_neighbor_rows(store_path))
@@ -0,0 +1,54 @@
+# Build the approximate nearest-neighbor index used to compute semantic neighbors at request time
+# Script is called from the top-level entendrepreneur-web directory as:
+# > python scripts/build_neighbor_index.py --limit 1000000
+# and the app is pointed at the result with the NEIGHBOR_INDEX_PATH environment variable
+
+import argparse
+import numpy as np
+import sys
+sys.path.insert(0, '.') # need to add the top-level directory for the 'app' imports to work
+from time import time
+from app.global_constants import REPO_HOME
+from app.neighbor_index import NeighborIndex, build_neighbor_index, DEFAULT_N_NEIGHBORS, DEFAULT_MIN_SIMILARITY
+from all_but_the_top import load_post_processed_vec_file
+
+def evaluate_recall(neighbor_index, vectors, graphemes, n_queries=200, n=DEFAULT_N_NEIGHBORS, s=DEFAULT_MIN_SIMILARITY, seed=0):
+    '''
+    Fraction of the exact (brute-force) neighbors which are also returned by the index, averaged over random query words
+    '''
+    rng = np.random.RandomState(seed)
+    hits, total, seconds = 0, 0, 0.
+    for idx in rng.choice(len(graphemes), size=min(n_queries, len(graphemes)), replace=False):
+        sims = vectors.dot(vectors[idx])
+        exact = set(graphemes[i] for i in np.argsort(-sims)[:n+1] if sims[i] >= s)
+        start = time()
+        approx = set(neighbor_index.query(graphemes[idx], n=n, s=s))
+        seconds += time() - start
+        hits += len(exact & approx)
+        total += len(exact)
+    return 1.0 * hits / max(total, 1), seconds / min(n_queries, len(graphemes))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vectors', default=REPO_HOME+'data/word_vectors/wiki-news-300d-1M.vec', help='FastText .vec file')
+    parser.add_argument('--limit', type=int, default=1000000, help='number of word vectors to index, most frequent first (0 for all of them)')
+    parser.add_argument('--output', default=REPO_HOME+'data/word_vectors/neighbor_index', help='directory to write the index to')
+    parser.add_argument('--n-lists', type=int, default=1024, help='number of inverted lists')
+    parser.add_argument('--n-probe', type=int, default=32, help='default number of lists searched per query')
+    parser.add_argument('--eval-queries', type=int, default=200, help='number of queries used to estimate recall against brute force')
+    args = parser.parse_args()
+
+    start = time()
+    # Run the same post-processing as for the precomputed neighbors, so that both give the same similarities
+    graphemes, vectors = load_post_processed_vec_file(args.vectors, limit=args.limit or None)
+    print 'Finished loading and post-processing word vectors: {:.0f} seconds'.format(time()-start)
+
+    start = time()
+    build_neighbor_index(vectors, graphemes, args.output, n_lists=args.n_lists, n_probe=args.n_probe)
+    print 'Finished building the neighbor index: {:.0f} seconds'.format(time()-start)
+
+    if args.eval_queries:
+        neighbor_index = NeighborIndex(args.output)
+        graphemes = [grapheme.encode('utf-8') for grapheme in graphemes]
+        recall, seconds_per_query = evaluate_recall(neighbor_index, vectors, graphemes, n_queries=args.eval_queries)
+        print 'Recall@{} vs brute force: {:.3f}, {:.1f} ms/query'.format(DEFAULT_N_NEIGHBORS, recall, 1000*seconds_per_query)
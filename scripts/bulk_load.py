@@ -0,0 +1,210 @@
+import csv
+import json
+from cStringIO import StringIO
+from itertools import islice
+from time import time
+from multiprocessing import Pool, cpu_count
+from sqlalchemy import text
+from sqlalchemy.types import ARRAY, JSON, Boolean
+
+# Number of rows formatted/inserted at a time; memory use is bounded by a single batch regardless of the table size
+BATCH_SIZE = 10000
+
+# Marker for NULL values in the COPY stream, so that NULLs can be told apart from empty strings
+COPY_NULL = '\\N'
+
+def iter_batches(rows, batch_size=BATCH_SIZE):
+    rows = iter(rows)
+    while True:
+        batch = list(islice(rows, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def encode_text(value):
+    return value.encode('utf-8') if isinstance(value, unicode) else str(value)
+
+def format_array(values):
+    '''
+    Format a (possibly nested) list as a Postgres array literal, e.g. ['AH0', 'B'] -> {"AH0","B"}
+    '''
+    elements = []
+    for value in values:
+        if value is None:
+            elements.append('NULL')
+        elif isinstance(value, (list, tuple)):
+            elements.append(format_array(value))
+        else:
+            elements.append('"' + encode_text(value).replace('\\', '\\\\').replace('"', '\\"') + '"')
+    return '{' + ','.join(elements) + '}'
+
+def format_copy_value(value, column_type):
+    '''
+    Format a single value in the text representation that COPY ... (FORMAT csv) expects for its column type
+    '''
+    if value is None:
+        return COPY_NULL
+    if isinstance(column_type, ARRAY):
+        return format_array(value)
+    if isinstance(column_type, JSON):
+        return json.dumps(value)
+    if isinstance(column_type, Boolean):
+        return 't' if value else 'f'
+    return encode_text(value)
+
+class CopyStream(object):
+    '''
+    Read-only file-like object over an iterator of strings, so that COPY can consume rows as they are generated
+    '''
+
+    def __init__(self, chunks):
+        self.chunks = iter(chunks)
+        self.chunk = ''
+        # Position of the first unread character of the current chunk, which is never copied, only sliced from
+        self.offset = 0
+
+    def read(self, size=-1):
+        pieces, n_read = [], 0
+        while size < 0 or n_read < size:
+            if self.offset >= len(self.chunk):
+                self.chunk, self.offset = next(self.chunks, None), 0
+                if self.chunk is None:
+                    self.chunk = ''
+                    break
+                continue
+            n_take = len(self.chunk) - self.offset if size < 0 else min(size - n_read, len(self.chunk) - self.offset)
+            pieces.append(self.chunk[self.offset:self.offset+n_take])
+            self.offset += n_take
+            n_read += n_take
+        return ''.join(pieces)
+
+    def readline(self, size=-1):
+        # Rows are always requested through read(), but the DBAPI may probe for readline
+        return self.read(size)
+
+def iter_copy_chunks(rows, columns, batch_size=BATCH_SIZE):
+    '''
+    Yield the rows formatted as CSV, one batch of rows per string
+    '''
+    for batch in iter_batches(rows, batch_size):
+        buf = StringIO()
+        writer = csv.writer(buf, lineterminator='\n')
+        for row in batch:
+            writer.writerow([format_copy_value(row.get(column.name), column.type) for column in columns])
+        yield buf.getvalue()
+
+def copy_rows(connection, table, rows, batch_size=BATCH_SIZE):
+    '''
+    Stream the rows into the table through a single Postgres COPY, over the connection's current transaction
+    '''
+    columns = [column for column in table.columns if not column.primary_key]
+    sql = "COPY {} ({}) FROM STDIN WITH (FORMAT csv, NULL '{}')".format(
+        table.name, ', '.join(column.name for column in columns), COPY_NULL)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(sql, CopyStream(iter_copy_chunks(rows, columns, batch_size)))
+    finally:
+        cursor.close()
+
+def insert_rows(connection, table, rows, batch_size=BATCH_SIZE):
+    '''
+    Fallback for databases without COPY: insert the rows with one Core executemany per batch
+    '''
+    for batch in iter_batches(rows, batch_size):
+        connection.execute(table.insert(), batch)
+
+def bulk_load(table, rows, engine, batch_size=BATCH_SIZE):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Replace the contents of the table with the rows, in a single transaction
+
+    The table's secondary indexes are dropped before the load and rebuilt afterwards, since building an index once
+    over the full table is much cheaper than updating it row by row. Rows are streamed through COPY on Postgres,
+    and inserted with batched executemany calls on other databases, so no ORM objects are ever created
+
+    ----------
+    # INPUTS #
+    ----------
+    table, Table : the table to load, i.e. Model.__table__
+    rows, Iterable[Dict] : one dict per row, mapping column names to values (the primary key is generated)
+    engine, Engine : the database to load into
+
+    -----------
+    # OUTPUTS #
+    -----------
+    n_rows, Int : number of rows loaded
+    '''
+    counts = {'rows': 0}
+    def count_rows(rows):
+        for row in rows:
+            counts['rows'] += 1
+            yield row
+
+    is_postgres = engine.dialect.name == 'postgresql'
+    with engine.begin() as connection:
+        for index in table.indexes:
+            connection.execute(text('DROP INDEX IF EXISTS {}'.format(index.name)))
+        if is_postgres:
+            connection.execute(text('TRUNCATE TABLE {} RESTART IDENTITY'.format(table.name)))
+            copy_rows(connection, table, count_rows(rows), batch_size)
+        else:
+            connection.execute(table.delete())
+            insert_rows(connection, table, count_rows(rows), batch_size)
+        for index in table.indexes:
+            index.create(connection)
+    if is_postgres:
+        with engine.connect() as connection:
+            connection.execute(text('ANALYZE {}'.format(table.name)))
+    return counts['rows']
+
+# Loaders shared with the worker processes, see init_worker
+_worker_state = {}
+
+def init_worker(db, loaders):
+    '''
+    Forked workers must not share the parent's database connections, so drop them and let each worker open its own
+    '''
+    db.engine.dispose()
+    _worker_state['db'] = db
+    _worker_state['loaders'] = loaders
+
+def run_loader(name):
+    start = time()
+    populate, Model = _worker_state['loaders'][name]
+    populate(Model, _worker_state['db'])
+    return name, time() - start
+
+def run_loaders(loaders, db, processes=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Run the table loaders concurrently, one per worker process, since building the rows is CPU-bound
+
+    ----------
+    # INPUTS #
+    ----------
+    loaders, OrderedDict[String,Tuple] : maps table names to their (populate_function, Model), called as populate_function(Model, db)
+    processes, Int : maximum number of worker processes (defaults to one per loader, up to the number of CPUs)
+    '''
+    processes = min(processes or cpu_count(), len(loaders))
+    if processes <= 1:
+        init_worker(db, loaders)
+        for name in loaders:
+            print 'Finished populating {} table after {:.0f} seconds'.format(*run_loader(name))
+        return
+
+    db.session.remove()
+    db.engine.dispose()
+    pool = Pool(processes, initializer=init_worker, initargs=(db, loaders))
+    try:
+        for name, seconds in pool.imap_unordered(run_loader, list(loaders)):
+            print 'Finished populating {} table after {:.0f} seconds'.format(name, seconds)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
@@ -0,0 +1,143 @@
+import numpy as np
+from multiprocessing import Pool, cpu_count
+
+def encode_sequences(sequences):
+    '''
+    Encode the sequences (strings, or tuples of phones) as one concatenated array of symbol ids, numbered from 1
+    so that no n-gram code has a leading zero, along with the offset at which each sequence starts
+    '''
+    symbols = sorted(set(symbol for sequence in sequences for symbol in sequence))
+    symbol_ids = dict((symbol, idx+1) for idx, symbol in enumerate(symbols))
+    lengths = np.array(map(len, sequences), dtype=np.int64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    encoded = np.fromiter((symbol_ids[symbol] for sequence in sequences for symbol in sequence), dtype=np.int64, count=offsets[-1])
+    return symbols, encoded, offsets
+
+def count_encoded_ngrams(args):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Count the n-grams of length 1..max_n of the encoded sequences, in one vectorized pass per n-gram length
+
+    Each n-gram is coded exactly as the base-'base' number whose digits are its symbol ids, which is extended by one
+    symbol per pass (code = code*base + next_symbol), i.e. a collision-free rolling hash. Since symbol ids start at 1,
+    n-grams of different lengths always get different codes
+
+    ----------
+    # INPUTS #
+    ----------
+    encoded, Array[Int] : concatenated symbol ids, see encode_sequences
+    offsets, Array[Int] : sequence i is encoded[offsets[i]:offsets[i+1]]
+    base, Int : one more than the largest symbol id
+    max_n, Int : longest n-gram counted
+
+    -----------
+    # OUTPUTS #
+    -----------
+    codes, Array[Int] : sorted distinct n-gram codes
+    counts, Array[Int] : (n_codes x 3) number of occurrences of each n-gram anywhere, at the head, and at the tail of a sequence
+    '''
+    encoded, offsets, base, max_n = args
+    lengths = np.diff(offsets)
+    position_starts = np.repeat(offsets[:-1], lengths)
+    position_ends = np.repeat(offsets[1:], lengths)
+    positions = np.arange(len(encoded))
+
+    all_codes, all_heads, all_tails = [], [], []
+    codes = np.zeros(len(encoded), dtype=np.int64)
+    for n in range(1, max_n+1):
+        # Extend the n-gram starting at every position by one symbol, dropping those which would run off their sequence
+        valid = positions + n <= position_ends
+        if not valid.any():
+            break
+        positions, position_starts, position_ends, codes = positions[valid], position_starts[valid], position_ends[valid], codes[valid]
+        codes = codes*base + encoded[positions+n-1]
+        all_codes.append(codes)
+        all_heads.append(positions == position_starts)
+        all_tails.append(positions + n == position_ends)
+
+    if not all_codes:
+        return np.zeros(0, dtype=np.int64), np.zeros((0, 3), dtype=np.int64)
+    unique_codes, inverse = np.unique(np.concatenate(all_codes), return_inverse=True)
+    counts = np.column_stack([np.bincount(inverse, minlength=len(unique_codes)),
+                              np.bincount(inverse, weights=np.concatenate(all_heads), minlength=len(unique_codes)),
+                              np.bincount(inverse, weights=np.concatenate(all_tails), minlength=len(unique_codes))]).astype(np.int64)
+    return unique_codes, counts
+
+def merge_counts(shard_counts):
+    '''
+    Sum the (codes, counts) of several shards
+    '''
+    codes = np.concatenate([shard_codes for shard_codes, _ in shard_counts])
+    counts = np.concatenate([counts for _, counts in shard_counts])
+    unique_codes, inverse = np.unique(codes, return_inverse=True)
+    merged = np.zeros((len(unique_codes), 3), dtype=np.int64)
+    np.add.at(merged, inverse, counts)
+    return unique_codes, merged
+
+def decode_ngrams(codes, symbols, base):
+    '''
+    Return the n-gram (as a tuple of symbols) coded by each code, decoding all the n-grams of each length at once
+    '''
+    symbols = np.array([None] + list(symbols), dtype=object)
+    lengths = np.zeros(len(codes), dtype=np.int64)
+    remaining = codes.copy()
+    while remaining.any():
+        lengths += remaining > 0
+        remaining //= base
+
+    ngrams = np.empty(len(codes), dtype=object)
+    for n in np.unique(lengths):
+        inds = np.where(lengths == n)[0]
+        digits = (codes[inds, np.newaxis] // base**np.arange(n-1, -1, -1)) % base
+        ngrams[inds] = map(tuple, symbols[digits].tolist())
+    return ngrams.tolist()
+
+def count_ngrams(sequences, max_n=5, processes=1, n_shards=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Count every n-gram of length 1..max_n in the sequences, overall and at the head and tail of a sequence
+    Sequences are split into shards which are counted in parallel and then merged, if processes > 1
+
+    As in the subgrapheme/subphoneme frequency tables, every count is smoothed by 1, to avoid probability
+    singularities, so an n-gram which never occurs at the head of a sequence has a head count of 1
+
+    ----------
+    # INPUTS #
+    ----------
+    sequences, List[Sequence] : e.g. graphemes, or tuples of phones
+    max_n, Int : longest n-gram counted
+    processes, Int : number of worker processes (None for the number of CPUs)
+
+    -----------
+    # OUTPUTS #
+    -----------
+    ngram_counts, List[Tuple] : (ngram, frequency, frequency_head, frequency_tail) for every n-gram, ngrams being tuples of symbols
+    '''
+    sequences = list(sequences)
+    symbols, encoded, offsets = encode_sequences(sequences)
+    base = len(symbols) + 1
+    if base**max_n >= 2**63:
+        raise ValueError('{}-grams over {} symbols do not fit in 64-bit codes'.format(max_n, len(symbols)))
+
+    processes = processes or cpu_count()
+    n_shards = n_shards or processes
+    shard_bounds = np.linspace(0, len(sequences), n_shards+1).astype(np.int64)
+    shards = [(encoded[offsets[start]:offsets[end]], offsets[start:end+1] - offsets[start], base, max_n)
+              for start, end in zip(shard_bounds[:-1], shard_bounds[1:])]
+    if processes > 1 and len(shards) > 1:
+        pool = Pool(min(processes, len(shards)))
+        try:
+            shard_counts = pool.map(count_encoded_ngrams, shards)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        shard_counts = map(count_encoded_ngrams, shards)
+
+    codes, counts = merge_counts(shard_counts)
+    counts += 1
+    return zip(decode_ngrams(codes, symbols, base), counts[:, 0].tolist(), counts[:, 1].tolist(), counts[:, 2].tolist())
@@ -0,0 +1,124 @@
+import sys
+import json
+from time import time
+from itertools import islice
+from multiprocessing import Pool, cpu_count
+from app.lexicon import get_lexicon
+from app.helper_utils import get_canonical_grapheme
+
+# Number of pairs between progress reports
+REPORT_EVERY = 1000
+
+def iter_word_pairs(input_file):
+    '''
+    Yield (word1, word2) pairs from a file with one pair per line, separated by whitespace, a tab, or a comma
+    Blank lines and lines starting with '#' are skipped, malformed lines are reported on stderr and skipped
+    '''
+    for line_num, line in enumerate(input_file, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        words = line.replace(',', ' ').split()
+        if len(words) != 2:
+            print >> sys.stderr, 'Skipping line {}, expected two words: {!r}'.format(line_num, line)
+            continue
+        yield words[0], words[1]
+
+def init_worker(db, SubgraphemeFrequency, SubphonemeFrequency):
+    '''
+    Runs once in each worker process
+    Forked workers must not share the parent's database connections, so drop them and let each worker open its own
+    The lexicon and frequency tables are loaded by the parent before forking, so these calls are no-ops unless
+    the platform spawns rather than forks its workers
+    '''
+    db.engine.dispose()
+    get_lexicon()
+    SubgraphemeFrequency.get_frequency_store()
+    SubphonemeFrequency.get_frequency_store()
+
+def generate_pair_puns(word_pair):
+    '''
+    Generate the puns for a single pair, returning a JSON-serializable record
+    Errors are returned rather than raised, so that one bad pair does not bring down the batch
+    '''
+    word1, word2 = word_pair
+    record = {'word1': word1, 'word2': word2}
+    try:
+        # Imported here rather than at the top, since importing the routes registers them with the app
+        # The first import in each worker also builds the result cache and input logger, which may fail like anything else
+        from app.routes import get_puns_from_words
+        if get_canonical_grapheme(word1) is None or get_canonical_grapheme(word2) is None:
+            record['error'] = 'Word not recognized'
+        else:
+            record.update(get_puns_from_words(word1, word2))
+    except Exception as e:
+        record['error'] = '{}: {}'.format(type(e).__name__, e)
+    return record
+
+def generate_batch_puns(input_file, output_file, db, SubgraphemeFrequency, SubphonemeFrequency, processes=None, max_pending=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Generate the portmanteaus and rhymes for every word pair read from input_file across a pool of worker processes,
+    writing one JSON record per pair to output_file as soon as it is finished (so records are not in input order)
+
+    Pairs are read lazily, max_pending at a time, and each chunk is spread across the pool with imap_unordered
+    before the next one is read, so memory use is bounded regardless of the size of the input
+
+    ----------
+    # INPUTS #
+    ----------
+    input_file, File : word pairs, see iter_word_pairs
+    output_file, File : destination of the JSON lines
+    processes, Int : number of worker processes (defaults to the number of CPUs)
+    max_pending, Int : number of pairs read and submitted at a time (defaults to 8 per worker)
+
+    -----------
+    # OUTPUTS #
+    -----------
+    n_pairs, Int : number of pairs processed
+    n_errors, Int : number of pairs which failed, i.e. whose records contain an 'error' field
+    '''
+    processes = processes or cpu_count()
+    max_pending = max_pending or 8*processes
+
+    # Load the read-only tables once in the parent, so that forked workers share them
+    get_lexicon()
+    SubgraphemeFrequency.get_frequency_store()
+    SubphonemeFrequency.get_frequency_store()
+    db.session.remove()
+    db.engine.dispose()
+
+    counts = {'pairs': 0, 'errors': 0}
+    start = time()
+
+    def write_record(record):
+        output_file.write(json.dumps(record) + '\n')
+        counts['pairs'] += 1
+        counts['errors'] += 'error' in record
+        if counts['pairs'] % REPORT_EVERY == 0:
+            output_file.flush()
+            print >> sys.stderr, '{} pairs, {:.1f} pairs/sec'.format(counts['pairs'], counts['pairs']/(time()-start))
+
+    word_pairs = iter_word_pairs(input_file)
+    pool = Pool(processes, initializer=init_worker, initargs=(db, SubgraphemeFrequency, SubphonemeFrequency))
+    try:
+        while True:
+            chunk = list(islice(word_pairs, max_pending))
+            if not chunk:
+                break
+            # Records are written from this thread, so a failed write (e.g. a closed pipe) stops the run rather than hanging it
+            for record in pool.imap_unordered(generate_pair_puns, chunk):
+                write_record(record)
+        pool.close()
+        pool.join()
+    except:
+        pool.terminate()
+        raise
+    output_file.flush()
+
+    elapsed = time() - start
+    print >> sys.stderr, 'Finished {} pairs ({} errors) after {:.0f} seconds, {:.1f} pairs/sec'.format(
+        counts['pairs'], counts['errors'], elapsed, counts['pairs']/max(elapsed, 1e-9))
+    return counts['pairs'], counts['errors']
@@ -0,0 +1,227 @@
+# Golden-output regression corpus for the pun engines
+# Records the top-k puns of the reference (scalar) engine for a few thousand word pairs drawn from the lexicon,
+# and checks any other engine against the recording. Script is called from the top-level entendrepreneur-web directory as:
+# > python scripts/golden_outputs.py record --stand-in
+# > python scripts/golden_outputs.py check --stand-in --engine vectorized
+# The fixture is regenerated by 'record' rather than committed, since it depends on the words/frequency tables it was recorded against
+
+import os
+import sys
+sys.path.insert(0, '.') # need to add the top-level directory for the 'app' imports to work
+sys.path.insert(0, 'scripts') # and the scripts directory for the table population imports
+import json
+import gzip
+import argparse
+import numpy as np
+from time import time
+from collections import defaultdict
+from app.global_constants import MAX_PORTMANTEAUS, MAX_RHYMES
+
+GOLDEN_OUTPUTS_PATH = 'data/golden/golden_outputs.jsonl.gz'
+
+# Engine which the fixture is recorded with, i.e. Portmanteau.get_pun/Rhyme.get_pun on every pair
+REFERENCE_ENGINE = 'scalar'
+PORTMANTEAU_ENGINES = ('scalar', 'vectorized', 'pruned', 'pool')
+RHYME_ENGINES = ('scalar', 'vectorized', 'pool')
+
+# Each group is a |words1| x |words2| grid of word pairs, as for the semantic neighbors of two inputs
+DEFAULT_N_GROUPS = 25
+DEFAULT_GROUP_SIZE = 12
+# Number of phones shared by the words of a group, see iter_word_groups
+AFFIX_LENGTH = 2
+
+
+def get_affix_index(lexicon, graphemes, n_phones=AFFIX_LENGTH):
+    '''
+    Return the graphemes grouped by the first n_phones phones (prefixes) and the last n_phones phones (suffixes) of their
+    phonemes, keyed by tuples of phone ids, for words of more than n_phones phones
+    '''
+    prefixes, suffixes = defaultdict(list), defaultdict(list)
+    for grapheme in graphemes:
+        idx = lexicon.grapheme_index[grapheme]
+        phone_ids = tuple(lexicon.phone_ids[lexicon.phone_offsets[idx]:lexicon.phone_offsets[idx+1]].tolist())
+        if len(phone_ids) > n_phones:
+            prefixes[phone_ids[:n_phones]].append(grapheme)
+            suffixes[phone_ids[-n_phones:]].append(grapheme)
+    return prefixes, suffixes
+
+def iter_word_groups(lexicon, graphemes, n_groups=DEFAULT_N_GROUPS, group_size=DEFAULT_GROUP_SIZE, seed=0):
+    '''
+    Yield n_groups (graphemes1, graphemes2) pairs of group_size graphemes each, sampled from the graphemes
+
+    Random pairs of words hardly ever make a pun, so each group is built around a random phone affix: words1 all end in it,
+    and words2 are half words ending in it (i.e. rhymes) and half words starting with it (i.e. portmanteaus)
+    '''
+    prefixes, suffixes = get_affix_index(lexicon, graphemes)
+    n_rhyming = group_size // 2
+    affixes = sorted(affix for affix in suffixes if len(suffixes[affix]) >= group_size + n_rhyming and len(prefixes[affix]) >= group_size - n_rhyming)
+    rng = np.random.RandomState(seed)
+    for _ in range(n_groups):
+        affix = affixes[rng.randint(len(affixes))]
+        sample = rng.choice(len(suffixes[affix]), size=group_size+n_rhyming, replace=False)
+        graphemes1 = [suffixes[affix][idx] for idx in sample[:group_size]]
+        graphemes2 = [suffixes[affix][idx] for idx in sample[group_size:]]
+        graphemes2 += [prefixes[affix][idx] for idx in rng.choice(len(prefixes[affix]), size=group_size-n_rhyming, replace=False)]
+        yield graphemes1, graphemes2
+
+def get_criterion(pun):
+    '''
+    Return the pun's ordering criterion in a JSON-friendly form, i.e. rhymes' tuples as lists
+    '''
+    criterion = pun.ordering_criterion()
+    return list(criterion) if isinstance(criterion, tuple) else criterion
+
+def get_group_outputs(graphemes1, graphemes2, engine=REFERENCE_ENGINE, k_portmanteaus=MAX_PORTMANTEAUS, k_rhymes=MAX_RHYMES):
+    '''
+    Return the serialized top-k portmanteaus and rhymes of the group, each as a [serialized_pun, ordering_criterion] pair, best first
+    Engines which only exist for portmanteaus (i.e. 'pruned') fall back to the vectorized engine for rhymes
+    '''
+    from app.lexicon import get_lexicon
+    from app.helper_utils import get_portmanteaus, get_rhymes
+    lexicon = get_lexicon()
+    words1, words2 = lexicon.get_words(graphemes1), lexicon.get_words(graphemes2)
+    portmanteaus = get_portmanteaus(words1, words2, engine=engine, k=k_portmanteaus)
+    rhymes = get_rhymes(words1, words2, engine=engine if engine in RHYME_ENGINES else 'vectorized', k=k_rhymes)
+    return {
+        'portmanteaus': [[portmanteau.serialize(), get_criterion(portmanteau)] for portmanteau in portmanteaus],
+        'rhymes': [[rhyme.serialize(), get_criterion(rhyme)] for rhyme in rhymes],
+        }
+
+def record_golden_outputs(output_path=GOLDEN_OUTPUTS_PATH, n_groups=DEFAULT_N_GROUPS, group_size=DEFAULT_GROUP_SIZE, seed=0):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Record the reference engine's outputs for n_groups groups of word pairs, as gzipped JSON lines: a header line
+    holding the parameters of the recording, followed by one line per group holding its words and outputs
+
+    ----------
+    # INPUTS #
+    ----------
+    output_path, String : fixture file to write
+    n_groups, Int : number of groups, each of group_size x group_size word pairs
+    seed, Int : seed of the sampling of the words, from the plain lower-case words of the lexicon, see iter_word_groups
+    '''
+    from app.lexicon import get_lexicon
+    from benchmark_pun_pipeline import get_plain_graphemes
+    lexicon = get_lexicon()
+    graphemes = get_plain_graphemes(lexicon)
+
+    header = {'engine': REFERENCE_ENGINE, 'n_groups': n_groups, 'group_size': group_size, 'seed': seed,
+              'k_portmanteaus': MAX_PORTMANTEAUS, 'k_rhymes': MAX_RHYMES, 'vocab_size': len(graphemes)}
+    start = time()
+    with gzip.open(output_path, 'wb') as f:
+        f.write(json.dumps(header) + '\n')
+        for group_idx, (graphemes1, graphemes2) in enumerate(iter_word_groups(lexicon, graphemes, n_groups, group_size, seed)):
+            group = {'words1': graphemes1, 'words2': graphemes2}
+            group.update(get_group_outputs(graphemes1, graphemes2))
+            f.write(json.dumps(group) + '\n')
+            if (group_idx+1) % 5 == 0:
+                print 'Finished recording group {} after {:.0f} seconds'.format(group_idx+1, time()-start)
+    print 'Recorded {} word pairs to {}'.format(n_groups*group_size*group_size, output_path)
+
+def iter_golden_outputs(fixture_path=GOLDEN_OUTPUTS_PATH):
+    '''
+    Yield the header of the fixture, followed by each of its groups
+    '''
+    with gzip.open(fixture_path, 'rb') as f:
+        for line in f:
+            yield json.loads(line)
+
+def is_close(criterion1, criterion2, rtol):
+    return np.allclose(criterion1, criterion2, rtol=rtol, atol=0.)
+
+def compare_puns(expected, actual, k, rtol=1e-9):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Compare an engine's [serialized_pun, ordering_criterion] list against the recorded one, returning a description
+    of every mismatch (an empty list if they agree)
+
+    Puns with tied ordering criteria may come out in any order, so the puns are compared as sets within each run of
+    tied criteria. When k puns were recorded, the last run of ties may have been cut off at the k'th place, and the
+    engines are then free to pick different puns from it, so only its criteria are compared
+
+    ----------
+    # INPUTS #
+    ----------
+    expected, List[List] : recorded [serialized_pun, ordering_criterion] pairs, best first
+    actual, List[List] : the engine's [serialized_pun, ordering_criterion] pairs, best first
+    k, Int : maximum number of puns the outputs were limited to
+    rtol, Float : relative tolerance of the ordering criterion comparisons
+    '''
+    mismatches = []
+    if len(expected) != len(actual):
+        mismatches.append('expected {} puns, got {}'.format(len(expected), len(actual)))
+
+    for rank, ((_, expected_criterion), (actual_pun, actual_criterion)) in enumerate(zip(expected, actual)):
+        if not is_close(expected_criterion, actual_criterion, rtol):
+            mismatches.append('rank {}: expected criterion {}, got {} for {} + {}'.format(
+                rank+1, expected_criterion, actual_criterion, actual_pun['grapheme1'], actual_pun['grapheme2']))
+            # Everything below this rank is shifted, so don't report it again
+            return mismatches
+
+    # Runs of tied (recorded) criteria
+    run_starts = [rank for rank in range(len(expected)) if rank == 0 or expected[rank][1] != expected[rank-1][1]]
+    for run_start, run_end in zip(run_starts, run_starts[1:] + [len(expected)]):
+        if run_end == k and len(expected) == k:
+            break
+        expected_puns = set(json.dumps(pun, sort_keys=True) for pun, _ in expected[run_start:run_end])
+        actual_puns = set(json.dumps(pun, sort_keys=True) for pun, _ in actual[run_start:run_end])
+        for pun in sorted(expected_puns - actual_puns):
+            mismatches.append('ranks {}-{}: missing {}'.format(run_start+1, run_end, pun))
+        for pun in sorted(actual_puns - expected_puns):
+            mismatches.append('ranks {}-{}: unexpected {}'.format(run_start+1, run_end, pun))
+    return mismatches
+
+def check_golden_outputs(engine, fixture_path=GOLDEN_OUTPUTS_PATH, rtol=1e-9, max_reported=10):
+    '''
+    Run the engine on every group of the fixture, and report the groups whose outputs differ from the recording
+    Returns the number of mismatching groups
+    '''
+    golden_outputs = iter_golden_outputs(fixture_path)
+    header = next(golden_outputs)
+    print 'Checking engine \'{}\' against {} groups recorded with engine \'{}\''.format(engine, header['n_groups'], header['engine'])
+
+    start = time()
+    n_groups, n_mismatched = 0, 0
+    for group in golden_outputs:
+        outputs = get_group_outputs(group['words1'], group['words2'], engine=engine,
+                                    k_portmanteaus=header['k_portmanteaus'], k_rhymes=header['k_rhymes'])
+        mismatches = []
+        for pun_type, k in [('portmanteaus', header['k_portmanteaus']), ('rhymes', header['k_rhymes'])]:
+            mismatches += ['{}, {}'.format(pun_type, mismatch) for mismatch in compare_puns(group[pun_type], outputs[pun_type], k, rtol=rtol)]
+        n_groups += 1
+        if mismatches:
+            n_mismatched += 1
+            if n_mismatched <= max_reported:
+                print 'MISMATCH in group {} ({} ... x {} ...):'.format(n_groups, ' '.join(group['words1'][:3]), ' '.join(group['words2'][:3]))
+                for mismatch in mismatches:
+                    print '  ' + mismatch
+    print '{} of {} groups mismatched, after {:.0f} seconds'.format(n_mismatched, n_groups, time()-start)
+    return n_mismatched
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('mode', choices=['record', 'check'], help='record the reference outputs, or check an engine against them')
+    parser.add_argument('--fixture', default=GOLDEN_OUTPUTS_PATH, help='gzipped JSON lines fixture file')
+    parser.add_argument('--engine', default='vectorized', choices=PORTMANTEAU_ENGINES, help='engine checked against the fixture')
+    parser.add_argument('--stand-in', action='store_true', help='use the words/frequency tables built from data/g2p_alignment, rather than the configured database')
+    parser.add_argument('--n-groups', type=int, default=DEFAULT_N_GROUPS, help='number of recorded groups of word pairs')
+    parser.add_argument('--group-size', type=int, default=DEFAULT_GROUP_SIZE, help='number of words on each side of a group')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the sampling of the recorded words')
+    parser.add_argument('--rtol', type=float, default=1e-9, help='relative tolerance of the ordering criterion comparisons')
+    args = parser.parse_args()
+
+    if args.stand_in:
+        from benchmark_pun_pipeline import install_stand_in_tables
+        install_stand_in_tables()
+
+    if args.mode == 'record':
+        if os.path.dirname(args.fixture) and not os.path.isdir(os.path.dirname(args.fixture)):
+            os.makedirs(os.path.dirname(args.fixture))
+        record_golden_outputs(args.fixture, n_groups=args.n_groups, group_size=args.group_size, seed=args.seed)
+    elif check_golden_outputs(args.engine, args.fixture, rtol=args.rtol):
+        sys.exit(1)
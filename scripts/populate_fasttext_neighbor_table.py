@@ -1,26 +1,57 @@
 from time import time
-import gensim
 from app.global_constants import REPO_HOME
-import cPickle as pkl
+from app.helper_utils import reduce_neighbor_graphemes
+from app.neighbor_store import NeighborStore, write_semantic_neighbors
+from bulk_load import bulk_load
 
-def populate_fasttext_neighbor_table(FasttextNeighbor, db):
-    # Load the precomputed grapheme neighbors
+NEIGHBOR_STORE_PATH = REPO_HOME+'data/word_vectors/neighbor_store'
+
+def iter_fasttext_neighbor_rows(store_path=NEIGHBOR_STORE_PATH):
+    '''
+    Yield one FasttextNeighbor row per grapheme of the precomputed neighbors, written by scripts/precompute_word_vector_nearest_neighbors.py
+    The store is memory-mapped, so rows are decoded one at a time rather than all being loaded up front
+    '''
+    start = time()
+    for grapheme_idx, (grapheme, neighbors, semantic_neighbors) in enumerate(NeighborStore(store_path).iter_rows()):
+        # Precompute the lemmatized/deduplicated neighbors, so that no NLTK work is needed at request time
+        # Lemmas are memoized, so each distinct neighbor is only reduced once across the whole vocabulary
+        if semantic_neighbors is None:
+            semantic_neighbors = sorted(reduce_neighbor_graphemes(neighbors))
+        yield dict(grapheme=grapheme, neighbors=neighbors, semantic_neighbors=semantic_neighbors)
+        if (grapheme_idx+1) % 50000 == 0:
+            print 'Finished processing grapheme {} after {:.0f} seconds'.format(grapheme_idx+1, time()-start)
+
+def populate_fasttext_neighbor_table(FasttextNeighbor, db, store_path=NEIGHBOR_STORE_PATH):
+    '''
+    Take the current db session as an argument, and (re)populate the fasttext neighbors table
+    '''
+    bulk_load(FasttextNeighbor.__table__, iter_fasttext_neighbor_rows(store_path), db.engine)
+
+def populate_semantic_neighbors(FasttextNeighbor, db, batch_size=10000):
+    '''
+    Backfill FasttextNeighbor.semantic_neighbors for rows that were populated before the column existed
+    '''
     start = time()
-    grapheme_neighbor_dict = pkl.load(open(REPO_HOME+'data/word_vectors/top200_neighbors_sim35_300k.pkl', 'rb'))
-    print 'Finished loading fasttext_neighbors into memory: {:.0f} seconds'.format(time()-start)
+    n_updated = 0
+    while True:
+        rows = FasttextNeighbor.query.filter(FasttextNeighbor.semantic_neighbors.is_(None)).limit(batch_size).all()
+        if not rows:
+            break
+        for row in rows:
+            row.semantic_neighbors = sorted(reduce_neighbor_graphemes(row.neighbors))
+        db.session.commit()
+        n_updated += len(rows)
+        print 'Finished reducing {} graphemes after {:.0f} seconds'.format(n_updated, time()-start)
 
-    # Create a FasttextNeighbor object for each grapheme
+def populate_store_semantic_neighbors(store_path=NEIGHBOR_STORE_PATH):
+    '''
+    Add the lemmatized/deduplicated neighbors of every word to the neighbor store, the equivalent of populate_semantic_neighbors
+    '''
     start = time()
-    fasttext_neighbor_list = []
-    for grapheme_idx, (grapheme, neighbors) in enumerate(grapheme_neighbor_dict.iteritems()):
-        new_fasttext_neighbor = FasttextNeighbor(grapheme=grapheme, neighbors=neighbors)
-        fasttext_neighbor_list.append(new_fasttext_neighbor)
-        # Running into out-of-memory errors storing so many objects in memory,
-        # so dump the objects into the db every 50000 graphemes, and clear the accumulated cache
+    neighbor_store = NeighborStore(store_path)
+    semantic_neighbor_lists = []
+    for grapheme_idx, row in enumerate(neighbor_store.iter_rows()):
+        semantic_neighbor_lists.append(sorted(reduce_neighbor_graphemes(row.neighbors)))
         if (grapheme_idx+1) % 50000 == 0:
-            print 'Finished processing grapheme {}'.format(grapheme_idx+1)
-            db.session.add_all(fasttext_neighbor_list)
-            db.session.commit()
-            fasttext_neighbor_list = []
-            print 'Finished committing grapheme {}'.format(grapheme_idx+1)
-            print 'Looping duration elapsed: {:.0f} seconds'.format(time()-start)
+            print 'Finished reducing {} graphemes after {:.0f} seconds'.format(grapheme_idx+1, time()-start)
+    write_semantic_neighbors(store_path, semantic_neighbor_lists)
@@ -1,38 +1,26 @@
 from nltk.corpus import cmudict
-from collections import defaultdict
+from app.global_constants import MAX_NGRAM_LENGTH
+from bulk_load import bulk_load
+from count_ngrams import count_ngrams
 
 # CMU Pronouncing Dictionary
 cmu_dict = cmudict.dict()
 
-def populate_subgrapheme_frequency_table(SubgraphemeFrequency, db):
-
-    # Counters for storing the frequencies of each subgrapheme
-    # Smooth by using default value of 1 to avoid probability singularities when string is not present
-    subgrapheme_head_counts = defaultdict(lambda: 1)
-    subgrapheme_tail_counts = defaultdict(lambda: 1)
-    subgrapheme_counts = defaultdict(lambda: 1)
-
-    for grapheme in cmu_dict.iterkeys():
-        # Only store subgraphemes up to a length of 5
-        # Anything longer than that is rare enough that the default count of 1 is a good approximation
-        for k in range(1,6):
-            for i in range(len(grapheme)-k+1):
-                g = grapheme[i:i+k]
-                subgrapheme_counts[g] += 1
-                if i == 0: # head
-                    subgrapheme_head_counts[g] += 1
-                if i + k == len(grapheme): # tail
-                    subgrapheme_tail_counts[g] += 1
+def iter_subgrapheme_frequency_rows(max_n=MAX_NGRAM_LENGTH, processes=1):
+    '''
+    Count the subgraphemes of every word in the CMU dictionary, and yield one SubgraphemeFrequency row per subgrapheme
+    Only subgraphemes up to a length of max_n are stored
+    Anything longer than that is rare enough that the default count of 1 is a good approximation
+    Counted in a single process by default, since populate_tables already runs each table loader in its own worker process
+    '''
+    for ngram, frequency, frequency_head, frequency_tail in count_ngrams(cmu_dict.keys(), max_n=max_n, processes=processes):
+        yield dict(grapheme=''.join(ngram),
+                   frequency=frequency,
+                   frequency_head=frequency_head,
+                   frequency_tail=frequency_tail)
 
-    # Now iterate through the subgraphemes, and add them to the SubgraphemeFrequency table
-    subgrapheme_frequency_list = []
-    for g in subgrapheme_counts.iterkeys():
-        new_subgrapheme_frequency = SubgraphemeFrequency(grapheme=g,
-                                                        frequency=subgrapheme_counts[g],
-                                                        frequency_head=subgrapheme_head_counts[g],
-                                                        frequency_tail=subgrapheme_tail_counts[g])
-        subgrapheme_frequency_list.append(new_subgrapheme_frequency)
-
-    # Add the generated SubgraphemeFrequency objects to the SubgraphemeFrequency table, and commit the changes
-    db.session.add_all(subgrapheme_frequency_list)
-    db.session.commit()
+def populate_subgrapheme_frequency_table(SubgraphemeFrequency, db):
+    '''
+    Take the current db session as an argument, and (re)populate the subgrapheme frequency table
+    '''
+    bulk_load(SubgraphemeFrequency.__table__, iter_subgrapheme_frequency_rows(), db.engine)
@@ -1,39 +1,26 @@
 from nltk.corpus import cmudict
-from collections import defaultdict
+from app.global_constants import MAX_NGRAM_LENGTH
+from bulk_load import bulk_load
+from count_ngrams import count_ngrams
 
 # CMU Pronouncing Dictionary
 cmu_dict = cmudict.dict()
 
-def populate_subphoneme_frequency_table(SubphonemeFrequency, db):
-
-    # Counters for storing the frequencies of each subphoneme
-    # Smooth by using default value of 1 to avoid probability singularities when string is not present
-    subphoneme_head_counts = defaultdict(lambda: 1)
-    subphoneme_tail_counts = defaultdict(lambda: 1)
-    subphoneme_counts = defaultdict(lambda: 1)
-
-    for phonemes in cmu_dict.itervalues():
-        # Only store subphonemes up to a length of 5
-        # Anything longer than that is rare enough that the default count of 1 is a good approximation
-        phoneme = tuple(phonemes[0])
-        for k in range(1,6):
-            for i in range(len(phoneme)-k+1):
-                p = phoneme[i:i+k]
-                subphoneme_counts[p] += 1
-                if i == 0: # head
-                    subphoneme_head_counts[p] += 1
-                if i + k == len(phoneme): # tail
-                    subphoneme_tail_counts[p] += 1
+def iter_subphoneme_frequency_rows(max_n=MAX_NGRAM_LENGTH, processes=1):
+    '''
+    Count the subphonemes of every word in the CMU dictionary, and yield one SubphonemeFrequency row per subphoneme
+    Only subphonemes up to a length of max_n are stored
+    Anything longer than that is rare enough that the default count of 1 is a good approximation
+    Counted in a single process by default, since populate_tables already runs each table loader in its own worker process
+    '''
+    for ngram, frequency, frequency_head, frequency_tail in count_ngrams([tuple(phonemes[0]) for phonemes in cmu_dict.itervalues()], max_n=max_n, processes=processes):
+        yield dict(phoneme=ngram,
+                   frequency=frequency,
+                   frequency_head=frequency_head,
+                   frequency_tail=frequency_tail)
 
-    # Now iterate through the subphonemes, and add them to the SubphonemeFrequency table
-    subphoneme_frequency_list = []
-    for p in subphoneme_counts.iterkeys():
-        new_subphoneme_frequency = SubphonemeFrequency(phoneme=p,
-                                                        frequency=subphoneme_counts[p],
-                                                        frequency_head=subphoneme_head_counts[p],
-                                                        frequency_tail=subphoneme_tail_counts[p])
-        subphoneme_frequency_list.append(new_subphoneme_frequency)
-
-    # Add the generated SubphonemeFrequency objects to the SubphonemeFrequency table, and commit the changes
-    db.session.add_all(subphoneme_frequency_list)
-    db.session.commit()
+def populate_subphoneme_frequency_table(SubphonemeFrequency, db):
+    '''
+    Take the current db session as an argument, and (re)populate the subphoneme frequency table
+    '''
+    bulk_load(SubphonemeFrequency.__table__, iter_subphoneme_frequency_rows(), db.engine)
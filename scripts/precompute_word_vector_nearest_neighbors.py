@@ -1,11 +1,17 @@
+import argparse
 import gensim
+import glob
+import hashlib
+import json
 import numpy as np
+import os
 import sys
 sys.path.insert(0, '../app')
 from global_constants import REPO_HOME, MAX_VOCAB
-from sklearn.decomposition import PCA
+from neighbor_store import write_neighbor_store
 from time import time
-import cPickle as pkl
+from multiprocessing import Pool, cpu_count
+from all_but_the_top import post_process, load_post_processed_vec_file
 
 def post_processing_algorithm(X, D=3):
     '''
@@ -13,17 +19,9 @@ def post_processing_algorithm(X, D=3):
     D - dimensions to cutoff
 
     From "ALL-BUT-THE-TOP: SIMPLE AND EFFECTIVE POSTPROCESSING FOR WORD REPRESENTATIONS"
+    See all_but_the_top.py, which also handles streaming the vectors straight from the .vec file
     '''
-    X_centered = X - X.mean(axis=0)
-    pca = PCA(n_components=D)
-    pca.fit(X_centered)
-    U = pca.components_
-    Y = U.dot(X.T) # unclear if this is supposed to be X or X_centered...
-    Z = np.zeros(X.shape)
-    for i in range(Z.shape[0]):
-        Z[i] = (Y[:,i,np.newaxis]*U).sum(axis=0)
-    X_prime = X_centered - Z
-    return X_prime
+    return post_process(X, D=D)
 
 def nearest_neighbor(grapheme, fasttext_model, n=200, s=0.35):
     '''
@@ -42,32 +40,167 @@ def nearest_neighbor(grapheme, fasttext_model, n=200, s=0.35):
     neighbors_with_sims = [(fasttext_model.index2word[idx], sims[idx]) for idx in topn_sim_inds]
     return [neighbor for neighbor, sim in neighbors_with_sims if sim >= s]
 
-# Load the word vectors
-# Only care about the first 300k vectors, ignore the rest for now (for memory issue reasons)
-start = time()
-fasttext_model = gensim.models.KeyedVectors.load_word2vec_format(REPO_HOME+'data/word_vectors/wiki-news-300d-1M.vec', limit=MAX_VOCAB)
-print 'Finished loading fasttext_model into memory: {:.0f} seconds'.format(time()-start)
-
-start = time()
-# Run the post-processing algorithm to improve the quality of the word-vectors before computing neighbors
-fasttext_model.vectors = post_processing_algorithm(fasttext_model.vectors)
-print 'Finished post-processing word vectors: {:.0f} seconds'.format(time()-start)
-
-start = time()
-# Normalize the word-vectors to speed up the inner-product computations
-fasttext_model.vectors = fasttext_model.vectors / np.linalg.norm(fasttext_model.vectors, axis=1)[:,np.newaxis]
-print 'Finished normalizing word vectors: {:.0f} seconds'.format(time()-start)
-print 'Sanity-check: {} = (300000, 300)'.format(fasttext_model.vectors.shape)
-print 'Sanity-check: {} = 1.0'.format(fasttext_model.vectors[65465].dot(fasttext_model.vectors[65465]))
-
-# Create a FasttextVector object for each word vector
-start = time()
-grapheme_neighbor_dict = {}
-for grapheme_idx, grapheme in enumerate(fasttext_model.vocab.iterkeys()):
-    neighbors = nearest_neighbor(grapheme, fasttext_model)
-    grapheme_neighbor_dict.update({grapheme: neighbors})
-    if grapheme_idx % 1000 == 0 and grapheme_idx > 0:
-        print 'Finished processing vector {}'.format(grapheme_idx)
-        print 'Looping duration elapsed: {:.0f} seconds'.format(time()-start)
-
-pkl.dump(grapheme_neighbor_dict, open(REPO_HOME+'data/word_vectors/top200_neighbors_sim35_300k.pkl', "wb"))
+def get_block_neighbor_ids(vectors, block_start, block_end, n=200, s=0.35, chunk_size=32768):
+    '''
+    Blocked equivalent of running nearest_neighbor on each of the words block_start..block_end-1
+
+    The similarities of the whole block of query words are computed with one matrix-matrix product per chunk of
+    chunk_size candidate words (bounding memory to block_size x chunk_size similarities), the n+1 best candidates
+    of each chunk are kept with argpartition, and the survivors of every chunk are merged at the end
+
+    Returns a list of Arrays[Int], the row indices of each query word's neighbors, most similar first
+    '''
+    queries = np.asarray(vectors[block_start:block_end])
+    n_top = min(n+1, len(vectors))
+    candidate_inds, candidate_sims = [], []
+    for chunk_start in range(0, len(vectors), chunk_size):
+        sims = queries.dot(np.asarray(vectors[chunk_start:chunk_start+chunk_size]).T)
+        n_chunk_top = min(n_top, sims.shape[1])
+        chunk_top = np.argpartition(-sims, n_chunk_top-1, axis=1)[:, :n_chunk_top]
+        candidate_inds.append(chunk_top + chunk_start)
+        candidate_sims.append(np.take_along_axis(sims, chunk_top, axis=1))
+    candidate_inds, candidate_sims = np.hstack(candidate_inds), np.hstack(candidate_sims)
+
+    top = np.argpartition(-candidate_sims, n_top-1, axis=1)[:, :n_top]
+    top_sims = np.take_along_axis(candidate_sims, top, axis=1)
+    top_inds = np.take_along_axis(candidate_inds, top, axis=1)
+    order = np.argsort(-top_sims, axis=1, kind='mergesort')
+    top_sims, top_inds = np.take_along_axis(top_sims, order, axis=1), np.take_along_axis(top_inds, order, axis=1)
+    return [inds[sims >= s] for inds, sims in zip(top_inds, top_sims)]
+
+# Vectors shared by the worker processes through a memory map, see init_worker
+_worker_vectors = None
+
+def init_worker(vectors_path):
+    global _worker_vectors
+    _worker_vectors = np.load(vectors_path, mmap_mode='r')
+
+def get_block_path(checkpoint_dir, block_idx):
+    return os.path.join(checkpoint_dir, 'block_{:06d}.npz'.format(block_idx))
+
+def get_checkpoint_manifest(vectors, n, s, block_size, hash_rows=65536):
+    '''
+    Describe what the blocks of a checkpoint directory were computed from: the neighbor parameters, the blocking,
+    and the number of words along with a hash of their vectors, so that blocks of a different run are never reused
+    '''
+    vectors_hash = hashlib.sha1(str(vectors.shape) + str(vectors.dtype))
+    for row_start in range(0, len(vectors), hash_rows):
+        vectors_hash.update(np.ascontiguousarray(vectors[row_start:row_start+hash_rows]).data)
+    return {'n': n, 's': s, 'block_size': block_size, 'n_words': len(vectors), 'vectors_sha1': vectors_hash.hexdigest()}
+
+def prepare_checkpoint_dir(checkpoint_dir, manifest):
+    '''
+    Clear any checkpointed blocks left by a run with a different manifest (or none, i.e. from before manifests were written),
+    then record the manifest of this run, so that only blocks computed from the same vectors and parameters are resumed
+    '''
+    manifest_path = os.path.join(checkpoint_dir, 'manifest.json')
+    block_paths = glob.glob(os.path.join(checkpoint_dir, 'block_*.npz'))
+    previous_manifest = None
+    if os.path.exists(manifest_path):
+        with open(manifest_path) as f:
+            previous_manifest = json.load(f)
+    if previous_manifest != manifest:
+        if block_paths:
+            print 'Discarding {} checkpointed blocks computed with different vectors or parameters: {} != {}'.format(len(block_paths), previous_manifest, manifest)
+        for block_path in block_paths:
+            os.remove(block_path)
+        with open(manifest_path + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.rename(manifest_path + '.tmp', manifest_path)
+
+def process_block(args):
+    '''
+    Compute the neighbors of one block of words in a worker process, and checkpoint them to disk in CSR form
+    The file is written under a temporary name and then renamed, so a crash never leaves a partial block behind
+    '''
+    block_idx, block_start, block_end, n, s, chunk_size, checkpoint_dir = args
+    neighbor_ids = get_block_neighbor_ids(_worker_vectors, block_start, block_end, n=n, s=s, chunk_size=chunk_size)
+    offsets = np.concatenate([[0], np.cumsum(map(len, neighbor_ids))]).astype(np.int64)
+    block_path = get_block_path(checkpoint_dir, block_idx)
+    with open(block_path + '.tmp', 'wb') as f:
+        np.savez(f, offsets=offsets, neighbor_ids=np.concatenate(neighbor_ids).astype(np.int32))
+    os.rename(block_path + '.tmp', block_path)
+    return block_idx
+
+def compute_neighbor_ids(vectors, checkpoint_dir, n=200, s=0.35, block_size=1024, chunk_size=32768, processes=None):
+    '''
+    ---------------
+    # DESCRIPTION #
+    ---------------
+    Exact nearest neighbors of every row of the (normalized) vectors, see nearest_neighbor
+
+    The vectors are saved to checkpoint_dir and memory-mapped by a pool of worker processes, each of which handles
+    blocks of block_size query words at a time. Every finished block is checkpointed, so an interrupted run can be
+    resumed by calling again with the same checkpoint_dir, and only the missing blocks are recomputed. The directory's
+    manifest (see get_checkpoint_manifest) must match the vectors and parameters, otherwise its blocks are discarded
+
+    -----------
+    # OUTPUTS #
+    -----------
+    offsets, Array[Int] : the neighbors of word i are neighbor_ids[offsets[i]:offsets[i+1]]
+    neighbor_ids, Array[Int] : row indices of the neighbors of every word, most similar first
+    '''
+    if not os.path.isdir(checkpoint_dir):
+        os.makedirs(checkpoint_dir)
+    vectors_path = os.path.join(checkpoint_dir, 'vectors.npy')
+    # The workers map the vectors from disk, so they must be these vectors rather than those of a previous run
+    if not (isinstance(vectors, np.memmap) and vectors.filename and os.path.abspath(vectors.filename) == os.path.abspath(vectors_path)):
+        np.save(vectors_path, vectors)
+    prepare_checkpoint_dir(checkpoint_dir, get_checkpoint_manifest(vectors, n, s, block_size))
+
+    blocks = [(block_idx, block_start, min(block_start+block_size, len(vectors)), n, s, chunk_size, checkpoint_dir)
+              for block_idx, block_start in enumerate(range(0, len(vectors), block_size))]
+    pending_blocks = [block for block in blocks if not os.path.exists(get_block_path(checkpoint_dir, block[0]))]
+    print 'Computing {} of {} blocks ({} already checkpointed)'.format(len(pending_blocks), len(blocks), len(blocks)-len(pending_blocks))
+
+    start = time()
+    pool = Pool(processes or cpu_count(), initializer=init_worker, initargs=(vectors_path,))
+    try:
+        for n_done, block_idx in enumerate(pool.imap_unordered(process_block, pending_blocks), 1):
+            if n_done % 10 == 0 or n_done == len(pending_blocks):
+                print 'Finished {} blocks after {:.0f} seconds'.format(n_done, time()-start)
+        pool.close()
+    except:
+        pool.terminate()
+        raise
+    finally:
+        pool.join()
+
+    # Concatenate the checkpointed blocks into a single CSR structure
+    offsets, neighbor_ids = [np.zeros(1, dtype=np.int64)], []
+    for block in blocks:
+        with np.load(get_block_path(checkpoint_dir, block[0])) as block_data:
+            offsets.append(block_data['offsets'][1:] + offsets[-1][-1])
+            neighbor_ids.append(block_data['neighbor_ids'])
+    return np.concatenate(offsets), np.concatenate(neighbor_ids)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--vectors', default=REPO_HOME+'data/word_vectors/wiki-news-300d-1M.vec', help='FastText .vec file')
+    parser.add_argument('--limit', type=int, default=MAX_VOCAB, help='number of word vectors to use, most frequent first (0 for all of them)')
+    parser.add_argument('--output', default=REPO_HOME+'data/word_vectors/neighbor_store', help='directory to write the neighbor store to')
+    parser.add_argument('--processes', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+    parser.add_argument('--block-size', type=int, default=1024, help='number of query words per block')
+    parser.add_argument('--checkpoint-dir', default=REPO_HOME+'data/word_vectors/neighbor_checkpoints', help='directory holding the finished blocks, for resuming')
+    args = parser.parse_args()
+
+    # Load and post-process the word vectors in two streaming passes over the .vec file, writing them straight into
+    # the checkpoint directory, so that only a single float32 copy is ever held (in the page cache rather than the heap)
+    # Post-processing improves the quality of the word-vectors, and normalizing speeds up the inner-product computations
+    start = time()
+    if not os.path.isdir(args.checkpoint_dir):
+        os.makedirs(args.checkpoint_dir)
+    graphemes, vectors = load_post_processed_vec_file(args.vectors, limit=args.limit or None, out_path=os.path.join(args.checkpoint_dir, 'vectors.npy'))
+    print 'Finished loading and post-processing word vectors: {:.0f} seconds'.format(time()-start)
+    print 'Sanity-check: {} = ({}, 300)'.format(vectors.shape, len(graphemes))
+    print 'Sanity-check: {} = 1.0'.format(vectors[len(graphemes)//2].dot(vectors[len(graphemes)//2]))
+
+    # Compute the neighbors of every word vector, in blocks spread across all cores
+    start = time()
+    offsets, neighbor_ids = compute_neighbor_ids(vectors, args.checkpoint_dir, block_size=args.block_size, processes=args.processes)
+    print 'Finished computing neighbors: {:.0f} seconds'.format(time()-start)
+
+    # Write the neighbors straight from the CSR arrays into the memory-mapped neighbor store, see app/neighbor_store.py
+    start = time()
+    write_neighbor_store(args.output, graphemes, offsets, neighbor_ids)
+    print 'Finished writing the neighbor store: {:.0f} seconds'.format(time()-start)